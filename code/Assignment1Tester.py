@@ -13,6 +13,7 @@ import traceback     # Để in chi tiết lỗi
 import testHelper    # Module chứa các hàm hỗ trợ test
 import Interface as MyAssignment  # Module chính chứa logic phân vùng
 import time          # Để đo thời gian thực thi
+from contextlib import closing  # Để trả kết nối về pool khi kết thúc khối with
 
 # Các hằng số cấu hình
 DATABASE_NAME = 'dds_assgn1'              # Tên database sử dụng cho bài tập
@@ -21,6 +22,7 @@ RANGE_TABLE_PREFIX = 'range_part'         # Tiền tố cho các bảng phân v
 RROBIN_TABLE_PREFIX = 'rrobin_part'       # Tiền tố cho các bảng phân vùng round robin
 INPUT_FILE_PATH = 'ratings.dat'           # Đường dẫn file dữ liệu đầu vào
 ACTUAL_ROWS_IN_INPUT_FILE = 10000054      # Số dòng dự kiến trong file (để validation)
+LOAD_WORKERS = 4                          # Số tiến trình tải dữ liệu song song
 
 def print_progress(message, indent=0):
     """
@@ -73,15 +75,16 @@ def main():
     3. Cho phép user chọn loại phân vùng (range hoặc round robin)
     4. Test chức năng tạo phân vùng và chèn dữ liệu
     5. Xác minh tính đúng đắn
-    6. Dọn dẹp database
+    6. Tạo index và in thời gian tạo từng index
+    7. Dọn dẹp database
     """
     try:
         print_progress("Starting test...")
         # Tạo database cho bài tập (nếu chưa có)
         testHelper.createdb(DATABASE_NAME)
 
-        # Mở kết nối đến database và thiết lập autocommit
-        with testHelper.getopenconnection(dbname=DATABASE_NAME) as conn:
+        # Lấy kết nối đến database từ pool (trả lại pool khi kết thúc) và thiết lập autocommit
+        with closing(testHelper.getopenconnection(dbname=DATABASE_NAME)) as conn:
             conn.set_isolation_level(psycopg2.extensions.ISOLATION_LEVEL_AUTOCOMMIT)
             # Xóa tất cả bảng public cũ để bắt đầu test sạch
             testHelper.deleteAllPublicTables(conn)
@@ -89,7 +92,7 @@ def main():
             # BƯỚC 1: Test chức năng load dữ liệu từ file vào database
             print_progress("Testing loadratings...")
             start_time = time.time()
-            [result, e] = testHelper.testloadratings(MyAssignment, RATINGS_TABLE, INPUT_FILE_PATH, conn, ACTUAL_ROWS_IN_INPUT_FILE)
+            [result, e] = testHelper.testloadratings(MyAssignment, RATINGS_TABLE, INPUT_FILE_PATH, conn, ACTUAL_ROWS_IN_INPUT_FILE, LOAD_WORKERS)
             load_time = time.time() - start_time
             print_progress(f"loadratings: {'passed' if result else 'failed'}! ({load_time:.3f} seconds)")
 
@@ -145,6 +148,16 @@ def main():
             elapsed_time = time.time() - start_time
             print_progress(f"Total partitioning + insert time: {elapsed_time:.3f} seconds")
 
+            # Tạo index trên bảng chính và các phân vùng sau khi đã nạp xong dữ liệu
+            print_progress("Building indexes...")
+            start_time = time.time()
+            for table, index, seconds in MyAssignment.buildindexes(RATINGS_TABLE, conn):
+                if seconds is None:
+                    print_progress(f"- {index}: already exists", indent=1)
+                else:
+                    print_progress(f"- {index}: {seconds:.3f} seconds", indent=1)
+            print_progress(f"Total index build time: {time.time() - start_time:.3f} seconds")
+
             # BƯỚC 3: Tùy chọn dọn dẹp - xóa tất cả bảng sau khi test
             if input('\nPress enter to delete all tables: ') == '':
                 print_progress("Deleting all tables...")
@@ -0,0 +1,587 @@
+#!/usr/bin/env python3
+#
+# Giao diện bất đồng bộ (asyncio) cho các thao tác chính của Interface
+#
+# Dùng cùng các bảng, metadata và quy tắc phân vùng với Interface nên hai API có thể dùng xen kẽ
+# (vd: tạo phân vùng bằng AsyncInterface rồi chèn bằng Interface.rangeinsert và ngược lại).
+# Các hàm nhận openconnection là pool (create_pool) hoặc một kết nối asyncpg (getopenconnection):
+# với pool, các phân vùng được nạp đồng thời trên các kết nối riêng và nhiều lệnh chèn có thể chạy
+# cùng lúc trên một event loop; với một kết nối, các bước được thực hiện lần lượt.
+# Chỉ hỗ trợ backend 'table' khi tạo phân vùng; các lệnh chèn hỗ trợ cả tập phân vùng native
+# do Interface tạo.
+#
+
+import asyncio  # Để chạy đồng thời việc nạp các phân vùng
+from contextlib import asynccontextmanager  # Để lấy/trả kết nối của pool bằng câu lệnh async with
+from tempfile import TemporaryFile  # File tạm chứa dữ liệu của từng phân vùng round robin
+
+import Interface  # Dùng chung hằng số, metadata và các hàm tính biên phân vùng
+from Interface import (RANGE_TABLE_PREFIX, RROBIN_TABLE_PREFIX, ROUNDROBIN_CURSOR_TABLE, METADATA_TABLE,
+                       LOAD_CHECKPOINT_TABLE, POOL_MINCONN, POOL_MAXCONN, RatingsCopyStream, _phase)
+
+try:
+    import asyncpg  # Driver PostgreSQL bất đồng bộ
+except ImportError:  # Phụ thuộc tùy chọn: chỉ cần khi dùng module này
+    asyncpg = None
+
+COLUMNS = ['userid', 'movieid', 'rating']  # Các cột được COPY giữa bảng chính và các phân vùng
+
+
+def _require_asyncpg():
+    """Báo lỗi rõ ràng khi chưa cài asyncpg"""
+    if asyncpg is None:
+        raise ImportError("AsyncInterface requires asyncpg: pip install asyncpg")
+
+
+async def getopenconnection(user='postgres', password='1234', dbname='postgres'):
+    """
+    Tạo kết nối asyncpg đến cơ sở dữ liệu PostgreSQL
+    Args:
+        user, password, dbname: Thông tin kết nối như Interface.getopenconnection
+    Returns:
+        Đối tượng asyncpg.Connection
+    """
+    _require_asyncpg()
+    return await asyncpg.connect(user=user, password=password, database=dbname, host='localhost')
+
+
+async def create_pool(user='postgres', password='1234', dbname='postgres', minconn=POOL_MINCONN,
+                      maxconn=POOL_MAXCONN):
+    """
+    Tạo pool kết nối asyncpg; số kết nối tối đa giới hạn số phân vùng được nạp
+    và số lệnh chèn được thực hiện đồng thời
+    Args:
+        user, password, dbname: Thông tin kết nối như Interface.getopenconnection
+        minconn, maxconn: Số kết nối mở sẵn và số kết nối tối đa
+    Returns:
+        Đối tượng asyncpg.Pool (đóng bằng await pool.close())
+    """
+    _require_asyncpg()
+    return await asyncpg.create_pool(user=user, password=password, database=dbname, host='localhost',
+                                     min_size=minconn, max_size=maxconn, reset=_keep_session)
+
+
+async def _keep_session(con):
+    """
+    Thay cho bước reset mặc định khi trả kết nối về pool (RESET ALL, UNLISTEN... tốn thêm một lượt
+    gửi/nhận cho mỗi lệnh chèn): các hàm của module không thay đổi trạng thái phiên
+    """
+
+
+@asynccontextmanager
+async def _acquire(openconnection):
+    """
+    Lấy một kết nối từ pool (trả lại khi ra khỏi khối async with), hoặc dùng chính kết nối được truyền vào
+    Args:
+        openconnection: asyncpg.Pool hoặc asyncpg.Connection
+    """
+    if hasattr(openconnection, 'acquire'):
+        async with openconnection.acquire() as con:
+            yield con
+    else:
+        yield openconnection
+
+
+@asynccontextmanager
+async def _transaction(con):
+    """
+    con.transaction() cho các giao dịch thay đổi tập phân vùng: khi giao dịch kết thúc, metadata của
+    các tập phân vùng đã thay đổi được xóa lại khỏi bộ nhớ đệm (xem Interface._partitions_changed)
+    Args:
+        con: Kết nối asyncpg
+    """
+    try:
+        async with con.transaction():
+            yield
+    finally:
+        Interface._end_partition_changes(con)
+
+
+async def _gather(openconnection, coroutines):
+    """
+    Chạy các coroutine đồng thời nếu openconnection là pool, lần lượt nếu là một kết nối
+    (một kết nối asyncpg chỉ thực hiện một lệnh tại một thời điểm)
+    Args:
+        openconnection: asyncpg.Pool hoặc asyncpg.Connection
+        coroutines: List các coroutine chưa chạy
+    Returns:
+        List kết quả theo thứ tự của coroutines
+    """
+    if hasattr(openconnection, 'acquire'):
+        return await asyncio.gather(*coroutines)
+    return [await coroutine for coroutine in coroutines]
+
+
+def _rowcount(status):
+    """Lấy số dòng từ trạng thái lệnh của asyncpg (vd: 'INSERT 0 42', 'COPY 42')"""
+    return int(status.split()[-1])
+
+
+async def loadratings(ratingstablename, ratingsfilepath, openconnection, compact=False):
+    """
+    Hàm tải dữ liệu từ file vào bảng cơ sở dữ liệu (tương đương Interface.loadratings với workers=1)
+    Việc đọc và chuyển đổi file chạy trong thread của executor, event loop không bị chặn
+    Args:
+        ratingstablename: Tên bảng để lưu dữ liệu đánh giá
+        ratingsfilepath: Đường dẫn file chứa dữ liệu đánh giá
+        openconnection: asyncpg.Pool hoặc asyncpg.Connection
+        compact: True để lưu rating dạng real, xem Interface._create_ratings_table
+    Returns:
+        Số dòng đã chèn
+    """
+    async with _acquire(openconnection) as con:
+        async with con.transaction():
+            with _phase('async_loadratings', 'create', table=ratingstablename):
+                await con.execute(f"DROP TABLE IF EXISTS {ratingstablename}")
+                await con.execute(Interface._ratings_table_ddl(ratingstablename, compact))
+                # Checkpoint của Interface.loadratings(..., resume=True) và con trỏ round robin không còn
+                # khớp với bảng mới (xem Interface._create_ratings_table)
+                checkpoint, roundrobin = await con.fetchrow("SELECT to_regclass($1) IS NOT NULL, "
+                                                            "to_regclass($2) IS NOT NULL",
+                                                            LOAD_CHECKPOINT_TABLE, ROUNDROBIN_CURSOR_TABLE)
+                if checkpoint:
+                    await con.execute(f"DELETE FROM {LOAD_CHECKPOINT_TABLE} WHERE tablename = $1", ratingstablename)
+                if roundrobin:
+                    await con.execute(f"DELETE FROM {ROUNDROBIN_CURSOR_TABLE} WHERE prefix = $1", RROBIN_TABLE_PREFIX)
+            with open(ratingsfilepath, 'rb') as f:
+                stream = RatingsCopyStream(f)
+                with _phase('async_loadratings', 'copy', table=ratingstablename) as metrics:
+                    await con.copy_to_table(ratingstablename, source=stream, columns=COLUMNS)
+                    metrics.update(rows=stream.rows, bytes=stream.nbytes)
+    return stream.rows
+
+
+async def rangepartition(ratingstablename, numberofpartitions, openconnection):
+    """
+    Hàm tạo phân vùng theo phạm vi dựa trên điểm rating (cùng biên với Interface.rangepartition)
+    Như bản đồng bộ, bảng chính chỉ được quét một lần: một câu INSERT ... SELECT vào bảng định tuyến
+    (các phân vùng được gắn tạm vào một bảng cha PARTITION BY RANGE), PostgreSQL tự đưa từng dòng vào
+    phân vùng của nó. Việc tạo bảng, nạp dữ liệu và ghi metadata nằm trong một giao dịch trên một kết nối:
+    nếu có lỗi, không phân vùng nào bị thay đổi
+    Args:
+        ratingstablename: Tên bảng chính chứa dữ liệu
+        numberofpartitions: Số phân vùng cần tạo
+        openconnection: asyncpg.Pool hoặc asyncpg.Connection
+    """
+    lows, highs = Interface._range_bounds(numberofpartitions)
+    async with _acquire(openconnection) as con:
+        async with _transaction(con):
+            with _phase('async_rangepartition', 'create'):
+                await _prepare_partitions(con, ratingstablename, RANGE_TABLE_PREFIX, numberofpartitions)
+
+            with _phase('async_rangepartition', 'fill', table=f"{ratingstablename}_range_router") as metrics:
+                router, statements = Interface._range_router_sql(ratingstablename, numberofpartitions, lows, highs)
+                await con.execute('; '.join(statements))
+                status = await con.execute(
+                    f"INSERT INTO {router} SELECT userid, movieid, rating FROM {ratingstablename}")
+                metrics['rows'] = _rowcount(status)
+                await con.execute('; '.join(Interface._detach_router_sql(router, numberofpartitions)))
+
+            with _phase('async_rangepartition', 'metadata'):
+                await _save_partition_metadata(con, RANGE_TABLE_PREFIX, 'range', numberofpartitions, lows, highs)
+
+
+async def roundrobinpartition(ratingstablename, numberofpartitions, openconnection):
+    """
+    Hàm tạo phân vùng theo phương pháp round robin (cùng kết quả với Interface.roundrobinpartition)
+    Bảng gốc được quét một lần bằng COPY TO, dòng thứ k được ghi vào file tạm của phân vùng
+    k % numberofpartitions, sau đó các file tạm được COPY vào các phân vùng đồng thời khi
+    openconnection là pool. Khác với rangepartition, các bước là các giao dịch riêng (mỗi phân vùng được
+    nạp trên một kết nối): nếu một phân vùng lỗi, các phân vùng khác có thể đã được nạp
+    Args:
+        ratingstablename: Tên bảng chính chứa dữ liệu
+        numberofpartitions: Số phân vùng cần tạo
+        openconnection: asyncpg.Pool hoặc asyncpg.Connection
+    """
+    await _create_partitions(openconnection, ratingstablename, RROBIN_TABLE_PREFIX, numberofpartitions,
+                             'async_roundrobinpartition')
+
+    spools = [TemporaryFile() for _ in range(numberofpartitions)]
+    try:
+        async with _acquire(openconnection) as con:
+            with _phase('async_roundrobinpartition', 'scan', table=ratingstablename) as metrics:
+                splitter = _RoundRobinSplitter(spools)
+                await con.copy_from_table(ratingstablename, columns=COLUMNS, output=splitter)
+                metrics['rows'] = splitter.rows
+
+        async def fill(i):
+            async with _acquire(openconnection) as con:
+                with _phase('async_roundrobinpartition', 'fill', table=f"{RROBIN_TABLE_PREFIX}{i}",
+                            bytes=spools[i].tell()) as metrics:
+                    spools[i].seek(0)
+                    status = await con.copy_to_table(f"{RROBIN_TABLE_PREFIX}{i}", source=spools[i], columns=COLUMNS)
+                    metrics['rows'] = _rowcount(status)
+
+        await _gather(openconnection, [fill(i) for i in range(numberofpartitions)])
+    finally:
+        for spool in spools:
+            spool.close()
+
+    # Lưu metadata và vị trí round robin kế tiếp để roundrobininsert không phải đếm lại bảng gốc
+    async with _acquire(openconnection) as con:
+        async with _transaction(con):
+            with _phase('async_roundrobinpartition', 'metadata'):
+                await _save_partition_metadata(con, RROBIN_TABLE_PREFIX, 'roundrobin', numberofpartitions)
+                await _save_roundrobin_cursor(con, numberofpartitions, splitter.rows)
+
+
+class _RoundRobinSplitter:
+    """
+    Hàm nhận dữ liệu cho copy_from_table(output=...): asyncpg gửi dữ liệu COPY theo từng khối,
+    khối có thể kết thúc giữa một dòng. Các dòng trọn vẹn được chia xoay vòng vào các file tạm,
+    mỗi file nhận một lần ghi cho mỗi khối
+    Args:
+        spools: Danh sách file tạm của các phân vùng
+    """
+
+    def __init__(self, spools):
+        self.spools = spools
+        self.rows = 0          # Số dòng đã chia
+        self._partial = b''    # Phần đầu của dòng chưa trọn vẹn ở cuối khối trước
+
+    async def __call__(self, chunk):
+        lines = (self._partial + bytes(chunk)).split(b'\n')
+        self._partial = lines.pop()  # Phần sau ký tự xuống dòng cuối cùng (rỗng nếu khối kết thúc đúng cuối dòng)
+        n = len(self.spools)
+        for k in range(min(n, len(lines))):
+            # Dòng thứ k của khối có số thứ tự self.rows + k, các dòng cách nhau n vào cùng một phân vùng
+            self.spools[(self.rows + k) % n].write(b'\n'.join(lines[k::n]) + b'\n')
+        self.rows += len(lines)
+
+
+async def _create_partitions(openconnection, ratingstablename, prefix, numberofpartitions, operation):
+    """
+    Tạo các bảng phân vùng prefix0 ... prefix{N-1} nếu chưa có và xóa dữ liệu cũ cùng các index cũ,
+    trong một giao dịch (tương đương Interface._create_partitions)
+    Args:
+        openconnection: asyncpg.Pool hoặc asyncpg.Connection
+        ratingstablename: Tên bảng chính
+        prefix: Tiền tố tên bảng phân vùng
+        numberofpartitions: Số phân vùng
+        operation: Tên thao tác gọi hàm này (cho số liệu đo)
+    """
+    async with _acquire(openconnection) as con:
+        async with _transaction(con):
+            with _phase(operation, 'create'):
+                await _prepare_partitions(con, ratingstablename, prefix, numberofpartitions)
+
+
+async def _prepare_partitions(con, ratingstablename, prefix, numberofpartitions):
+    """
+    Phần việc của _create_partitions trên một kết nối, trong giao dịch của hàm gọi
+    Args:
+        con: Kết nối asyncpg
+        ratingstablename: Tên bảng chính
+        prefix: Tiền tố tên bảng phân vùng
+        numberofpartitions: Số phân vùng
+    """
+    await _drop_replaced_partitions(con, prefix, numberofpartitions)
+    await con.execute('; '.join(
+        [f"CREATE TABLE IF NOT EXISTS {prefix}{i} (LIKE {ratingstablename})" for i in range(numberofpartitions)]
+        + [Interface._drop_indexes_sql([f"{prefix}{i}" for i in range(numberofpartitions)])]
+        + [f"TRUNCATE TABLE {prefix}{i}" for i in range(numberofpartitions)]))
+    # Đổi kiểu rating của các phân vùng còn lại từ lần trước nếu khác bảng chính (bảng đã rỗng)
+    rows = await con.fetch("""
+        SELECT c.relname, format_type(m.atttypid, m.atttypmod)
+        FROM pg_class c
+        JOIN pg_attribute a ON a.attrelid = c.oid AND a.attname = 'rating'
+        JOIN pg_attribute m ON m.attrelid = $1::regclass AND m.attname = 'rating'
+        WHERE c.relname = ANY($2) AND pg_table_is_visible(c.oid) AND a.atttypid <> m.atttypid
+    """, ratingstablename, [f"{prefix}{i}" for i in range(numberofpartitions)])
+    for table, ratingtype in rows:
+        await con.execute(f"ALTER TABLE {table} ALTER COLUMN rating TYPE {ratingtype}")
+
+
+async def _drop_replaced_partitions(con, prefix, numberofpartitions):
+    """
+    Dọn tập phân vùng cũ theo metadata (tương đương Interface._drop_replaced_partitions)
+    Args:
+        con: Kết nối asyncpg
+        prefix: Tiền tố tên bảng phân vùng
+        numberofpartitions: Số phân vùng sắp tạo
+    """
+    info = await _partition_info(prefix, con)
+    if info is None:
+        return
+    if info['backend'] == 'native':
+        await con.execute(f"DROP TABLE IF EXISTS {info['parenttable']}")
+    elif len(info['tablenames']) > numberofpartitions:
+        await con.execute('; '.join(f"DROP TABLE IF EXISTS {table}"
+                                    for table in info['tablenames'][numberofpartitions:]))
+    Interface._partitions_changed(con, (_database_key(con), prefix))
+
+
+async def rangeinsert(ratingstablename, userid, itemid, rating, openconnection):
+    """
+    Hàm chèn dữ liệu mới vào bảng chính và phân vùng range tương ứng trong một giao dịch
+    Với pool, nhiều lệnh chèn có thể chạy đồng thời (vd: asyncio.gather), mỗi lệnh trên một kết nối
+    Args:
+        ratingstablename: Tên bảng chính
+        userid: ID người dùng
+        itemid: ID phim (movie)
+        rating: Điểm đánh giá (dùng để xác định phân vùng)
+        openconnection: asyncpg.Pool hoặc asyncpg.Connection
+    """
+    async with _acquire(openconnection) as con:
+        await _routed_insert(RANGE_TABLE_PREFIX, con, _rangeinsert_row, ratingstablename, userid, itemid, rating)
+
+
+async def _rangeinsert_row(ratingstablename, userid, itemid, rating, con):
+    """Phần thân của rangeinsert trên một kết nối (xem _routed_insert)"""
+    with _phase('async_rangeinsert', 'insert', rows=1):
+        info = await _partition_info(RANGE_TABLE_PREFIX, con)
+        if info is not None and info['backend'] == 'native':
+            # Backend native: PostgreSQL tự định tuyến dòng chèn vào bảng cha
+            await _insert_row(con, ratingstablename, info['parenttable'], userid, itemid, rating, advance=True)
+            return
+        if info is not None:
+            lows, highs = info['lowerbounds'], info['upperbounds']
+        else:
+            # Chưa có phân vùng range nào thì không có biên (dòng chỉ được chèn vào bảng chính)
+            numberofpartitions = await count_partitions(RANGE_TABLE_PREFIX, con)
+            lows, highs = Interface._range_bounds(numberofpartitions) if numberofpartitions else ([], [])
+        index = Interface._range_index(rating, lows, highs)
+        # Rating không thuộc phân vùng nào chỉ được chèn vào bảng chính
+        table = None if index is None else f"{RANGE_TABLE_PREFIX}{index}"
+        await _insert_row(con, ratingstablename, table, userid, itemid, rating, advance=True)
+
+
+async def roundrobininsert(ratingstablename, userid, itemid, rating, openconnection):
+    """
+    Hàm chèn dữ liệu mới vào bảng chính và phân vùng round robin tương ứng trong một giao dịch
+    Vị trí được lấy từ con trỏ round robin như Interface.roundrobininsert: dòng con trỏ bị khóa
+    tới khi giao dịch kết thúc nên các lệnh chèn đồng thời được cấp vị trí lần lượt
+    Args:
+        ratingstablename: Tên bảng chính
+        userid: ID người dùng
+        itemid: ID phim (movie)
+        rating: Điểm đánh giá
+        openconnection: asyncpg.Pool hoặc asyncpg.Connection
+    """
+    async with _acquire(openconnection) as con:
+        await _routed_insert(RROBIN_TABLE_PREFIX, con, _roundrobininsert_row, ratingstablename, userid, itemid, rating)
+
+
+async def _roundrobininsert_row(ratingstablename, userid, itemid, rating, con):
+    """Phần thân của roundrobininsert trên một kết nối (xem _routed_insert)"""
+    with _phase('async_roundrobininsert', 'insert', rows=1):
+        info = await _partition_info(RROBIN_TABLE_PREFIX, con)
+        if info is not None and info['backend'] == 'native':
+            # Backend native: sequence của bảng cha cấp vị trí, PostgreSQL tự định tuyến
+            await _insert_row(con, ratingstablename, info['parenttable'], userid, itemid, rating)
+            return
+        if info is not None:
+            # Cấp vị trí và chèn trong cùng một câu lệnh: dòng con trỏ chỉ bị khóa trong một lượt gửi/nhận
+            try:
+                slot = await con.fetchval(_roundrobin_insert_sql(ratingstablename, info['numberofpartitions']),
+                                          userid, itemid, rating, RROBIN_TABLE_PREFIX)
+            except asyncpg.exceptions.UndefinedTableError:
+                slot = None  # Bảng con trỏ chưa tồn tại, câu lệnh không chèn dòng nào
+            if slot is not None:
+                return
+        async with con.transaction():
+            slot = await _next_roundrobin_slot(con)
+            if slot is None:
+                # Chưa có con trỏ (phân vùng được tạo bởi phiên bản cũ): đếm bảng chính và khởi tạo con trỏ
+                totalrows = await con.fetchval(f"SELECT COUNT(*) FROM {ratingstablename}")
+                numberofpartitions = await count_partitions(RROBIN_TABLE_PREFIX, con)
+                await _save_roundrobin_cursor(con, numberofpartitions, totalrows + 1)
+                slot = (totalrows, numberofpartitions)
+            ordinal, numberofpartitions = slot
+            await _insert_row(con, ratingstablename, f"{RROBIN_TABLE_PREFIX}{ordinal % numberofpartitions}",
+                              userid, itemid, rating)
+
+
+def _roundrobin_insert_sql(ratingstablename, numberofpartitions):
+    """
+    Câu lệnh tăng con trỏ round robin rồi chèn dòng ($1, $2, $3) vào bảng chính và phân vùng
+    (nextrow - 1) % numberofpartitions; mọi INSERT đọc từ CTE slot nên không dòng nào được chèn
+    khi chưa có con trỏ cho tiền tố $4
+    Args:
+        ratingstablename: Tên bảng chính
+        numberofpartitions: Số phân vùng round robin (theo metadata)
+    Returns:
+        Chuỗi SQL trả về chỉ số phân vùng, hoặc NULL nếu chưa có con trỏ
+    """
+    inserts = [f"master AS (INSERT INTO {ratingstablename} (userid, movieid, rating) SELECT $1, $2, $3 FROM slot)"]
+    inserts += [f"part{i} AS (INSERT INTO {RROBIN_TABLE_PREFIX}{i} (userid, movieid, rating) "
+                f"SELECT $1, $2, $3 FROM slot WHERE slot.index = {i})" for i in range(numberofpartitions)]
+    return f"""
+        WITH slot AS (
+            UPDATE {ROUNDROBIN_CURSOR_TABLE} SET nextrow = nextrow + 1
+            WHERE prefix = $4 AND numberofpartitions = {numberofpartitions}
+            RETURNING (nextrow - 1) % numberofpartitions AS index
+        ), {', '.join(inserts)}
+        SELECT index FROM slot
+    """
+
+
+async def _insert_row(con, ratingstablename, table, userid, itemid, rating, advance=False):
+    """
+    Chèn một dòng vào bảng chính và bảng table (phân vùng hoặc bảng cha native) trong một câu lệnh:
+    câu lệnh đơn là một giao dịch nên chỉ tốn một lượt gửi/nhận, không cần BEGIN/COMMIT riêng
+    Args:
+        con: Kết nối asyncpg
+        ratingstablename: Tên bảng chính
+        table: Bảng nhận thêm dòng, hoặc None để chỉ chèn vào bảng chính
+        userid, itemid, rating: Giá trị của dòng
+        advance: True để tăng con trỏ round robin trong cùng câu lệnh (dòng không chèn qua roundrobininsert,
+                 xem Interface._advance_roundrobin_sql)
+    """
+    if table is None:
+        ctes, target = [], ratingstablename
+    else:
+        ctes, target = [f"master AS (INSERT INTO {ratingstablename} (userid, movieid, rating) VALUES ($1, $2, $3))"], table
+    statement = f"INSERT INTO {target} (userid, movieid, rating) VALUES ($1, $2, $3)"
+    if advance:
+        ctes.append(f"roundrobin AS (UPDATE {ROUNDROBIN_CURSOR_TABLE} SET nextrow = nextrow + 1 "
+                    f"WHERE prefix = '{RROBIN_TABLE_PREFIX}')")
+    query = f"WITH {', '.join(ctes)} {statement}" if ctes else statement
+    try:
+        await con.execute(query, userid, itemid, rating)
+    except asyncpg.exceptions.UndefinedTableError:
+        if not advance:
+            raise
+        # Chưa có bảng con trỏ: tạo bảng rỗng (không có con trỏ nào để tăng) rồi chèn lại,
+        # các lần chèn sau không tốn thêm lượt gửi/nhận
+        await con.execute(Interface._ROUNDROBIN_CURSOR_DDL)
+        await con.execute(query, userid, itemid, rating)
+
+
+async def _next_roundrobin_slot(con):
+    """
+    Lấy số thứ tự dòng kế tiếp từ con trỏ round robin và tăng con trỏ lên 1
+    Args:
+        con: Kết nối asyncpg đang trong giao dịch
+    Returns:
+        Cặp (ordinal, numberofpartitions), hoặc None nếu chưa có con trỏ
+    """
+    try:
+        async with con.transaction():  # Savepoint: lỗi thiếu bảng không hủy giao dịch bên ngoài
+            row = await con.fetchrow(f"""
+                UPDATE {ROUNDROBIN_CURSOR_TABLE} SET nextrow = nextrow + 1
+                WHERE prefix = $1
+                RETURNING nextrow - 1, numberofpartitions
+            """, RROBIN_TABLE_PREFIX)
+    except asyncpg.exceptions.UndefinedTableError:
+        return None
+    return None if row is None else tuple(row)
+
+
+async def _save_roundrobin_cursor(con, numberofpartitions, nextrow):
+    """Ghi con trỏ round robin (xem Interface._save_roundrobin_cursor)"""
+    await con.execute(Interface._ROUNDROBIN_CURSOR_DDL)
+    await con.execute(f"""
+        INSERT INTO {ROUNDROBIN_CURSOR_TABLE} (prefix, numberofpartitions, nextrow)
+        VALUES ($1, $2, $3)
+        ON CONFLICT (prefix) DO UPDATE
+        SET numberofpartitions = EXCLUDED.numberofpartitions, nextrow = EXCLUDED.nextrow
+    """, RROBIN_TABLE_PREFIX, numberofpartitions, nextrow)
+
+
+async def count_partitions(prefix, openconnection):
+    """
+    Hàm đếm số phân vùng đã được tạo với tiền tố prefix (xem Interface.count_partitions)
+    Args:
+        prefix: Tiền tố của tên bảng (vd: 'range_part', 'rrobin_part')
+        openconnection: asyncpg.Pool hoặc asyncpg.Connection
+    Returns:
+        Số lượng phân vùng
+    """
+    async with _acquire(openconnection) as con:
+        info = await _partition_info(prefix, con)
+        if info is not None:
+            return info['numberofpartitions']
+        return await con.fetchval("SELECT COUNT(*) FROM pg_stat_user_tables WHERE relname LIKE $1", prefix + '%')
+
+
+async def _save_partition_metadata(con, prefix, scheme, numberofpartitions, lows=None, highs=None):
+    """Ghi metadata của một tập phân vùng backend 'table' (xem Interface._save_partition_metadata)"""
+    await con.execute(Interface._METADATA_DDL)
+    await con.execute(f"""
+        INSERT INTO {METADATA_TABLE}
+            (prefix, scheme, numberofpartitions, lowerbounds, upperbounds, tablenames, backend, parenttable,
+             partitionkey)
+        VALUES ($1, $2, $3, $4, $5, $6, 'table', NULL, NULL)
+        ON CONFLICT (prefix) DO UPDATE
+        SET scheme = EXCLUDED.scheme, numberofpartitions = EXCLUDED.numberofpartitions,
+            lowerbounds = EXCLUDED.lowerbounds, upperbounds = EXCLUDED.upperbounds,
+            tablenames = EXCLUDED.tablenames, backend = EXCLUDED.backend, parenttable = EXCLUDED.parenttable,
+            partitionkey = EXCLUDED.partitionkey
+    """, prefix, scheme, numberofpartitions, lows, highs, [f"{prefix}{i}" for i in range(numberofpartitions)])
+    Interface._partitions_changed(con, (_database_key(con), prefix))  # Tập phân vùng đã thay đổi
+
+
+async def _partition_info(prefix, con):
+    """
+    Đọc metadata của tập phân vùng, dùng chung bộ nhớ đệm Interface._partition_cache
+    (cùng khóa database với Interface nên hai API thấy cùng bản ghi)
+    Args:
+        prefix: Tiền tố tên bảng phân vùng
+        con: Kết nối asyncpg
+    Returns:
+        Dict như Interface._partition_info, hoặc None nếu chưa có metadata
+    """
+    key = (_database_key(con), prefix)
+    if key in Interface._partition_cache:
+        return Interface._partition_cache[key]
+    epoch = Interface._partition_cache_epoch
+    if not await con.fetchval("SELECT to_regclass($1) IS NOT NULL", METADATA_TABLE):
+        return None
+    row = await con.fetchrow(f"""
+        SELECT scheme, numberofpartitions, lowerbounds, upperbounds, tablenames, backend, parenttable, partitionkey
+        FROM {METADATA_TABLE} WHERE prefix = $1
+    """, prefix)
+    if row is None:
+        return None
+    info = dict(row)
+    Interface._remember_partition_info(key, info, epoch)
+    return info
+
+
+def _database_key(con):
+    """
+    Khóa database của kết nối asyncpg theo dạng của Interface._database_key: (host, port, tên database)
+    asyncpg không có API công khai cho địa chỉ và tên database của kết nối nên đọc từ thông số kết nối
+    """
+    address = con._addr
+    if isinstance(address, str):  # Unix socket: '<thư mục>/.s.PGSQL.<port>'
+        directory, _, port = address.rpartition('/.s.PGSQL.')
+        return (directory, int(port), con._params.database)
+    return (address[0], address[1], con._params.database)
+
+
+async def invalidate_partition_cache(openconnection=None, prefix=None):
+    """
+    Xóa metadata phân vùng trong bộ nhớ đệm (xem Interface.invalidate_partition_cache)
+    Args:
+        openconnection: asyncpg.Pool hoặc asyncpg.Connection, chỉ xóa các bản ghi của database này
+                        (mặc định: mọi database)
+        prefix: Chỉ xóa bản ghi của tiền tố này (mặc định: mọi tiền tố)
+    """
+    database = None
+    if openconnection is not None:
+        async with _acquire(openconnection) as con:
+            database = _database_key(con)
+    Interface._invalidate_partition_cache(database, prefix)
+
+
+async def _routed_insert(prefix, con, insert, *args):
+    """
+    Gọi insert(*args, con), thử lại một lần nếu metadata lấy từ bộ nhớ đệm trỏ tới bảng
+    không còn tồn tại (xem Interface._routed_insert)
+    Args:
+        prefix: Tiền tố tên bảng phân vùng
+        con: Kết nối asyncpg
+        insert: Coroutine function chèn dòng
+        args: Các tham số của insert trước con
+    """
+    key = (_database_key(con), prefix)
+    cached = key in Interface._partition_cache
+    try:
+        return await insert(*args, con)
+    except asyncpg.exceptions.UndefinedTableError:
+        if not cached:
+            raise  # Metadata vừa được đọc từ database: lỗi không do bộ nhớ đệm
+    Interface._forget_partition_info([key])
+    return await insert(*args, con)
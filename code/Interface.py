@@ -3,161 +3,2012 @@
 # Interface for the assignement - Giao diện cho bài tập lớn
 #
 
+import os  # Để lấy kích thước file khi chia khoảng byte
+import hashlib  # Để nhận diện file dữ liệu khi tải tiếp (loadratings(..., resume=True))
+import struct  # Để mã hóa dòng theo định dạng binary của COPY
+import math  # Để tính biên phân vùng range dạng số thực
+import itertools  # Để xoay vòng các phân vùng round robin
+from bisect import bisect_left, bisect_right  # Để tìm phân vùng range theo cận trên
+import time  # Để theo dõi thời điểm kết nối được trả về pool
+import threading  # Để đồng bộ việc lấy/trả kết nối giữa các luồng
 import psycopg2  # Thư viện để kết nối và thao tác với PostgreSQL
-from io import StringIO  # Để tạo buffer trong bộ nhớ cho việc copy dữ liệu
+import psycopg2.errors  # Các lớp lỗi theo mã SQLSTATE
+from psycopg2 import pool as pgpool  # Pool kết nối của psycopg2
+from contextlib import contextmanager  # Để lấy/trả kết nối của pool bằng câu lệnh with
+from tempfile import TemporaryFile  # File tạm chứa dữ liệu của từng phân vùng khi phân phối
+from concurrent.futures import ProcessPoolExecutor  # Để tải dữ liệu song song bằng nhiều tiến trình
+from concurrent.futures import ThreadPoolExecutor  # Để truy vấn song song các phân vùng
+
+# Các hằng số định nghĩa tên bảng phân vùng
+RANGE_TABLE_PREFIX = 'range_part'     # Tiền tố cho bảng phân vùng range
+RROBIN_TABLE_PREFIX = 'rrobin_part'   # Tiền tố cho bảng phân vùng round robin
+HASH_TABLE_PREFIX = 'hash_part'       # Tiền tố cho bảng phân vùng hash
+HASH_KEYS = ('userid', 'movieid')     # Các cột có thể dùng làm khóa phân vùng hash
+ROUNDROBIN_CURSOR_TABLE = 'partition_cursor'  # Bảng lưu vị trí round robin kế tiếp
+METADATA_TABLE = 'partition_metadata'         # Bảng lưu thông tin các tập phân vùng
+LOAD_CHECKPOINT_TABLE = 'load_checkpoint'     # Bảng lưu vị trí đã tải của loadratings(..., resume=True)
+
+# Cấu hình pool kết nối (xem ConnectionPool)
+POOL_MINCONN = 1                          # Số kết nối mở sẵn
+POOL_MAXCONN = max(4, os.cpu_count() or 1)  # Số kết nối tối đa, đủ cho các thao tác song song
+POOL_HEALTHCHECK_SECONDS = 30             # Kết nối rảnh lâu hơn thời gian này được kiểm tra lại
+
+QUERY_ITERSIZE = 10000  # Số dòng mỗi lần lấy từ cursor phía server khi truy vấn
+# Các index được buildindexes tạo trên bảng chính và mọi phân vùng: (tên, phương thức, danh sách cột)
+DEFAULT_INDEXES = [
+    ('userid_movieid', 'btree', 'userid, movieid'),  # Tra cứu theo user/phim (vd: testrangerobininsert)
+    ('rating', 'brin', 'rating'),                    # Lọc theo khoảng rating, rất nhỏ so với B-tree
+]
+COMPACT_RATING_TYPE = 'real'  # Kiểu cột rating của lược đồ gọn (loadratings(..., compact=True))
+COPY_FORMATS = ('text', 'binary')  # Định dạng COPY của loadratings (tham số copyformat)
+LOAD_CHECKPOINT_ROWS = 100000  # Số dòng mỗi điểm commit khi tải có checkpoint mà không truyền commit_every
+# Thiết lập phiên trong chế độ tải hàng loạt (xem bulkload)
+BULK_MAINTENANCE_WORK_MEM = '1GB'  # Bộ nhớ cho CREATE INDEX, ALTER TABLE ... SET LOGGED
+BULK_WORK_MEM = '256MB'            # Bộ nhớ cho sắp xếp/hash của các truy vấn khi phân vùng
+EQUIDEPTH_SAMPLE_PERCENT = 1.0  # Phần trăm số block được lấy mẫu khi tính biên equi-depth bằng histogram='sample'
+
+# Câu lệnh tạo các bảng trạng thái (dùng chung với AsyncInterface)
+_ROUNDROBIN_CURSOR_DDL = f"""
+        CREATE TABLE IF NOT EXISTS {ROUNDROBIN_CURSOR_TABLE} (
+            prefix text PRIMARY KEY,               -- Tiền tố bảng phân vùng
+            numberofpartitions integer NOT NULL,   -- Số phân vùng
+            nextrow bigint NOT NULL                -- Số thứ tự của dòng kế tiếp
+        )
+    """
+_LOAD_CHECKPOINT_DDL = f"""
+        CREATE TABLE IF NOT EXISTS {LOAD_CHECKPOINT_TABLE} (
+            tablename text PRIMARY KEY,            -- Bảng đích
+            filepath text NOT NULL,                -- Đường dẫn file dữ liệu
+            filesize bigint NOT NULL,              -- Kích thước file (byte)
+            filemtime bigint NOT NULL,             -- Thời điểm sửa file (nano giây)
+            filehash text NOT NULL,                -- SHA-256 của nội dung file
+            byteoffset bigint NOT NULL,            -- Số byte đầu file đã được tải và commit
+            linecount bigint NOT NULL,             -- Số dòng file đã đọc tương ứng
+            rowcount bigint NOT NULL               -- Số dòng đã chèn vào bảng đích
+        )
+    """
+_METADATA_DDL = f"""
+        CREATE TABLE IF NOT EXISTS {METADATA_TABLE} (
+            prefix text PRIMARY KEY,               -- Tiền tố bảng phân vùng
+            scheme text NOT NULL,                  -- Phương pháp phân vùng
+            numberofpartitions integer NOT NULL,   -- Số phân vùng
+            lowerbounds float8[],                  -- Cận dưới của từng phân vùng (range)
+            upperbounds float8[],                  -- Cận trên của từng phân vùng (range)
+            tablenames text[] NOT NULL,            -- Tên bảng của từng phân vùng
+            backend text NOT NULL DEFAULT 'table', -- 'table' hoặc 'native'
+            parenttable text,                      -- Bảng cha PARTITION BY (backend native)
+            partitionkey text                      -- Cột khóa phân vùng (hash)
+        )
+    """
+
+# Các pool dùng chung: (pid, user, password, dbname) -> ConnectionPool. Khóa có pid vì tiến trình con
+# được fork (vd: loadratings(workers=N)) thừa hưởng dict này cùng các socket của tiến trình cha
+_pools = {}
+_pools_lock = threading.Lock()
+
+# Bộ nhớ đệm metadata trong tiến trình: (database, prefix) -> thông tin phân vùng (xem _partition_info),
+# database là khóa do _database_key trả về nên các database/server khác nhau không dùng chung bản ghi
+_partition_cache = {}
+_partition_cache_lock = threading.Lock()
+# Tăng mỗi khi bản ghi bị xóa: metadata đọc từ trước đó (có thể đã cũ) không được ghi vào bộ nhớ đệm
+_partition_cache_epoch = 0
+# Các kết nối có giao dịch đang thay đổi tập phân vùng: kết nối -> khóa bộ nhớ đệm cần xóa lại khi
+# giao dịch kết thúc (xem _partitions_changed)
+_pending_invalidations = {}
+
+# Bộ đếm để đặt tên duy nhất cho các cursor phía server (xem _stream)
+_cursor_ids = itertools.count()
+
+# Các hàm nhận số liệu đo (xem add_instrumentation_hook); list rỗng nghĩa là không đo
+_instrumentation_hooks = []
+
+# Các kết nối đang ở chế độ tải hàng loạt: kết nối -> BulkLoadSession (xem bulkload)
+_bulk_sessions = {}
 
 
 def getopenconnection(user='postgres', password='1234', dbname='postgres'):
     """
-    Hàm tạo kết nối đến cơ sở dữ liệu PostgreSQL
+    Hàm lấy kết nối đến cơ sở dữ liệu PostgreSQL từ pool dùng chung (getconnectionpool)
+    close() trả kết nối về pool thay vì đóng hẳn, nên lần gọi sau không phải mở kết nối mới;
+    không dùng lại kết nối sau khi đã close(). Khi pool đã cấp hết POOL_MAXCONN kết nối,
+    hàm mở một kết nối riêng (đóng hẳn khi close()) thay vì chờ
+    Args:
+        user: Tên người dùng (mặc định: 'postgres')
+        password: Mật khẩu (mặc định: '1234') 
+        dbname: Tên cơ sở dữ liệu (mặc định: 'postgres')
+    Returns:
+        Đối tượng kết nối psycopg2
+    """
+    pool = getconnectionpool(user, password, dbname)
+    try:
+        con = pool.getconn(timeout=0)
+    except pgpool.PoolError:
+        return psycopg2.connect(_dsn(user, password, dbname), connection_factory=_PooledConnection)
+    con._checkedout = True
+    return con
+
+
+def _dsn(user, password, dbname):
+    """Chuỗi kết nối dùng chung cho getopenconnection và ConnectionPool"""
+    return "dbname='" + dbname + "' user='" + user + "' host='localhost' password='" + password + "'"
+
+
+class _PooledConnection(psycopg2.extensions.connection):
+    """
+    Kết nối do ConnectionPool mở: kết nối được cấp bởi getopenconnection được trả về pool khi close()
+    """
+    _pool = None          # Pool sở hữu kết nối, None: kết nối riêng, close() đóng hẳn
+    _checkedout = False   # Đang được cấp bởi getopenconnection
+
+    def close(self):
+        if self._pool is None:
+            super().close()
+        elif self._checkedout:
+            self._checkedout = False
+            self._pool.putconn(self)
+        # Kết nối đã được trả về pool: close() lần nữa không làm gì
+
+    def _discard(self):
+        """Đóng hẳn kết nối (chỉ pool sở hữu gọi)"""
+        super().close()
+
+
+class ConnectionPool:
+    """
+    Pool kết nối an toàn đa luồng tới một database
+    Pool giữ lại tối đa maxconn kết nối; khi tất cả đều đang được dùng, getconn chờ cho tới khi
+    có kết nối được trả lại. Kết nối được kiểm tra trước khi cấp: kết nối đã đóng bị thay mới,
+    kết nối rảnh quá POOL_HEALTHCHECK_SECONDS giây được thử bằng SELECT 1
+    Args:
+        minconn: Số kết nối mở sẵn (mặc định: POOL_MINCONN)
+        maxconn: Số kết nối tối đa (mặc định: POOL_MAXCONN)
+        user, password, dbname: Thông tin kết nối như getopenconnection
+    """
+
+    def __init__(self, minconn=None, maxconn=None, user='postgres', password='1234', dbname='postgres'):
+        self.minconn = POOL_MINCONN if minconn is None else minconn
+        self.maxconn = POOL_MAXCONN if maxconn is None else maxconn
+        self._dsn = _dsn(user, password, dbname)
+        self._cond = threading.Condition()
+        self._idle = []   # Danh sách (kết nối rảnh, thời điểm được trả về)
+        self._size = 0    # Số kết nối đang mở (rảnh + đang được dùng)
+        for _ in range(self.minconn):
+            self._idle.append((self._connect(), time.monotonic()))
+            self._size += 1
+
+    def getconn(self, timeout=None):
+        """
+        Lấy một kết nối còn hoạt động từ pool
+        Args:
+            timeout: Số giây tối đa chờ kết nối rảnh (mặc định: chờ không giới hạn)
+        Returns:
+            Đối tượng kết nối psycopg2, phải được trả lại bằng putconn
+        """
+        with self._cond:
+            while not self._idle and self._size >= self.maxconn:
+                if not self._cond.wait(timeout):
+                    raise pgpool.PoolError("connection pool exhausted")
+            if self._idle:
+                conn, lastused = self._idle.pop()
+                if self._healthy(conn, lastused):
+                    return conn
+                conn._discard()  # Kết nối hỏng: đóng và mở kết nối mới thay thế
+            else:
+                self._size += 1
+        try:
+            return self._connect()
+        except Exception:
+            with self._cond:
+                self._size -= 1
+                self._cond.notify()
+            raise
+
+    def putconn(self, conn, close=False):
+        """
+        Trả kết nối về pool: hủy giao dịch còn dang dở và khôi phục chế độ mặc định
+        Args:
+            conn: Kết nối lấy từ getconn
+            close: True để đóng hẳn kết nối thay vì giữ lại
+        """
+        if not close and not conn.closed:
+            try:
+                if conn.info.transaction_status != psycopg2.extensions.TRANSACTION_STATUS_IDLE:
+                    conn.rollback()
+                conn.autocommit = False
+            except psycopg2.Error:
+                close = True  # Kết nối không còn dùng được
+        with self._cond:
+            if close or conn.closed:
+                conn._discard()
+                self._size -= 1
+            else:
+                self._idle.append((conn, time.monotonic()))
+            self._cond.notify()
+
+    @contextmanager
+    def connection(self, autocommit=False):
+        """
+        Context manager lấy kết nối từ pool và tự trả lại khi kết thúc
+        Args:
+            autocommit: Bật chế độ autocommit cho kết nối (vd: để CREATE DATABASE)
+        """
+        conn = self.getconn()
+        try:
+            conn.autocommit = autocommit
+            yield conn
+        finally:
+            self.putconn(conn)
+
+    def _connect(self):
+        """Mở kết nối mới tới database của pool"""
+        conn = psycopg2.connect(self._dsn, connection_factory=_PooledConnection)
+        conn._pool = self
+        return conn
+
+    def closeall(self):
+        """Đóng tất cả kết nối đang rảnh của pool"""
+        with self._cond:
+            for conn, _ in self._idle:
+                conn._discard()
+            self._size -= len(self._idle)
+            self._idle = []
+
+    @staticmethod
+    def _healthy(conn, lastused):
+        """Kiểm tra kết nối rảnh trước khi cấp cho người dùng"""
+        if conn.closed:
+            return False
+        if time.monotonic() - lastused < POOL_HEALTHCHECK_SECONDS:
+            return True
+        try:
+            cur = conn.cursor()
+            cur.execute("SELECT 1")
+            cur.close()
+            conn.rollback()
+            return True
+        except psycopg2.Error:
+            return False
+
+
+def getconnectionpool(user='postgres', password='1234', dbname='postgres'):
+    """
+    Lấy pool kết nối dùng chung của tiến trình cho một database (tạo mới nếu chưa có)
+    Kích thước pool theo POOL_MINCONN/POOL_MAXCONN, nên đặt các hằng số này trước lần gọi đầu tiên
+    Args:
+        user, password, dbname: Thông tin kết nối như getopenconnection
+    Returns:
+        Đối tượng ConnectionPool
+    """
+    key = (os.getpid(), user, password, dbname)
+    with _pools_lock:
+        if key not in _pools:
+            _pools[key] = ConnectionPool(user=user, password=password, dbname=dbname)
+        return _pools[key]
+
+
+def add_instrumentation_hook(callback):
+    """
+    Đăng ký hàm nhận số liệu đo của các thao tác trong module
+    Mỗi khi một giai đoạn kết thúc, callback(event) được gọi với dict gồm operation (tên hàm,
+    vd: 'loadratings'), phase (vd: 'copy', 'commit', 'fill', 'insert'), seconds, statements
+    (số lệnh execute/COPY đã gửi tới server trong giai đoạn) và các bộ đếm tùy giai đoạn:
+    table, rows, bytes, parse_seconds (thời gian đọc và chuyển đổi file trong lúc COPY), worker
+    Khi không có hàm nào được đăng ký, chi phí đo chỉ là một phép kiểm tra list rỗng mỗi giai đoạn
+    Args:
+        callback: Hàm nhận một tham số event, vd: một MetricsRegistry
+    """
+    _instrumentation_hooks.append(callback)
+
+
+def remove_instrumentation_hook(callback):
+    """
+    Hủy đăng ký hàm nhận số liệu đo
+    Args:
+        callback: Hàm đã đăng ký bằng add_instrumentation_hook
+    """
+    _instrumentation_hooks.remove(callback)
+
+
+@contextmanager
+def instrumented(callback):
+    """
+    Đăng ký callback trong phạm vi khối with, vd:
+        with instrumented(MetricsRegistry()) as registry:
+            loadratings('ratings', 'ratings.dat', conn)
+        print(registry.totals())
+    Args:
+        callback: Hàm nhận số liệu đo
+    """
+    add_instrumentation_hook(callback)
+    try:
+        yield callback
+    finally:
+        remove_instrumentation_hook(callback)
+
+
+class MetricsRegistry:
+    """
+    Hàm nhận số liệu đo cộng dồn các event theo từng cặp (operation, phase),
+    an toàn khi các thao tác chạy trên nhiều luồng
+    """
+    COUNTERS = ('seconds', 'statements', 'rows', 'bytes', 'parse_seconds')
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._totals = {}  # (operation, phase) -> dict calls và tổng của từng bộ đếm
+
+    def __call__(self, event):
+        key = (event['operation'], event['phase'])
+        with self._lock:
+            totals = self._totals.get(key)
+            if totals is None:
+                totals = self._totals[key] = dict.fromkeys(('calls',) + self.COUNTERS, 0)
+            totals['calls'] += 1
+            for name in self.COUNTERS:
+                totals[name] += event.get(name) or 0
+
+    def totals(self):
+        """
+        Returns:
+            Dict (operation, phase) -> dict gồm calls (số event) và tổng của từng bộ đếm
+        """
+        with self._lock:
+            return {key: dict(values) for key, values in self._totals.items()}
+
+    def reset(self):
+        """
+        Xóa các số liệu đã cộng dồn
+        """
+        with self._lock:
+            self._totals.clear()
+
+
+class _CountingCursor(psycopg2.extensions.cursor):
+    """
+    Cursor đếm số lệnh execute/COPY đã gửi tới server, chỉ được dùng khi đang đo (xem _cursor)
+    """
+    statements = 0
+
+    def execute(self, query, vars=None):
+        self.statements += 1
+        return super().execute(query, vars)
+
+    def copy_expert(self, sql, file, size=8192):
+        self.statements += 1
+        return super().copy_expert(sql, file, size)
+
+
+def _cursor(con):
+    """
+    Tạo cursor thường, hoặc _CountingCursor khi có hàm nhận số liệu đo được đăng ký
+    Args:
+        con: Kết nối database
+    """
+    if _instrumentation_hooks:
+        return con.cursor(cursor_factory=_CountingCursor)
+    return con.cursor()
+
+
+@contextmanager
+def _phase(operation, phase, cur=None, **counters):
+    """
+    Đo một giai đoạn của thao tác và gửi event cho các hàm đã đăng ký
+    Khối with nhận dict counters để điền thêm bộ đếm (rows, bytes...); giai đoạn bị lỗi không được gửi
+    Args:
+        operation: Tên thao tác
+        phase: Tên giai đoạn
+        cur: Cursor tạo bằng _cursor, để đếm số lệnh đã gửi trong giai đoạn
+        counters: Các bộ đếm ban đầu (vd: table)
+    """
+    if not _instrumentation_hooks:
+        yield counters
+        return
+    issued = getattr(cur, 'statements', 0)
+    start = time.perf_counter()
+    yield counters
+    counters['seconds'] = time.perf_counter() - start
+    counters['statements'] = counters.get('statements', 0) + getattr(cur, 'statements', 0) - issued
+    _report(operation, phase, counters)
+
+
+@contextmanager
+def _transaction(con, cur, operation):
+    """
+    Chạy khối with trong một giao dịch: commit (giai đoạn 'commit' của operation) khi thành công,
+    rollback khi lỗi. Với kết nối autocommit, giao dịch được mở tường minh (BEGIN),
+    để các lệnh trong khối vẫn là nguyên tử và các phiên khác không thấy trạng thái làm dở
+    Args:
+        con: Kết nối database
+        cur: Cursor dùng cho các lệnh trong khối
+        operation: Tên thao tác (cho số liệu đo)
+    """
+    explicit = con.autocommit
+    if explicit:
+        cur.execute("BEGIN")
+    try:
+        yield
+        with _phase(operation, 'commit'):
+            if explicit:
+                cur.execute("COMMIT")
+            else:
+                con.commit()
+    except BaseException:
+        _rollback(con)
+        raise
+    finally:
+        _end_partition_changes(con)
+
+
+def _rollback(con):
+    """
+    Hủy giao dịch đang mở của kết nối, kể cả giao dịch mở bằng BEGIN tường minh trên kết nối autocommit
+    (khi đó con.rollback() không làm gì)
+    Args:
+        con: Kết nối database
+    """
+    if not con.autocommit:
+        con.rollback()
+    elif con.info.transaction_status != psycopg2.extensions.TRANSACTION_STATUS_IDLE:
+        with con.cursor() as cur:
+            cur.execute("ROLLBACK")
+
+
+def _report(operation, phase, counters):
+    """
+    Gửi một event cho tất cả các hàm đã đăng ký
+    Args:
+        operation: Tên thao tác
+        phase: Tên giai đoạn
+        counters: Dict các bộ đếm của giai đoạn
+    """
+    event = dict(counters, operation=operation, phase=phase)
+    for callback in list(_instrumentation_hooks):
+        callback(event)
+
+
+class BulkLoadSession:
+    """
+    Trạng thái của một khối bulkload: thiết lập phiên và trạng thái ban đầu của các bảng cần khôi phục,
+    cùng thời gian của từng bước (giây): 'build' (thân khối with), 'setlogged', 'restore'
+    """
+
+    def __init__(self, setlogged):
+        self.setlogged = setlogged
+        self.settings = {}  # Tên thiết lập -> giá trị trước khối with
+        self.tables = {}    # Tên bảng -> (relpersistence, autovacuum_enabled) trước khi được xây dựng
+        self.timings = {}
+
+
+@contextmanager
+def bulkload(openconnection, setlogged=True, maintenance_work_mem=BULK_MAINTENANCE_WORK_MEM,
+             work_mem=BULK_WORK_MEM):
+    """
+    Chế độ tải hàng loạt cho các thao tác xây dựng bảng trên openconnection trong khối with, vd:
+        with bulkload(conn) as session:
+            loadratings('ratings', 'ratings.dat', conn)
+            rangepartition('ratings', 5, conn)
+        print(session.timings)
+    Bảng chính và các bảng phân vùng (backend 'table') được tạo trong khối là UNLOGGED (không ghi WAL)
+    và tạm dừng autovacuum; phiên dùng synchronous_commit = off và tăng maintenance_work_mem/work_mem.
+    Khi ra khỏi khối (kể cả khi lỗi, sau khi rollback): SET LOGGED các bảng nếu setlogged, khôi phục
+    autovacuum và các thiết lập phiên về giá trị trước đó.
+    Bảng UNLOGGED bị làm rỗng khi server gặp sự cố, nên setlogged=False chỉ phù hợp với dữ liệu có thể
+    tải lại; vì vậy không dùng được cùng loadratings(..., resume=True)
+    Args:
+        openconnection: Kết nối database
+        setlogged: True để chuyển các bảng về LOGGED khi kết thúc (ghi toàn bộ bảng vào WAL một lần)
+        maintenance_work_mem, work_mem: Giá trị thiết lập trong khối with
+    """
+    con = openconnection
+    if con in _bulk_sessions:
+        raise ValueError("bulkload is already active on this connection")
+    session = BulkLoadSession(setlogged)
+    settings = {'synchronous_commit': 'off', 'maintenance_work_mem': maintenance_work_mem, 'work_mem': work_mem}
+    with con.cursor() as cur:
+        for name, value in settings.items():
+            cur.execute("SELECT current_setting(%s), set_config(%s, %s, false)", (name, name, value))
+            session.settings[name] = cur.fetchone()[0]
+    con.commit()
+    _bulk_sessions[con] = session
+    start = time.perf_counter()
+    try:
+        yield session
+    except BaseException:
+        _rollback(con)  # Giao dịch dở dang (kể cả BEGIN tường minh) phải kết thúc trước khi khôi phục
+        raise
+    finally:
+        session.timings['build'] = time.perf_counter() - start
+        del _bulk_sessions[con]
+        _end_bulkload(con, session)
+
+
+def _end_bulkload(con, session):
+    """
+    Khôi phục trạng thái bảng và thiết lập phiên sau khối bulkload
+    Args:
+        con: Kết nối database
+        session: BulkLoadSession của khối
+    """
+    cur = _cursor(con)
+    # Bảng có thể đã bị xóa trong khối (vd: phân vùng thừa khi phân vùng lại với N nhỏ hơn)
+    cur.execute("SELECT relname FROM pg_class WHERE relname = ANY(%s) AND pg_table_is_visible(oid)",
+                (list(session.tables),))
+    tables = [row[0] for row in cur.fetchall()]
+    
+    start = time.perf_counter()
+    with _phase('bulkload', 'setlogged', cur):
+        for table in tables:
+            if session.setlogged and session.tables[table][0] == 'p':
+                cur.execute(f"ALTER TABLE {table} SET LOGGED")
+        con.commit()
+    session.timings['setlogged'] = time.perf_counter() - start
+    
+    start = time.perf_counter()
+    with _phase('bulkload', 'restore', cur):
+        for table in tables:
+            autovacuum = session.tables[table][1]
+            cur.execute(f"ALTER TABLE {table} SET (autovacuum_enabled = {autovacuum})" if autovacuum is not None
+                        else f"ALTER TABLE {table} RESET (autovacuum_enabled)")
+        for name, value in session.settings.items():
+            cur.execute("SELECT set_config(%s, %s, false)", (name, value))
+        con.commit()
+    session.timings['restore'] = time.perf_counter() - start
+    cur.close()
+
+
+def _bulk_prepare(cur, tables):
+    """
+    Trong khối bulkload: ghi lại trạng thái ban đầu rồi chuyển các bảng vừa tạo (hoặc vừa làm rỗng)
+    sang UNLOGGED và tạm dừng autovacuum; ngoài khối bulkload không làm gì
+    SET UNLOGGED viết lại bảng, nên hàm được gọi khi bảng còn rỗng
+    Args:
+        cur: Database cursor
+        tables: Danh sách tên bảng
+    """
+    session = _bulk_sessions.get(cur.connection)
+    if session is None:
+        return
+    cur.execute("""
+        SELECT c.relname, c.relpersistence,
+               (SELECT option_value FROM pg_options_to_table(c.reloptions) WHERE option_name = 'autovacuum_enabled')
+        FROM pg_class c
+        WHERE c.relname = ANY(%s) AND pg_table_is_visible(c.oid)
+    """, (list(tables),))
+    for table, persistence, autovacuum in cur.fetchall():
+        session.tables.setdefault(table, (persistence, autovacuum))  # Giữ trạng thái trước lần xây dựng đầu tiên
+    cur.execute('; '.join(f"ALTER TABLE {table} SET UNLOGGED, SET (autovacuum_enabled = false)" for table in tables))
+
+
+def loadratings(ratingstablename, ratingsfilepath, openconnection, workers=1, commit_every=None, compact=False,
+                resume=False, copyformat='text'):
+    """
+    Hàm tải dữ liệu từ file vào bảng cơ sở dữ liệu
+    Args:
+        ratingstablename: Tên bảng để lưu dữ liệu đánh giá
+        ratingsfilepath: Đường dẫn file chứa dữ liệu đánh giá
+        openconnection: Kết nối database đã mở
+        workers: Số tiến trình tải song song (mặc định: 1 - tải tuần tự trên openconnection),
+                 tối đa bằng số kết nối của pool (POOL_MAXCONN) vì mỗi tiến trình dùng một kết nối
+        commit_every: Số dòng (dương) giữa hai lần commit (mặc định: None - một giao dịch COPY duy nhất
+                      cho mỗi kết nối)
+        compact: True để lưu rating dạng real (4 byte) thay vì float (8 byte), xem _create_ratings_table
+        resume: True để tải có checkpoint: vị trí đã tải được ghi trong cùng giao dịch với mỗi lần commit,
+                lần gọi lại với cùng file (cùng kích thước, thời điểm sửa và SHA-256) tải tiếp từ checkpoint
+                thay vì tải lại từ đầu (chỉ với workers=1, commit_every mặc định LOAD_CHECKPOINT_ROWS)
+        copyformat: 'text' (mặc định) - gửi dữ liệu dạng text, server phân tích lại từng giá trị;
+                    'binary' - gửi int4/float8 đã phân tích (xem RatingsBinaryCopyStream)
+    """
+    if commit_every is not None and commit_every <= 0:
+        # Mỗi lệnh COPY phải nạp ít nhất một dòng, nếu không vòng lặp của _copy_lines không kết thúc
+        raise ValueError("commit_every must be a positive number of rows or None, got {!r}".format(commit_every))
+    if copyformat not in COPY_FORMATS:
+        raise ValueError("copyformat must be 'text' or 'binary', got {!r}".format(copyformat))
+    con = openconnection  # Lấy kết nối database
+    cur = _cursor(con)    # Tạo cursor để thực thi các câu lệnh SQL
+    
+    if resume:
+        if workers > 1:
+            raise ValueError("resume is only supported with workers=1")
+        if con in _bulk_sessions:
+            raise ValueError("resume cannot be used inside bulkload: unlogged tables are emptied after a crash")
+        _resumable_load(con, cur, ratingstablename, ratingsfilepath, commit_every or LOAD_CHECKPOINT_ROWS, compact,
+                        copyformat)
+        cur.close()
+        return
+    
+    # Xóa bảng nếu tồn tại và tạo bảng mới với cấu trúc cần thiết
+    with _phase('loadratings', 'create', cur, table=ratingstablename):
+        _create_ratings_table(cur, ratingstablename, compact)
+    
+    if workers <= 1:
+        # Tải tuần tự toàn bộ file trên kết nối hiện tại
+        with open(ratingsfilepath, 'rb') as f:
+            _copy_lines(con, cur, f, ratingstablename, os.path.getsize(ratingsfilepath), commit_every,
+                        copyformat=copyformat)
+        cur.close()  # Đóng cursor
+        return
+
+    # Chế độ song song: bảng phải được commit trước để các kết nối khác nhìn thấy
+    con.commit()
+    cur.close()
+
+    # Chia file thành các khoảng byte kết thúc tại ký tự xuống dòng,
+    # mỗi tiến trình tự phân tích khoảng của mình và COPY qua kết nối riêng
+    params = _connection_params(openconnection)
+    ranges = _split_file(ratingsfilepath, min(workers, getconnectionpool(**params).maxconn))
+    instrument = bool(_instrumentation_hooks)
+    with ProcessPoolExecutor(max_workers=len(ranges)) as executor:
+        futures = [executor.submit(_load_byte_range, ratingstablename, ratingsfilepath, start, end, params,
+                                   commit_every, instrument, copyformat)
+                   for start, end in ranges]
+        for worker, future in enumerate(futures):
+            rows, events = future.result()  # Ném lại lỗi của tiến trình con (nếu có)
+            # Gửi lại số liệu đo của tiến trình con cho các hàm đã đăng ký trong tiến trình này
+            for event in events:
+                _report(event['operation'], event['phase'], dict(event, worker=worker))
+
+
+def _create_ratings_table(cur, ratingstablename, compact=False):
+    """
+    Xóa bảng chính nếu tồn tại và tạo lại bảng rỗng
+    Các bảng phân vùng được tạo LIKE bảng chính nên dùng cùng kiểu cột
+    Args:
+        cur: Database cursor
+        ratingstablename: Tên bảng chính
+        compact: True để lưu rating dạng real: các bước nửa sao từ 0 đến 5 được biểu diễn chính xác.
+                 Cột 8 byte đứng trước cột 4 byte để không có byte đệm giữa các cột, nhưng mỗi dòng
+                 heap vẫn được làm tròn lên bội số của 8 byte (MAXALIGN) nên tiết kiệm phụ thuộc nền tảng
+    """
+    cur.execute(f"DROP TABLE IF EXISTS {ratingstablename}")
+    cur.execute(_ratings_table_ddl(ratingstablename, compact))
+    _bulk_prepare(cur, [ratingstablename])
+    # Checkpoint của lần tải có checkpoint trước và con trỏ round robin (nếu có) không còn khớp với bảng mới:
+    # không có con trỏ, roundrobininsert đếm lại bảng chính và khởi tạo lại con trỏ
+    cur.execute("SELECT to_regclass(%s) IS NOT NULL, to_regclass(%s) IS NOT NULL",
+                (LOAD_CHECKPOINT_TABLE, ROUNDROBIN_CURSOR_TABLE))
+    checkpoint, roundrobin = cur.fetchone()
+    if checkpoint:
+        cur.execute(f"DELETE FROM {LOAD_CHECKPOINT_TABLE} WHERE tablename = %s", (ratingstablename,))
+    if roundrobin:
+        cur.execute(f"DELETE FROM {ROUNDROBIN_CURSOR_TABLE} WHERE prefix = %s", (RROBIN_TABLE_PREFIX,))
+
+
+def _ratings_table_ddl(ratingstablename, compact=False):
+    """Câu lệnh CREATE TABLE của bảng chính (dùng chung với AsyncInterface)"""
+    return f"""
+        CREATE TABLE {ratingstablename} (
+            userid integer,      -- ID người dùng
+            movieid integer,     -- ID phim
+            rating {COMPACT_RATING_TYPE if compact else 'float'}  -- Điểm đánh giá (0.0 - 5.0)
+        )
+    """
+
+
+def _copy_lines(con, cur, f, ratingstablename, nbytes, commit_every=None, checkpoint=None, copyformat='text'):
+    """
+    Đọc tối đa nbytes byte (theo từng dòng) từ vị trí hiện tại của file nhị phân f
+    và COPY trực tiếp vào bảng thông qua RatingsCopyStream
+    Args:
+        con: Kết nối database
+        cur: Cursor của kết nối
+        f: File mở ở chế độ nhị phân, đã seek tới đầu một dòng
+        ratingstablename: Tên bảng đích
+        nbytes: Số byte cần xử lý (dòng bắt đầu trước giới hạn được đọc trọn vẹn)
+        commit_every: Số dòng tối đa cho mỗi lệnh COPY trước khi commit
+                      (None: toàn bộ khoảng được tải trong một giao dịch COPY)
+        checkpoint: Hàm checkpoint(cur, nbytes, lines, rows) được gọi trước mỗi lần commit với tổng số byte,
+                    số dòng file đã đọc và số dòng đã chèn tính từ đầu khoảng (để ghi trong cùng giao dịch)
+        copyformat: Định dạng COPY ('text' hoặc 'binary')
+    Returns:
+        Số dòng đã chèn
+    """
+    copy_sql = f"COPY {ratingstablename} (userid, movieid, rating) FROM STDIN"
+    stream_class = RatingsCopyStream
+    options = {}
+    if copyformat == 'binary':
+        # Định dạng binary phải khớp đúng kiểu cột: rating real (lược đồ gọn) được gửi dạng float4
+        cur.execute("SELECT atttypid = 'real'::regtype FROM pg_attribute WHERE attrelid = %s::regclass "
+                    "AND attname = 'rating'", (ratingstablename,))
+        copy_sql += " WITH (FORMAT binary)"
+        stream_class = RatingsBinaryCopyStream
+        options['compact'] = cur.fetchone()[0]
+    consumed = 0  # Số byte đã đọc từ file
+    lines = 0     # Số dòng file đã đọc
+    total = 0     # Số dòng đã chèn
+    while True:
+        # Mỗi lệnh COPY đọc dữ liệu từ stream cho tới khi hết khoảng byte hoặc đủ commit_every dòng
+        stream = stream_class(f, nbytes - consumed, commit_every, **options)
+        with _phase('loadratings', 'copy', cur, table=ratingstablename) as metrics:
+            cur.copy_expert(copy_sql, stream)
+            metrics.update(rows=stream.rows, bytes=stream.nbytes, parse_seconds=stream.seconds)
+        consumed += stream.nbytes
+        lines += stream.lines
+        total += stream.rows
+        if checkpoint is not None:
+            checkpoint(cur, consumed, lines, total)
+        with _phase('loadratings', 'commit'):
+            con.commit()  # Xác nhận giao dịch tại mỗi điểm commit
+        if stream.exhausted:  # Đã xử lý hết dữ liệu được giao
+            break
+    return total
+
+
+def _resumable_load(con, cur, ratingstablename, ratingsfilepath, commit_every, compact=False, copyformat='text'):
+    """
+    Tải file vào bảng chính với checkpoint (xem loadratings(..., resume=True))
+    Mỗi điểm commit cập nhật LOAD_CHECKPOINT_TABLE trong cùng giao dịch với dữ liệu của nó, nên vị trí
+    đã ghi luôn khớp với các dòng đã có trong bảng: tải tiếp từ đó không thiếu và không trùng dòng
+    Args:
+        con: Kết nối database
+        cur: Cursor của kết nối
+        ratingstablename: Tên bảng chính
+        ratingsfilepath: Đường dẫn file dữ liệu
+        commit_every: Số dòng giữa hai lần commit
+        compact: Lược đồ gọn, chỉ dùng khi phải tạo lại bảng
+        copyformat: Định dạng COPY ('text' hoặc 'binary')
+    """
+    identity = _file_identity(ratingsfilepath)
+    with _phase('loadratings', 'create', cur, table=ratingstablename):
+        start = _load_checkpoint(cur, ratingstablename, identity)
+        if start is None:
+            # Chưa có checkpoint khớp với file này: tải lại từ đầu
+            _create_ratings_table(cur, ratingstablename, compact)
+            start = (0, 0, 0)
+            _save_load_checkpoint(cur, ratingstablename, ratingsfilepath, identity, *start)
+    con.commit()
+    
+    offset, lines, rows = start
+    
+    def checkpoint(cur, nbytes, nlines, nrows):
+        cur.execute(f"""
+            UPDATE {LOAD_CHECKPOINT_TABLE} SET byteoffset = %s, linecount = %s, rowcount = %s
+            WHERE tablename = %s
+        """, (offset + nbytes, lines + nlines, rows + nrows, ratingstablename))
+    
+    with open(ratingsfilepath, 'rb') as f:
+        f.seek(offset)  # Checkpoint luôn nằm ở đầu một dòng
+        _copy_lines(con, cur, f, ratingstablename, identity[0] - offset, commit_every, checkpoint, copyformat)
+
+
+def _file_identity(ratingsfilepath):
+    """
+    Nhận diện nội dung file dữ liệu để chỉ tải tiếp khi file không đổi
+    Returns:
+        Bộ (kích thước, thời điểm sửa tính bằng nano giây, SHA-256 dạng hex)
+    """
+    stat = os.stat(ratingsfilepath)
+    digest = hashlib.sha256()
+    with open(ratingsfilepath, 'rb') as f:
+        for block in iter(lambda: f.read(1 << 20), b''):
+            digest.update(block)
+    return stat.st_size, stat.st_mtime_ns, digest.hexdigest()
+
+
+def _load_checkpoint(cur, ratingstablename, identity):
+    """
+    Đọc checkpoint của bảng chính nếu nó thuộc cùng file (theo identity) và bảng vẫn tồn tại
+    Args:
+        cur: Database cursor
+        ratingstablename: Tên bảng chính
+        identity: Kết quả của _file_identity
+    Returns:
+        Bộ (byteoffset, linecount, rowcount) hoặc None nếu phải tải lại từ đầu
+    """
+    cur.execute("SELECT to_regclass(%s) IS NOT NULL AND to_regclass(%s) IS NOT NULL",
+                (LOAD_CHECKPOINT_TABLE, ratingstablename))
+    if not cur.fetchone()[0]:
+        return None
+    cur.execute(f"""
+        SELECT byteoffset, linecount, rowcount FROM {LOAD_CHECKPOINT_TABLE}
+        WHERE tablename = %s AND filesize = %s AND filemtime = %s AND filehash = %s
+    """, (ratingstablename, *identity))
+    return cur.fetchone()
+
+
+def _save_load_checkpoint(cur, ratingstablename, ratingsfilepath, identity, byteoffset, linecount, rowcount):
+    """
+    Ghi checkpoint của bảng chính vào LOAD_CHECKPOINT_TABLE (tạo bảng nếu chưa có)
+    Args:
+        cur: Database cursor
+        ratingstablename: Tên bảng chính
+        ratingsfilepath: Đường dẫn file dữ liệu
+        identity: Kết quả của _file_identity
+        byteoffset, linecount, rowcount: Vị trí đã tải
+    """
+    cur.execute(_LOAD_CHECKPOINT_DDL)
+    cur.execute(f"""
+        INSERT INTO {LOAD_CHECKPOINT_TABLE}
+            (tablename, filepath, filesize, filemtime, filehash, byteoffset, linecount, rowcount)
+        VALUES (%s, %s, %s, %s, %s, %s, %s, %s)
+        ON CONFLICT (tablename) DO UPDATE
+        SET filepath = EXCLUDED.filepath, filesize = EXCLUDED.filesize, filemtime = EXCLUDED.filemtime,
+            filehash = EXCLUDED.filehash, byteoffset = EXCLUDED.byteoffset, linecount = EXCLUDED.linecount,
+            rowcount = EXCLUDED.rowcount
+    """, (ratingstablename, ratingsfilepath, *identity, byteoffset, linecount, rowcount))
+
+
+class RatingsCopyStream:
+    """
+    Adapter dạng file chỉ đọc dùng cho copy_expert: chuyển từng dòng
+    userID::movieID::rating::timestamp sang định dạng text của COPY ngay khi server đọc,
+    nên bộ nhớ sử dụng không phụ thuộc kích thước file (chỉ giữ tối đa một lần read)
+    Args:
+        f: File mở ở chế độ nhị phân, đã seek tới đầu một dòng
+        nbytes: Số byte tối đa được đọc từ f (None: đọc tới hết file)
+        maxrows: Số dòng tối đa trả về trước khi báo EOF (None: không giới hạn)
+        sink: Hàm nhận thêm một bản của mỗi dòng COPY (vd: để ghi đồng thời vào phân vùng)
+    """
+
+    header = b''   # Dữ liệu gửi trước dòng đầu tiên của mỗi lệnh COPY
+    trailer = b''  # Dữ liệu gửi sau dòng cuối cùng của mỗi lệnh COPY
+
+    def __init__(self, f, nbytes=None, maxrows=None, sink=None):
+        self.f = f
+        self.limit = nbytes
+        self.maxrows = maxrows
+        self.sink = sink
+        self.nbytes = 0          # Số byte đã đọc từ file
+        self.lines = 0           # Số dòng đã đọc từ file (kể cả dòng bị bỏ qua)
+        self.rows = 0            # Số dòng đã chuyển cho COPY
+        self.exhausted = False   # True khi đã hết dữ liệu nguồn (hết file hoặc hết khoảng byte)
+        self.seconds = 0.0       # Thời gian đọc và chuyển đổi dữ liệu (chỉ đo khi có hàm nhận số liệu đo)
+        self._timed = bool(_instrumentation_hooks)
+        self._pending = self.header  # Phần dữ liệu đã chuyển đổi nhưng chưa được đọc
+        self._ended = False      # True khi đã thêm trailer (không còn dòng nào cho lệnh COPY này)
+
+    def _nextline(self):
+        """
+        Đọc và chuyển đổi dòng hợp lệ kế tiếp
+        Returns:
+            Dòng COPY dạng bytes (xem _encode) hoặc None nếu hết dữ liệu
+        """
+        while True:
+            if self.limit is not None and self.nbytes >= self.limit:
+                self.exhausted = True
+                return None
+            line = self.f.readline()
+            if not line:  # Hết file
+                self.exhausted = True
+                return None
+            self.nbytes += len(line)
+            self.lines += 1
+            parts = line.strip().split(b'::')  # File định dạng userID::movieID::rating::timestamp
+            if len(parts) >= 3:  # Bỏ qua dòng không đủ thông tin
+                self.rows += 1
+                row = self._encode(parts)
+                if self.sink is not None:
+                    self.sink(row)
+                return row
+
+    def _encode(self, parts):
+        """
+        Chuyển các trường của một dòng file sang một dòng COPY dạng text (phân tách bằng tab)
+        Args:
+            parts: List các trường dạng bytes (userid, movieid, rating, ...)
+        """
+        return parts[0] + b'\t' + parts[1] + b'\t' + parts[2] + b'\n'
+
+    def read(self, size=-1):
+        """
+        Trả về tối đa size byte dữ liệu COPY, chuỗi rỗng nghĩa là kết thúc lệnh COPY
+        """
+        if not self._timed:
+            return self._read(size)
+        start = time.perf_counter()
+        try:
+            return self._read(size)
+        finally:
+            self.seconds += time.perf_counter() - start
+
+    def _read(self, size):
+        data = bytearray(self._pending)
+        while not self._ended and (size < 0 or len(data) < size):
+            line = None
+            if self.maxrows is None or self.rows < self.maxrows:  # Chưa đủ số dòng cho điểm commit này
+                line = self._nextline()
+            if line is None:
+                data += self.trailer
+                self._ended = True
+                break
+            data += line
+        if size < 0 or len(data) <= size:
+            self._pending = b''
+            return bytes(data)
+        self._pending = bytes(data[size:])
+        return bytes(data[:size])
+
+
+class RatingsBinaryCopyStream(RatingsCopyStream):
+    """
+    Như RatingsCopyStream nhưng sinh định dạng binary của COPY (COPY ... WITH (FORMAT binary)):
+    mỗi dòng là số trường (int16) rồi từng trường gồm độ dài (int32) và giá trị int4, int4, float8
+    theo thứ tự byte mạng. Các giá trị được phân tích một lần ở client thay vì server phải phân tích text
+    Args:
+        f, nbytes, maxrows, sink: Như RatingsCopyStream
+        compact: True nếu cột rating là real (gửi float4 thay vì float8)
+    """
+    header = b'PGCOPY\n\xff\r\n\x00' + struct.pack('!ii', 0, 0)  # Chữ ký, cờ, độ dài phần mở rộng
+    trailer = struct.pack('!h', -1)                                # Số trường -1 đánh dấu kết thúc
+
+    _ids = struct.Struct('!hiiii')  # Số trường, rồi độ dài và giá trị của userid, movieid
+
+    def __init__(self, f, nbytes=None, maxrows=None, sink=None, compact=False):
+        super().__init__(f, nbytes, maxrows, sink)
+        self._rating = struct.Struct('!if' if compact else '!id')  # Độ dài và giá trị của rating (float4/float8)
+        self._ratings = {}  # Trường rating đã mã hóa theo chuỗi gốc (rating chỉ có vài giá trị khác nhau)
+
+    def _encode(self, parts):
+        """
+        Chuyển các trường của một dòng file sang một dòng COPY dạng binary
+        Args:
+            parts: List các trường dạng bytes (userid, movieid, rating, ...)
+        """
+        rating = self._ratings.get(parts[2])
+        if rating is None:
+            rating = self._ratings[parts[2]] = self._rating.pack(self._rating.size - 4, float(parts[2]))
+        return self._ids.pack(3, 4, int(parts[0]), 4, int(parts[1])) + rating
+
+
+def _split_file(ratingsfilepath, parts):
+    """
+    Chia file thành các khoảng byte [start, end) liên tiếp, mỗi khoảng bắt đầu
+    và kết thúc đúng tại đầu một dòng
+    Args:
+        ratingsfilepath: Đường dẫn file dữ liệu
+        parts: Số khoảng mong muốn
+    Returns:
+        Danh sách các cặp (start, end), bỏ qua khoảng rỗng
+    """
+    size = os.path.getsize(ratingsfilepath)
+    offsets = [0]
+    with open(ratingsfilepath, 'rb') as f:
+        for i in range(1, parts):
+            f.seek(max(size * i // parts, offsets[-1]))
+            f.readline()  # Bỏ qua phần còn lại của dòng để tới đầu dòng kế tiếp
+            offsets.append(min(f.tell(), size))
+    offsets.append(size)
+    return [(start, end) for start, end in zip(offsets, offsets[1:]) if start < end]
+
+
+def _load_byte_range(ratingstablename, ratingsfilepath, start, end, params, commit_every=None, instrument=False,
+                     copyformat='text'):
+    """
+    Hàm chạy trong tiến trình con: mở kết nối riêng, phân tích và COPY khoảng byte [start, end)
+    Args:
+        ratingstablename: Tên bảng đích
+        ratingsfilepath: Đường dẫn file dữ liệu
+        start, end: Khoảng byte cần tải
+        params: Tham số kết nối (user, password, dbname)
+        commit_every: Số dòng giữa hai lần commit (None: một giao dịch duy nhất)
+        instrument: True để gom số liệu đo và trả về cho tiến trình cha
+        copyformat: Định dạng COPY ('text' hoặc 'binary')
+    Returns:
+        Cặp (số dòng đã chèn, danh sách event đo được)
+    """
+    # Hàm đo của tiến trình cha không chạy được ở đây: gom event để tiến trình cha gửi lại
+    events = []
+    _instrumentation_hooks[:] = [events.append] if instrument else []
+    con = getopenconnection(**params)
+    try:
+        cur = _cursor(con)
+        with open(ratingsfilepath, 'rb') as f:
+            f.seek(start)
+            rows = _copy_lines(con, cur, f, ratingstablename, end - start, commit_every, copyformat=copyformat)
+        cur.close()
+        return rows, events
+    finally:
+        con.close()
+
+
+def _connection_params(openconnection):
+    """
+    Lấy thông tin đăng nhập của một kết nối đang mở để mở thêm kết nối tới cùng database
+    Args:
+        openconnection: Kết nối database
+    Returns:
+        Dict gồm user, password, dbname dùng cho getopenconnection
+    """
+    info = openconnection.info
+    return {'user': info.user, 'password': info.password, 'dbname': info.dbname}
+
+def rangepartition(ratingstablename, numberofpartitions, openconnection, backend='table',
+                   boundaries='equal', histogram='stats'):
+    """
+    Hàm tạo phân vùng theo phạm vi (range partitioning) dựa trên điểm rating
+    Range Partitioning: Chia dữ liệu dựa trên khoảng giá trị liên tục của một thuộc tính
+    Bảng gốc chỉ được quét một lần: PostgreSQL tự định tuyến từng dòng tới phân vùng của nó
+    Args:
+        ratingstablename: Tên bảng chính chứa dữ liệu
+        numberofpartitions: Số phân vùng cần tạo
+        openconnection: Kết nối database
+        backend: 'table' (mặc định) - các phân vùng là bảng độc lập;
+                 'native' - các phân vùng thuộc bảng cha PARTITION BY RANGE (rating) của PostgreSQL
+        boundaries: 'equal' (mặc định) - các khoảng rating dài bằng nhau;
+                    'equidepth' - biên được chọn theo phân bố rating để các phân vùng có số dòng xấp xỉ nhau
+        histogram: Nguồn phân bố rating cho 'equidepth': 'stats' (pg_stats) hoặc 'sample' (quét mẫu bảng)
+    """
+    _check_backend(backend)
+    if boundaries not in ('equal', 'equidepth'):
+        raise ValueError("boundaries must be 'equal' or 'equidepth', got {!r}".format(boundaries))
+    con = openconnection
+    cur = _cursor(con)
+    # Toàn bộ việc tạo, nạp và ghi metadata nằm trong một giao dịch (kể cả với kết nối autocommit):
+    # nếu lỗi, không còn bảng định tuyến hay phân vùng nạp dở
+    with _transaction(con, cur, 'rangepartition'):
+        if boundaries == 'equidepth':
+            with _phase('rangepartition', 'histogram', cur, table=ratingstablename):
+                lows, highs = _equidepth_bounds(numberofpartitions,
+                                                _rating_histogram(cur, ratingstablename, histogram))
+        else:
+            lows, highs = _range_bounds(numberofpartitions)  # Biên của từng phân vùng (rating từ 0-5)
+        
+        if backend == 'native':
+            with _phase('rangepartition', 'fill', cur, table=f"{ratingstablename}_range") as metrics:
+                parent = _native_rangepartition(cur, ratingstablename, numberofpartitions, lows, highs)
+                metrics['rows'] = cur.rowcount
+            with _phase('rangepartition', 'metadata', cur):
+                _save_partition_metadata(cur, RANGE_TABLE_PREFIX, 'range', numberofpartitions, lows, highs,
+                                         backend='native', parenttable=parent)
+        else:
+            # Tạo (hoặc làm rỗng) các bảng range_part0, range_part1, range_part2, ...
+            with _phase('rangepartition', 'create', cur):
+                _create_partitions(cur, ratingstablename, RANGE_TABLE_PREFIX, numberofpartitions)
+            
+            # Phân chia dữ liệu vào các phân vùng dựa trên khoảng rating trong một lần quét:
+            # INSERT ... SELECT qua bảng định tuyến, PostgreSQL tự đưa từng dòng vào phân vùng của nó
+            with _phase('rangepartition', 'fill', cur, table=f"{ratingstablename}_range_router") as metrics:
+                router = _attach_range_router(cur, ratingstablename, numberofpartitions, lows, highs)
+                cur.execute(f"INSERT INTO {router} SELECT userid, movieid, rating FROM {ratingstablename}")
+                metrics['rows'] = cur.rowcount
+                _detach_range_router(cur, router, numberofpartitions)
+            
+            # Ghi lại số phân vùng và biên để rangeinsert định tuyến nhất quán
+            with _phase('rangepartition', 'metadata', cur):
+                _save_partition_metadata(cur, RANGE_TABLE_PREFIX, 'range', numberofpartitions, lows, highs)
+    cur.close()
+
+
+def _native_rangepartition(cur, ratingstablename, numberofpartitions, lows, highs):
+    """
+    Tạo bảng cha PARTITION BY RANGE (rating) với các phân vùng range_partK và nạp dữ liệu từ bảng chính
+    Phân vùng mặc định nhận các rating không thuộc phân vùng nào để việc chèn không bị lỗi
+    Args:
+        cur: Database cursor
+        ratingstablename: Tên bảng chính
+        numberofpartitions: Số phân vùng
+        lows, highs: Biên phân vùng do _range_bounds trả về
+    Returns:
+        Tên bảng cha
+    """
+    parent = f"{ratingstablename}_range"
+    _drop_replaced_partitions(cur, RANGE_TABLE_PREFIX, numberofpartitions)
+    cur.execute('; '.join([f"DROP TABLE IF EXISTS {RANGE_TABLE_PREFIX}{i}" for i in range(numberofpartitions)]))
+    cur.execute(f"DROP TABLE IF EXISTS {parent}")
+    cur.execute(f"CREATE TABLE {parent} (LIKE {ratingstablename}) PARTITION BY RANGE ((rating::float8))")
+    for i, (lower, upper) in enumerate(_native_range_bounds(lows, highs)):
+        cur.execute(f"CREATE TABLE {RANGE_TABLE_PREFIX}{i} PARTITION OF {parent} "
+                    f"FOR VALUES FROM ('{lower!r}') TO ('{upper!r}')")
+    cur.execute(f"CREATE TABLE {parent}_default PARTITION OF {parent} DEFAULT")
+    cur.execute(f"INSERT INTO {parent} SELECT userid, movieid, rating FROM {ratingstablename}")
+    return parent
+
+
+def _attach_range_router(cur, ratingstablename, numberofpartitions, lows, highs):
+    """
+    Gắn tạm các bảng range_partK vào một bảng cha PARTITION BY RANGE (rating) để một câu
+    INSERT/COPY duy nhất vào bảng cha được PostgreSQL định tuyến từng dòng phía server.
+    Phải được gọi trong một giao dịch (xem _transaction) cùng với _detach_range_router: bảng cha bị xóa
+    trước khi commit nên các phiên khác không nhìn thấy, và không còn sót lại nếu việc nạp bị lỗi
+    Args:
+        cur: Database cursor
+        ratingstablename: Tên bảng chính (dùng để đặt tên bảng định tuyến)
+        numberofpartitions: Số phân vùng
+        lows, highs: Biên phân vùng do _range_bounds trả về
+    Returns:
+        Tên bảng định tuyến
+    """
+    router, statements = _range_router_sql(ratingstablename, numberofpartitions, lows, highs)
+    for statement in statements:
+        cur.execute(statement)
+    return router
+
+
+def _range_router_sql(ratingstablename, numberofpartitions, lows, highs):
+    """
+    Các lệnh tạo bảng định tuyến range của _attach_range_router (dùng chung với AsyncInterface)
+    Args:
+        ratingstablename: Tên bảng chính (dùng để đặt tên bảng định tuyến)
+        numberofpartitions: Số phân vùng
+        lows, highs: Biên phân vùng do _range_bounds trả về
+    Returns:
+        (tên bảng định tuyến, danh sách lệnh SQL)
+    """
+    router = f"{ratingstablename}_range_router"
+    # Khóa phân vùng luôn là float8 để biên (tính bằng số thực 8 byte) đúng với cả cột rating real
+    statements = [f"CREATE TABLE {router} (LIKE {ratingstablename}) PARTITION BY RANGE ((rating::float8))"]
+    for i, (lower, upper) in enumerate(_native_range_bounds(lows, highs)):
+        statements.append(f"ALTER TABLE {router} ATTACH PARTITION {RANGE_TABLE_PREFIX}{i} "
+                          f"FOR VALUES FROM ('{lower!r}') TO ('{upper!r}')")
+    # Phân vùng mặc định nhận các dòng không thuộc phân vùng nào (NULL, ngoài [0, 5]) rồi bị hủy,
+    # giống như mệnh đề WHERE của cách làm cũ bỏ qua chúng
+    statements.append(f"CREATE TABLE {router}_default PARTITION OF {router} DEFAULT")
+    return router, statements
+
+
+def _detach_range_router(cur, router, numberofpartitions, prefix=RANGE_TABLE_PREFIX):
+    """
+    Tách các phân vùng ra thành bảng độc lập như trước và xóa bảng định tuyến
+    Args:
+        cur: Database cursor
+        router: Tên bảng định tuyến do _attach_range_router (hoặc _attach_hash_router) trả về
+        numberofpartitions: Số phân vùng
+        prefix: Tiền tố tên bảng phân vùng
+    """
+    for statement in _detach_router_sql(router, numberofpartitions, prefix):
+        cur.execute(statement)
+
+
+def _detach_router_sql(router, numberofpartitions, prefix=RANGE_TABLE_PREFIX):
+    """
+    Các lệnh của _detach_range_router (dùng chung với AsyncInterface)
+    Returns:
+        Danh sách lệnh SQL
+    """
+    return ([f"DROP TABLE {router}_default"]
+            + [f"ALTER TABLE {router} DETACH PARTITION {prefix}{i}" for i in range(numberofpartitions)]
+            + [f"DROP TABLE {router}"])
+
+
+def _range_bounds(numberofpartitions):
+    """
+    Tính biên của các phân vùng range với khoảng đều nhau trên thang rating 0-5
+    Phân vùng 0 gồm lows[0] <= rating <= highs[0], phân vùng i > 0 gồm lows[i] < rating <= highs[i]
+    Args:
+        numberofpartitions: Số phân vùng
+    Returns:
+        Cặp (lows, highs) gồm danh sách cận dưới và cận trên của từng phân vùng
+    """
+    delta = 5.0 / numberofpartitions  # Tính khoảng cách giữa các phân vùng (rating từ 0-5)
+    lows = [i * delta for i in range(numberofpartitions)]  # Giá trị rating tối thiểu của phân vùng
+    highs = [low + delta for low in lows]                   # Giá trị rating tối đa của phân vùng
+    return lows, highs
+
+
+def _rating_histogram(cur, ratingstablename, histogram='stats'):
+    """
+    Ước lượng phân bố của cột rating
+    Args:
+        cur: Database cursor
+        ratingstablename: Tên bảng chính
+        histogram: 'stats' - đọc pg_stats (chạy ANALYZE nếu bảng chưa có thống kê);
+                   'sample' - đếm theo giá trị trên mẫu TABLESAMPLE SYSTEM (EQUIDEPTH_SAMPLE_PERCENT)
+    Returns:
+        Dict giá trị rating -> tỷ trọng (không cần chuẩn hóa)
+    """
+    if histogram == 'sample':
+        cur.execute(f"SELECT rating, COUNT(*) FROM {ratingstablename} TABLESAMPLE SYSTEM (%s) "
+                    f"WHERE rating IS NOT NULL GROUP BY rating", (EQUIDEPTH_SAMPLE_PERCENT,))
+        weights = dict(cur.fetchall())
+        if not weights:  # Bảng quá nhỏ nên mẫu rỗng: đếm toàn bộ bảng
+            cur.execute(f"SELECT rating, COUNT(*) FROM {ratingstablename} WHERE rating IS NOT NULL GROUP BY rating")
+            weights = dict(cur.fetchall())
+        return weights
+    if histogram != 'stats':
+        raise ValueError("histogram must be 'stats' or 'sample', got {!r}".format(histogram))
+    
+    query = """
+        SELECT most_common_vals::text::float8[], most_common_freqs, histogram_bounds::text::float8[]
+        FROM pg_stats WHERE schemaname = current_schema() AND tablename = %s AND attname = 'rating'
+    """
+    cur.execute(query, (ratingstablename,))
+    row = cur.fetchone()
+    if row is None:
+        cur.execute(f"ANALYZE {ratingstablename} (rating)")
+        cur.execute(query, (ratingstablename,))
+        row = cur.fetchone()
+    values, freqs, bounds = row if row is not None else (None, None, None)
+    weights = dict(zip(values or [], freqs or []))
+    if bounds:
+        # Các giá trị ngoài danh sách phổ biến chia đều phần tỷ trọng còn lại giữa các biên histogram
+        share = max(0.0, 1.0 - sum(weights.values())) / len(bounds)
+        for value in bounds:
+            weights[value] = weights.get(value, 0.0) + share
+    return weights
+
+
+def _equidepth_bounds(numberofpartitions, weights):
+    """
+    Tính biên phân vùng range sao cho phân vùng lớn nhất nhỏ nhất có thể (các phân vùng xấp xỉ bằng nhau)
+    Biên được đặt tại các giá trị rating (cận trên bao gồm, như _range_bounds) nên một giá trị chiếm nhiều
+    dòng không thể bị chia. Các giá trị được gom thành nhóm liên tiếp: tìm nhị phân tỷ trọng tối đa nhỏ nhất
+    mà cách gom tham lam vẫn đủ số phân vùng, rồi tách các nhóm nặng nhất cho tới khi đủ. Nếu số giá trị
+    khác nhau ít hơn số phân vùng, khoảng rộng nhất được chia đôi (phân vùng rỗng)
+    Args:
+        numberofpartitions: Số phân vùng
+        weights: Dict giá trị rating -> tỷ trọng (do _rating_histogram trả về)
+    Returns:
+        Cặp (lows, highs) cùng dạng với _range_bounds, phủ ít nhất [0, 5]
+    """
+    values = sorted(weights)
+    start = min([0.0] + values)
+    end = max([5.0] + values)
+    prefix = list(itertools.accumulate((weights[value] for value in values), initial=0.0))
+    
+    def pack(capacity):
+        # Gom tham lam các giá trị liên tiếp thành nhóm [i, j) có tỷ trọng <= capacity (ít nhất một giá trị):
+        # j là chỉ số lớn nhất có prefix[j] <= prefix[i] + capacity, tìm nhị phân trên tổng tích lũy
+        groups, i = [], 0
+        while i < len(values):
+            j = max(i + 1, bisect_right(prefix, prefix[i] + capacity, i + 1) - 1)
+            groups.append((i, j))
+            i = j
+        return groups
+    
+    groups = []
+    if values:
+        wanted = min(numberofpartitions, len(values))
+        # Tìm nhị phân trực tiếp trên giá trị tỷ trọng tối đa (không liệt kê mọi cặp tổng tích lũy, vốn tăng
+        # theo bình phương số giá trị khác nhau khi rating liên tục), tới khi không chia đôi được nữa
+        lo, hi = 0.0, prefix[-1]
+        while True:
+            mid = (lo + hi) / 2
+            if mid <= lo or mid >= hi:
+                break
+            if len(pack(mid)) <= wanted:
+                hi = mid
+            else:
+                lo = mid
+        groups = pack(hi)
+        while len(groups) < wanted:  # Tách nhóm nặng nhất (có từ hai giá trị) tại điểm cân bằng nhất
+            i, j = max((g for g in groups if g[1] - g[0] > 1), key=lambda g: prefix[g[1]] - prefix[g[0]])
+            k = min(range(i + 1, j), key=lambda k: max(prefix[k] - prefix[i], prefix[j] - prefix[k]))
+            groups[groups.index((i, j)):groups.index((i, j)) + 1] = [(i, k), (k, j)]
+    
+    highs = [values[j - 1] for _, j in groups[:-1]] + [end]
+    while len(highs) < numberofpartitions:  # Bổ sung phân vùng rỗng
+        edges = [start] + highs
+        i = max(range(len(highs)), key=lambda k: edges[k + 1] - edges[k])
+        highs.insert(i, (edges[i] + edges[i + 1]) / 2)
+    lows = [start] + highs[:-1]
+    return lows, highs
+
+
+def _range_index(rating, lows, highs):
+    """
+    Xác định phân vùng range chứa rating theo cùng điều kiện biên với rangepartition
+    Args:
+        rating: Giá trị rating
+        lows, highs: Cận dưới và cận trên của từng phân vùng
+    Returns:
+        Chỉ số phân vùng, hoặc None nếu rating không thuộc phân vùng nào
+    """
+    i = bisect_left(highs, rating)  # Phân vùng đầu tiên có cận trên >= rating
+    if i < len(highs) and (rating > lows[i] or (i == 0 and rating >= lows[0])):
+        return i
+    return None
+
+
+def _native_range_bounds(lows, highs):
+    """
+    Chuyển biên (lows, highs] sang dạng FROM (bao gồm) TO (không bao gồm) của PostgreSQL
+    bằng cách lấy số float liền sau mỗi biên. Khi hai khoảng chồng nhau một ulp do sai số
+    làm tròn, phần chồng thuộc về phân vùng đứng trước
+    Args:
+        lows, highs: Biên phân vùng do _range_bounds trả về
+    Returns:
+        Danh sách cặp (lower, upper) cho từng phân vùng
+    """
+    bounds = []
+    for i, (low, high) in enumerate(zip(lows, highs)):
+        lower = low if i == 0 else math.nextafter(low, math.inf)  # Phân vùng 0 bao gồm cả biên trái
+        if bounds:
+            lower = max(lower, bounds[-1][1])
+        bounds.append((lower, math.nextafter(high, math.inf)))
+    return bounds
+
+
+def _drop_indexes_sql(tablenames):
+    """
+    Lệnh xóa các index của các bảng đã có (trừ index phục vụ ràng buộc PRIMARY KEY/UNIQUE/EXCLUDE).
+    TRUNCATE giữ lại index nên phân vùng dùng lại từ lần trước sẽ phải cập nhật index cho từng dòng
+    khi nạp; xóa trước khi nạp để buildindexes dựng lại một lần trên dữ liệu mới
+    Args:
+        tablenames: Danh sách tên bảng (phải đã tồn tại)
+    Returns:
+        Lệnh SQL (khối DO, không có tham số nên dùng được cho cả psycopg2 và asyncpg)
+    """
+    tables = ', '.join(f"'{table}'" for table in tablenames)
+    return f"""
+        DO $$ DECLARE idx regclass; BEGIN
+            FOR idx IN SELECT i.indexrelid::regclass FROM pg_index i
+                       WHERE i.indrelid = ANY(ARRAY[{tables}]::regclass[])
+                         AND NOT EXISTS (SELECT 1 FROM pg_constraint c
+                                         WHERE c.conrelid = i.indrelid AND c.conindid = i.indexrelid)
+            LOOP
+                EXECUTE format('DROP INDEX %s', idx);
+            END LOOP;
+        END $$"""
+
+
+def _create_partitions(cur, ratingstablename, prefix, numberofpartitions):
+    """
+    Tạo các bảng phân vùng prefix0 ... prefix{N-1} (cùng cấu trúc với bảng chính) nếu chưa có và xóa dữ liệu cũ
+    cùng các index cũ (chạy lại buildindexes sau khi nạp)
+    Args:
+        cur: Database cursor
+        ratingstablename: Tên bảng chính
+        prefix: Tiền tố tên bảng phân vùng
+        numberofpartitions: Số phân vùng
+    """
+    # Xóa bảng cha native hoặc các phân vùng thừa của lần phân vùng trước
+    _drop_replaced_partitions(cur, prefix, numberofpartitions)
+    # Tạo tất cả các bảng phân vùng cùng lúc để tối ưu
+    cur.execute('; '.join([
+        f"CREATE TABLE IF NOT EXISTS {prefix}{i} (LIKE {ratingstablename})"
+        for i in range(numberofpartitions)
+    ]))
+    # Xóa index cũ (TRUNCATE giữ index) và dữ liệu cũ trong các phân vùng nếu có
+    cur.execute(_drop_indexes_sql([f"{prefix}{i}" for i in range(numberofpartitions)]))
+    cur.execute('; '.join([f"TRUNCATE TABLE {prefix}{i}" for i in range(numberofpartitions)]))
+    _bulk_prepare(cur, [f"{prefix}{i}" for i in range(numberofpartitions)])
+    
+    # Phân vùng còn lại từ lần trước có thể khác kiểu rating với bảng chính (vd: vừa đổi sang lược đồ gọn):
+    # đổi kiểu cột của các bảng đó (rẻ vì bảng đã rỗng)
+    cur.execute("""
+        SELECT c.relname, format_type(m.atttypid, m.atttypmod)
+        FROM pg_class c
+        JOIN pg_attribute a ON a.attrelid = c.oid AND a.attname = 'rating'
+        JOIN pg_attribute m ON m.attrelid = %s::regclass AND m.attname = 'rating'
+        WHERE c.relname = ANY(%s) AND pg_table_is_visible(c.oid) AND a.atttypid <> m.atttypid
+    """, (ratingstablename, [f"{prefix}{i}" for i in range(numberofpartitions)]))
+    for table, ratingtype in cur.fetchall():
+        cur.execute(f"ALTER TABLE {table} ALTER COLUMN rating TYPE {ratingtype}")
+
+def roundrobinpartition(ratingstablename, numberofpartitions, openconnection, backend='table'):
+    """
+    Hàm tạo phân vùng theo phương pháp round robin
+    Round Robin Partitioning: Phân chia dữ liệu tuần tự vào các phân vùng theo thứ tự
+    Dòng 1 -> phân vùng 0, dòng 2 -> phân vùng 1, ..., dòng n -> phân vùng (n % numberofpartitions)
+    Bảng gốc chỉ được quét và đánh số một lần, bất kể số phân vùng
+    Args:
+        ratingstablename: Tên bảng chính chứa dữ liệu
+        numberofpartitions: Số phân vùng cần tạo
+        openconnection: Kết nối database
+        backend: 'table' (mặc định) - các phân vùng là bảng độc lập;
+                 'native' - các phân vùng thuộc bảng cha PARTITION BY LIST của PostgreSQL
+                 trên cột slot = số thứ tự dòng % numberofpartitions (lấy từ một sequence)
+    """
+    _check_backend(backend)
+    con = openconnection
+    cur = _cursor(con)
+    
+    with _transaction(con, cur, 'roundrobinpartition'):
+        if backend == 'native':
+            with _phase('roundrobinpartition', 'fill', cur, table=f"{ratingstablename}_rrobin") as metrics:
+                parent = _native_roundrobinpartition(cur, ratingstablename, numberofpartitions)
+                metrics['rows'] = cur.rowcount
+            with _phase('roundrobinpartition', 'metadata', cur):
+                _save_partition_metadata(cur, RROBIN_TABLE_PREFIX, 'roundrobin', numberofpartitions,
+                                         backend='native', parenttable=parent)
+        else:
+            # Tạo (hoặc làm rỗng) các bảng rrobin_part0, rrobin_part1, rrobin_part2, ...
+            with _phase('roundrobinpartition', 'create', cur):
+                _create_partitions(cur, ratingstablename, RROBIN_TABLE_PREFIX, numberofpartitions)
+            
+            # Quét bảng gốc một lần bằng COPY TO theo thứ tự vật lý (cùng thứ tự với ROW_NUMBER() OVER ()):
+            # dòng thứ k (đếm từ 0) được ghi vào file tạm của phân vùng k % numberofpartitions
+            spools = [TemporaryFile() for _ in range(numberofpartitions)]
+            try:
+                with _phase('roundrobinpartition', 'scan', cur, table=ratingstablename) as metrics:
+                    cur.copy_expert(f"COPY {ratingstablename} (userid, movieid, rating) TO STDOUT",
+                                    _RowDispatcher(_roundrobin_chooser(spools)))
+                    totalrows = cur.rowcount  # Số dòng COPY đã đọc từ bảng gốc
+                    metrics['rows'] = totalrows
+                _copy_spools(cur, RROBIN_TABLE_PREFIX, spools, 'roundrobinpartition')
+            finally:
+                for spool in spools:
+                    spool.close()
+            
+            # Lưu metadata và vị trí round robin kế tiếp để roundrobininsert không phải đếm lại bảng gốc
+            with _phase('roundrobinpartition', 'metadata', cur):
+                _save_partition_metadata(cur, RROBIN_TABLE_PREFIX, 'roundrobin', numberofpartitions)
+                _save_roundrobin_cursor(cur, numberofpartitions, totalrows)
+    cur.close()
+
+
+def _native_roundrobinpartition(cur, ratingstablename, numberofpartitions):
+    """
+    Tạo bảng cha PARTITION BY LIST (slot) với các phân vùng rrobin_partK và nạp dữ liệu từ bảng chính
+    Giá trị mặc định của slot là nextval(sequence) % numberofpartitions, sequence bắt đầu từ 0 nên
+    dòng thứ k được chèn (theo thứ tự quét bảng chính, rồi theo thứ tự chèn) vào phân vùng k % N
+    Args:
+        cur: Database cursor
+        ratingstablename: Tên bảng chính
+        numberofpartitions: Số phân vùng
+    Returns:
+        Tên bảng cha
+    """
+    parent = f"{ratingstablename}_rrobin"
+    sequence = f"{parent}_seq"
+    _drop_replaced_partitions(cur, RROBIN_TABLE_PREFIX, numberofpartitions)
+    cur.execute('; '.join([f"DROP TABLE IF EXISTS {RROBIN_TABLE_PREFIX}{i}" for i in range(numberofpartitions)]))
+    cur.execute(f"DROP TABLE IF EXISTS {parent}")
+    cur.execute(f"DROP SEQUENCE IF EXISTS {sequence}")
+    cur.execute(f"CREATE SEQUENCE {sequence} MINVALUE 0 START 0")
+    cur.execute(f"""
+        CREATE TABLE {parent} (
+            LIKE {ratingstablename},
+            slot integer NOT NULL DEFAULT (nextval('{sequence}') % {numberofpartitions})
+        ) PARTITION BY LIST (slot)
+    """)
+    cur.execute(f"ALTER SEQUENCE {sequence} OWNED BY {parent}.slot")  # Xóa cùng bảng cha
+    for i in range(numberofpartitions):
+        cur.execute(f"CREATE TABLE {RROBIN_TABLE_PREFIX}{i} PARTITION OF {parent} FOR VALUES IN ({i})")
+    cur.execute(f"INSERT INTO {parent} (userid, movieid, rating) SELECT userid, movieid, rating FROM {ratingstablename}")
+    return parent
+
+
+def _check_backend(backend):
+    """Kiểm tra giá trị tham số backend của các hàm phân vùng"""
+    if backend not in ('table', 'native'):
+        raise ValueError("backend must be 'table' or 'native', got {!r}".format(backend))
+
+
+def _drop_replaced_partitions(cur, prefix, numberofpartitions):
+    """
+    Dọn tập phân vùng cũ (theo metadata) trước khi tạo lại với numberofpartitions phân vùng:
+    xóa bảng cha (kèm các phân vùng) nếu đang dùng backend native, hoặc xóa các bảng phân vùng
+    thừa nếu tập cũ có nhiều phân vùng hơn
+    Args:
+        cur: Database cursor
+        prefix: Tiền tố tên bảng phân vùng
+        numberofpartitions: Số phân vùng sắp tạo
+    """
+    info = _partition_info(prefix, cur.connection)
+    if info is None:
+        return
+    if info['backend'] == 'native':
+        cur.execute(f"DROP TABLE IF EXISTS {info['parenttable']}")
+    elif len(info['tablenames']) > numberofpartitions:
+        cur.execute('; '.join(f"DROP TABLE IF EXISTS {table}" for table in info['tablenames'][numberofpartitions:]))
+    _partitions_changed(cur.connection, (_database_key(cur.connection), prefix))
+
+
+def _native_insert(cur, ratingstablename, parenttable, rows, advance=b''):
+    """
+    Chèn các dòng vào bảng chính và bảng cha native trong một câu lệnh duy nhất;
+    PostgreSQL tự định tuyến từng dòng tới phân vùng
+    Args:
+        cur: Database cursor
+        ratingstablename: Tên bảng chính
+        parenttable: Tên bảng cha của tập phân vùng native
+        rows: Danh sách các bộ (userid, movieid, rating)
+        advance: Lệnh gửi kèm trong cùng lượt (vd: _advance_roundrobin_sql), cùng giao dịch với lệnh chèn
+    """
+    values = b','.join(cur.mogrify("(%s,%s,%s)", tuple(row)) for row in rows)
+    cur.execute(b"WITH master AS (INSERT INTO " + ratingstablename.encode() + b" (userid, movieid, rating) VALUES "
+                + values + b") INSERT INTO " + parenttable.encode() + b" (userid, movieid, rating) VALUES " + values
+                + b";\n" + advance)
+
+
+def _advance_roundrobin_sql(count):
+    """
+    Lệnh tăng con trỏ round robin thêm count dòng, gửi kèm các lệnh chèn vào bảng chính không đi qua
+    roundrobininsert (rangeinsert, hashinsert...): vị trí con trỏ luôn bằng số dòng của bảng chính nên
+    roundrobininsert vẫn chọn phân vùng (số dòng - 1) % N như cách đếm cũ. Việc kiểm tra bảng con trỏ
+    nằm trong khối DO (phía server) nên không tốn thêm lượt gửi/nhận và không lỗi khi chưa có con trỏ
+    Args:
+        count: Số dòng được chèn vào bảng chính
+    Returns:
+        Lệnh SQL (bytes)
+    """
+    return (f"DO $$ BEGIN IF to_regclass('{ROUNDROBIN_CURSOR_TABLE}') IS NOT NULL THEN "
+            f"UPDATE {ROUNDROBIN_CURSOR_TABLE} SET nextrow = nextrow + {int(count)} "
+            f"WHERE prefix = '{RROBIN_TABLE_PREFIX}'; END IF; END $$;").encode()
+
+
+def _save_roundrobin_cursor(cur, numberofpartitions, nextrow):
+    """
+    Ghi con trỏ round robin vào bảng ROUNDROBIN_CURSOR_TABLE (tạo bảng nếu chưa có)
+    Args:
+        cur: Database cursor
+        numberofpartitions: Số phân vùng round robin
+        nextrow: Số thứ tự (đếm từ 0) của dòng kế tiếp được chèn vào bảng gốc
+    """
+    cur.execute(_ROUNDROBIN_CURSOR_DDL)
+    cur.execute(f"""
+        INSERT INTO {ROUNDROBIN_CURSOR_TABLE} (prefix, numberofpartitions, nextrow)
+        VALUES (%s, %s, %s)
+        ON CONFLICT (prefix) DO UPDATE
+        SET numberofpartitions = EXCLUDED.numberofpartitions, nextrow = EXCLUDED.nextrow
+    """, (RROBIN_TABLE_PREFIX, numberofpartitions, nextrow))
+
+
+class _RowDispatcher:
+    """
+    Đích ghi dạng file cho copy_expert(COPY ... TO STDOUT): psycopg2 gọi write một lần
+    cho mỗi dòng dữ liệu trọn vẹn, dòng đó được chuyển tới hàm ghi do choose chọn
+    Args:
+        choose: Hàm choose(row) trả về hàm ghi (vd: spool.write) cho dòng row, hoặc None để bỏ qua
+    """
+
+    def __init__(self, choose):
+        self.choose = choose
+
+    def write(self, row):
+        writer = self.choose(row)
+        if writer is not None:
+            writer(row)
+
+
+def _roundrobin_chooser(spools):
+    """
+    Tạo hàm chọn cho _RowDispatcher: dòng thứ k được ghi vào spools[k % len(spools)]
+    Args:
+        spools: Danh sách file tạm của các phân vùng
+    """
+    writers = itertools.cycle([spool.write for spool in spools])
+    return lambda row: next(writers)
+
+
+def _copy_spools(cur, prefix, spools, operation):
+    """
+    COPY nội dung các file tạm (định dạng text của COPY) vào bảng phân vùng tương ứng
+    Args:
+        cur: Database cursor
+        prefix: Tiền tố tên bảng phân vùng
+        spools: Danh sách file tạm, phần tử thứ i dành cho bảng prefix{i}
+        operation: Tên thao tác gọi hàm này (cho số liệu đo)
+    """
+    for i, spool in enumerate(spools):
+        with _phase(operation, 'fill', cur, table=f"{prefix}{i}", bytes=spool.tell()) as metrics:
+            spool.seek(0)
+            cur.copy_expert(f"COPY {prefix}{i} (userid, movieid, rating) FROM STDIN", spool)
+            metrics['rows'] = cur.rowcount
+
+def loadandpartition(ratingstablename, ratingsfilepath, scheme, numberofpartitions, openconnection, compact=False):
+    """
+    Tải file vào bảng chính và tạo phân vùng trong cùng một lần đọc file, không đọc lại bảng chính
+    Mỗi dòng vừa được COPY vào bảng chính vừa được ghi tạm để COPY vào phân vùng của nó:
+    range theo giá trị rating (định tuyến phía server), round robin theo thứ tự dòng trong file.
+    Kết quả giống loadratings rồi rangepartition/roundrobinpartition
+    Args:
+        ratingstablename: Tên bảng chính
+        ratingsfilepath: Đường dẫn file dữ liệu
+        scheme: Phương pháp phân vùng ('range' hoặc 'roundrobin')
+        numberofpartitions: Số phân vùng cần tạo
+        openconnection: Kết nối database
+        compact: True để dùng lược đồ gọn (rating real) như loadratings
+    """
+    if scheme not in ('range', 'roundrobin'):
+        raise ValueError("scheme must be 'range' or 'roundrobin', got {!r}".format(scheme))
+    prefix = RANGE_TABLE_PREFIX if scheme == 'range' else RROBIN_TABLE_PREFIX
+    con = openconnection
+    cur = _cursor(con)
+    
+    # Bảng chính, các phân vùng và metadata được tạo trong một giao dịch (kể cả với kết nối autocommit)
+    with _transaction(con, cur, 'loadandpartition'):
+        with _phase('loadandpartition', 'create', cur):
+            _create_ratings_table(cur, ratingstablename, compact)
+            _create_partitions(cur, ratingstablename, prefix, numberofpartitions)
+        
+        # COPY vào bảng chính; mỗi dòng đã chuyển đổi được ghi thêm vào file tạm:
+        # với range là một file chung (PostgreSQL định tuyến khi COPY lại), với round robin
+        # là file của phân vùng theo thứ tự dòng
+        spools = [TemporaryFile() for _ in range(1 if scheme == 'range' else numberofpartitions)]
+        try:
+            if scheme == 'range':
+                sink = spools[0].write
+            else:
+                sink = _RowDispatcher(_roundrobin_chooser(spools)).write
+            with open(ratingsfilepath, 'rb') as f, \
+                    _phase('loadandpartition', 'copy', cur, table=ratingstablename) as metrics:
+                stream = RatingsCopyStream(f, sink=sink)
+                cur.copy_expert(f"COPY {ratingstablename} (userid, movieid, rating) FROM STDIN", stream)
+                metrics.update(rows=stream.rows, bytes=stream.nbytes, parse_seconds=stream.seconds)
+        
+            if scheme == 'range':
+                lows, highs = _range_bounds(numberofpartitions)
+                with _phase('loadandpartition', 'fill', cur, table=f"{ratingstablename}_range_router",
+                            bytes=spools[0].tell()) as metrics:
+                    router = _attach_range_router(cur, ratingstablename, numberofpartitions, lows, highs)
+                    spools[0].seek(0)
+                    cur.copy_expert(f"COPY {router} (userid, movieid, rating) FROM STDIN", spools[0])
+                    metrics['rows'] = cur.rowcount
+                    _detach_range_router(cur, router, numberofpartitions)
+            else:
+                _copy_spools(cur, prefix, spools, 'loadandpartition')
+        finally:
+            for spool in spools:
+                spool.close()
+        
+        # Ghi metadata giống như các hàm phân vùng
+        with _phase('loadandpartition', 'metadata', cur):
+            if scheme == 'range':
+                _save_partition_metadata(cur, prefix, 'range', numberofpartitions, lows, highs)
+            else:
+                _save_partition_metadata(cur, prefix, 'roundrobin', numberofpartitions)
+                _save_roundrobin_cursor(cur, numberofpartitions, stream.rows)
+    
+    cur.close()
+
+def _routed_insert(prefix, openconnection, insert, *args):
+    """
+    Gọi insert(*args, openconnection), một hàm chèn định tuyến theo metadata của tập phân vùng prefix
+    Nếu metadata lấy từ bộ nhớ đệm và lệnh chèn gặp bảng không tồn tại (tập phân vùng bị xóa hoặc
+    tạo lại ngoài tiến trình này), bản ghi bộ nhớ đệm bị xóa và lệnh chèn được thử lại một lần
+    với metadata đọc lại từ database
+    Args:
+        prefix: Tiền tố tên bảng phân vùng
+        openconnection: Kết nối database
+        insert: Hàm chèn
+        args: Các tham số của insert trước openconnection
+    """
+    key = (_database_key(openconnection), prefix)
+    cached = key in _partition_cache
+    try:
+        return insert(*args, openconnection)
+    except psycopg2.errors.UndefinedTable:
+        _rollback(openconnection)
+        if not cached:
+            raise  # Metadata vừa được đọc từ database: lỗi không do bộ nhớ đệm
+    _forget_partition_info([key])
+    return insert(*args, openconnection)
+
+
+def roundrobininsert(ratingstablename, userid, itemid, rating, openconnection):
+    """
+    Hàm chèn dữ liệu mới vào bảng chính và phân vùng round robin tương ứng
+    Vị trí round robin được lấy từ con trỏ do roundrobinpartition lưu lại nên chi phí
+    mỗi lần chèn không phụ thuộc kích thước bảng chính. Việc lấy vị trí và chèn nằm trong một giao dịch
+    (kể cả với kết nối autocommit): nếu chèn lỗi, con trỏ không bị tăng
+    Args:
+        ratingstablename: Tên bảng chính
+        userid: ID người dùng
+        itemid: ID phim (movie)
+        rating: Điểm đánh giá
+        openconnection: Kết nối database
+    """
+    _routed_insert(RROBIN_TABLE_PREFIX, openconnection, _roundrobininsert_row, ratingstablename, userid, itemid, rating)
+
+
+def _roundrobininsert_row(ratingstablename, userid, itemid, rating, openconnection):
+    """Phần thân của roundrobininsert (xem _routed_insert)"""
+    con = openconnection
+    cur = _cursor(con)
+    
+    try:
+        with _phase('roundrobininsert', 'insert', cur, rows=1), _transaction(con, cur, 'roundrobininsert'):
+            info = _partition_info(RROBIN_TABLE_PREFIX, openconnection)
+            if info is not None and info['backend'] == 'native':
+                # Backend native: sequence của bảng cha cấp vị trí, PostgreSQL tự định tuyến
+                _native_insert(cur, ratingstablename, info['parenttable'], [(userid, itemid, rating)])
+                return
+            
+            # Lấy và tăng con trỏ round robin trong cùng một câu lệnh (khóa dòng con trỏ tới khi commit)
+            slot = _next_roundrobin_slot(cur, openconnection)
+            if slot is None:
+                # Chưa có con trỏ (phân vùng được tạo bởi phiên bản cũ): tính như trước và khởi tạo con trỏ
+                slot = _legacy_roundrobin_slot(cur, ratingstablename, openconnection)
+            
+            # Tính chỉ số phân vùng dựa trên thuật toán round robin
+            ordinal, numberofpartitions = slot
+            index = ordinal % numberofpartitions
+            
+            # Chèn vào bảng chính và phân vùng round robin tương ứng
+            cur.execute("""
+                INSERT INTO {} (userid, movieid, rating)
+                VALUES (%s, %s, %s);
+                INSERT INTO rrobin_part{} (userid, movieid, rating)
+                VALUES (%s, %s, %s);
+            """.format(ratingstablename, index), (userid, itemid, rating, userid, itemid, rating))
+    finally:
+        cur.close()  # Đảm bảo đóng cursor trong mọi trường hợp
+
+
+def _next_roundrobin_slot(cur, openconnection, count=1):
+    """
+    Lấy số thứ tự dòng kế tiếp từ con trỏ round robin và tăng con trỏ lên count
+    Args:
+        cur: Database cursor (đang trong giao dịch, xem _transaction)
+        openconnection: Kết nối database
+        count: Số dòng cần cấp vị trí (mặc định: 1)
+    Returns:
+        Cặp (ordinal, numberofpartitions) với ordinal là số thứ tự của dòng đầu tiên,
+        hoặc None nếu chưa có con trỏ
+    """
+    try:
+        cur.execute(f"""
+            UPDATE {ROUNDROBIN_CURSOR_TABLE} SET nextrow = nextrow + %s
+            WHERE prefix = %s
+            RETURNING nextrow - %s, numberofpartitions
+        """, (count, RROBIN_TABLE_PREFIX, count))
+    except psycopg2.errors.UndefinedTable:
+        # Bảng con trỏ chưa tồn tại, giao dịch bị hủy nên bắt đầu lại
+        if openconnection.autocommit:
+            cur.execute("ROLLBACK; BEGIN")
+        else:
+            openconnection.rollback()
+        return None
+    return cur.fetchone()
+
+
+def _legacy_roundrobin_slot(cur, ratingstablename, openconnection, count=1):
+    """
+    Tính vị trí round robin bằng cách đếm bảng chính (cách làm cũ) và khởi tạo con trỏ
+    Args:
+        cur: Database cursor
+        ratingstablename: Tên bảng chính
+        openconnection: Kết nối database
+        count: Số dòng sắp được chèn
+    Returns:
+        Cặp (ordinal, numberofpartitions) giống _next_roundrobin_slot
+    """
+    cur.execute("SELECT COUNT(*) FROM {}".format(ratingstablename))
+    total_rows = cur.fetchone()[0]
+    numberofpartitions = count_partitions(RROBIN_TABLE_PREFIX, openconnection)
+    _save_roundrobin_cursor(cur, numberofpartitions, total_rows + count)
+    return total_rows, numberofpartitions
+
+
+def roundrobininsert_many(ratingstablename, rows, openconnection):
+    """
+    Chèn nhiều dòng vào bảng chính và các phân vùng round robin trong một giao dịch
+    (kể cả với kết nối autocommit). Kết quả giống hệt việc gọi roundrobininsert lần lượt cho từng dòng
+    Args:
+        ratingstablename: Tên bảng chính
+        rows: Iterable các bộ (userid, movieid, rating)
+        openconnection: Kết nối database
+    """
+    _routed_insert(RROBIN_TABLE_PREFIX, openconnection, _roundrobininsert_rows, ratingstablename, rows)
+
+
+def _roundrobininsert_rows(ratingstablename, rows, openconnection):
+    """Phần thân của roundrobininsert_many (xem _routed_insert)"""
+    rows = list(rows)
+    if not rows:
+        return
+    con = openconnection
+    cur = _cursor(con)
+    
+    try:
+        with _phase('roundrobininsert_many', 'insert', cur, rows=len(rows)), \
+                _transaction(con, cur, 'roundrobininsert_many'):
+            info = _partition_info(RROBIN_TABLE_PREFIX, openconnection)
+            if info is not None and info['backend'] == 'native':
+                _native_insert(cur, ratingstablename, info['parenttable'], rows)
+                return
+            
+            # Cấp len(rows) vị trí liên tiếp chỉ với một câu lệnh
+            slot = _next_roundrobin_slot(cur, openconnection, len(rows))
+            if slot is None:
+                slot = _legacy_roundrobin_slot(cur, ratingstablename, openconnection, len(rows))
+            ordinal, numberofpartitions = slot
+            
+            # Gom các dòng theo phân vùng đích: dòng thứ j nhận vị trí ordinal + j
+            groups = {}
+            for j, row in enumerate(rows):
+                groups.setdefault((ordinal + j) % numberofpartitions, []).append(row)
+            
+            cur.execute(_batch_insert_sql(cur, ratingstablename, RROBIN_TABLE_PREFIX, rows, groups))
+    finally:
+        cur.close()
+
+
+def _batch_insert_sql(cur, ratingstablename, prefix, rows, groups):
+    """
+    Tạo một chuỗi lệnh gồm một INSERT nhiều dòng vào bảng chính và một INSERT nhiều dòng
+    cho mỗi nhóm phân vùng
+    Args:
+        cur: Database cursor (dùng để escape giá trị)
+        ratingstablename: Tên bảng chính
+        prefix: Tiền tố tên bảng phân vùng
+        rows: Tất cả các dòng cần chèn vào bảng chính
+        groups: Dict chỉ số phân vùng -> danh sách dòng của phân vùng đó
+    Returns:
+        Chuỗi SQL (bytes)
+    """
+    def values(group):
+        return b','.join(cur.mogrify("(%s,%s,%s)", tuple(row)) for row in group)
+
+    statements = [b"INSERT INTO " + ratingstablename.encode() + b" (userid, movieid, rating) VALUES " + values(rows)]
+    for index, group in sorted(groups.items()):
+        statements.append(f"INSERT INTO {prefix}{index} (userid, movieid, rating) VALUES ".encode() + values(group))
+    return b';\n'.join(statements)
+
+def rangeinsert(ratingstablename, userid, itemid, rating, openconnection):
+    """
+    Hàm chèn dữ liệu mới vào bảng chính và phân vùng range tương ứng dựa trên giá trị rating
+    Args:
+        ratingstablename: Tên bảng chính
+        userid: ID người dùng  
+        itemid: ID phim (movie)
+        rating: Điểm đánh giá (dùng để xác định phân vùng)
+        openconnection: Kết nối database
+    """
+    _routed_insert(RANGE_TABLE_PREFIX, openconnection, _rangeinsert_row, ratingstablename, userid, itemid, rating)
+
+
+def _rangeinsert_row(ratingstablename, userid, itemid, rating, openconnection):
+    """Phần thân của rangeinsert (xem _routed_insert)"""
+    con = openconnection
+    cur = _cursor(con)
+    
+    with _phase('rangeinsert', 'insert', cur, rows=1):
+        # Con trỏ round robin (nếu có) được tăng trong cùng giao dịch với lệnh chèn vào bảng chính
+        advance = _advance_roundrobin_sql(1)
+        
+        # Tính toán phân vùng dựa trên giá trị rating với cùng biên đã dùng khi tạo phân vùng
+        info = _partition_info(RANGE_TABLE_PREFIX, openconnection)
+        if info is not None and info['backend'] == 'native':
+            # Backend native: PostgreSQL tự định tuyến, chỉ cần một câu lệnh
+            _native_insert(cur, ratingstablename, info['parenttable'], [(userid, itemid, rating)], advance)
+            cur.close()
+            con.commit()
+            return
+        lows, highs = _current_range_bounds(openconnection)
+        index = _range_index(rating, lows, highs)  # Xác định chỉ số phân vùng
+        
+        if index is None:
+            # Rating không thuộc phân vùng nào (giống rangepartition): chỉ chèn vào bảng chính
+            cur.execute(cur.mogrify("INSERT INTO {} (userid, movieid, rating) VALUES (%s, %s, %s);\n".format(
+                ratingstablename), (userid, itemid, rating)) + advance)
+            cur.close()
+            con.commit()
+            return
+        
+        # Chèn vào cả bảng chính và phân vùng trong một giao dịch
+        cur.execute(b"BEGIN;\n" + cur.mogrify("""
+            INSERT INTO {} (userid, movieid, rating)
+            VALUES (%s, %s, %s);
+            INSERT INTO range_part{} (userid, movieid, rating)
+            VALUES (%s, %s, %s);
+        """.format(ratingstablename, index), 
+        (userid, itemid, rating, userid, itemid, rating)) + advance + b"\nCOMMIT;")
+        
+        cur.close()
+        con.commit()  # Xác nhận giao dịch
+
+def rangeinsert_many(ratingstablename, rows, openconnection):
+    """
+    Chèn nhiều dòng vào bảng chính và các phân vùng range tương ứng trong một giao dịch
+    Các dòng được gom theo phân vùng đích, mỗi bảng chỉ nhận một câu INSERT nhiều dòng
     Args:
-        user: Tên người dùng (mặc định: 'postgres')
-        password: Mật khẩu (mặc định: '1234') 
-        dbname: Tên cơ sở dữ liệu (mặc định: 'postgres')
-    Returns:
-        Đối tượng kết nối psycopg2
+        ratingstablename: Tên bảng chính
+        rows: Iterable các bộ (userid, movieid, rating)
+        openconnection: Kết nối database
     """
-    return psycopg2.connect("dbname='" + dbname + "' user='" + user + "' host='localhost' password='" + password + "'")
+    _routed_insert(RANGE_TABLE_PREFIX, openconnection, _rangeinsert_rows, ratingstablename, rows)
 
 
-def loadratings(ratingstablename, ratingsfilepath, openconnection): 
-    """
-    Hàm tải dữ liệu từ file vào bảng cơ sở dữ liệu
-    Args:
-        ratingstablename: Tên bảng để lưu dữ liệu đánh giá
-        ratingsfilepath: Đường dẫn file chứa dữ liệu đánh giá
-        openconnection: Kết nối database đã mở
-    """
-    con = openconnection  # Lấy kết nối database
-    cur = con.cursor()    # Tạo cursor để thực thi các câu lệnh SQL
-    
-    # Xóa bảng nếu tồn tại và tạo bảng mới với cấu trúc cần thiết
-    cur.execute(f"DROP TABLE IF EXISTS {ratingstablename}")
-    cur.execute(f"""
-        CREATE TABLE {ratingstablename} (
-            userid integer,      -- ID người dùng
-            movieid integer,     -- ID phim
-            rating float         -- Điểm đánh giá (0.0 - 5.0)
-        )
-    """)
-    
-    # Đọc và xử lý file theo từng chunk để tối ưu hiệu suất với file lớn
-    chunk_size = 100000  # Số dòng xử lý mỗi lần
-    with open(ratingsfilepath, 'r') as f:
-        while True:
-            chunk = []  # Danh sách lưu trữ các dòng dữ liệu trong chunk hiện tại
-            # Đọc chunk_size dòng từ file
-            for _ in range(chunk_size):
-                line = f.readline()
-                if not line:  # Nếu hết file thì dừng
-                    break
-                parts = line.strip().split('::')  # File định dạng userID::movieID::rating::timestamp
-                if len(parts) >= 3:  # Đảm bảo dòng có đủ thông tin cần thiết
-                    userid, movieid, rating = parts[0], parts[1], parts[2]
-                    chunk.append(f"{userid}\t{movieid}\t{rating}\n")  # Chuyển sang định dạng tab-delimited cho COPY
-            
-            if not chunk:  # Nếu không còn dữ liệu thì thoát khỏi vòng lặp
-                break
-                
-            # Tạo buffer trong bộ nhớ cho chunk và sử dụng COPY để insert nhanh
-            buffer = StringIO(''.join(chunk))
-            cur.copy_from(buffer, ratingstablename, sep='\t', columns=('userid', 'movieid', 'rating'))
-            con.commit()  # Xác nhận giao dịch cho chunk này
+def _rangeinsert_rows(ratingstablename, rows, openconnection):
+    """Phần thân của rangeinsert_many (xem _routed_insert)"""
+    rows = list(rows)
+    if not rows:
+        return
+    con = openconnection
+    cur = _cursor(con)
     
-    cur.close()  # Đóng cursor
+    with _phase('rangeinsert_many', 'insert', cur, rows=len(rows)):
+        # Lấy biên phân vùng một lần cho cả lô
+        info = _partition_info(RANGE_TABLE_PREFIX, openconnection)
+        if info is not None and info['backend'] == 'native':
+            _native_insert(cur, ratingstablename, info['parenttable'], rows,
+                           _advance_roundrobin_sql(len(rows)))
+            cur.close()
+            con.commit()
+            return
+        lows, highs = _current_range_bounds(openconnection)
+        
+        # Gom các dòng theo phân vùng đích (dòng không thuộc phân vùng nào chỉ vào bảng chính)
+        groups = {}
+        for row in rows:
+            index = _range_index(row[2], lows, highs)
+            if index is not None:
+                groups.setdefault(index, []).append(row)
+        
+        # Chèn vào bảng chính và các phân vùng trong một giao dịch
+        cur.execute(b"BEGIN;\n" + _batch_insert_sql(cur, ratingstablename, RANGE_TABLE_PREFIX, rows, groups) + b";\n"
+                    + _advance_roundrobin_sql(len(rows)) + b"\nCOMMIT;")
+        
+        cur.close()
+        con.commit()  # Xác nhận giao dịch
 
-def rangepartition(ratingstablename, numberofpartitions, openconnection):
+def hashpartition(ratingstablename, numberofpartitions, key, openconnection, backend='table'):
     """
-    Hàm tạo phân vùng theo phạm vi (range partitioning) dựa trên điểm rating
-    Range Partitioning: Chia dữ liệu dựa trên khoảng giá trị liên tục của một thuộc tính
+    Hàm tạo phân vùng theo hash trên cột userid hoặc movieid
+    Hash Partitioning: dòng có khóa k thuộc phân vùng k mod numberofpartitions, nên mọi dòng
+    của cùng một user (hoặc cùng một phim) nằm trong đúng một phân vùng
     Args:
         ratingstablename: Tên bảng chính chứa dữ liệu
         numberofpartitions: Số phân vùng cần tạo
+        key: Cột khóa phân vùng ('userid' hoặc 'movieid')
         openconnection: Kết nối database
+        backend: 'table' (mặc định) hoặc 'native' như rangepartition
     """
+    _check_backend(backend)
+    if key not in HASH_KEYS:
+        raise ValueError("key must be one of {}, got {!r}".format(HASH_KEYS, key))
     con = openconnection
-    cur = con.cursor()
-    delta = 5.0 / numberofpartitions  # Tính khoảng cách giữa các phân vùng (rating từ 0-5)
-    
-    # Tạo tất cả các bảng phân vùng cùng lúc để tối ưu
-    # Mỗi bảng có tên range_part0, range_part1, range_part2, ...
-    create_tables_sql = '; '.join([
-        f"CREATE TABLE IF NOT EXISTS range_part{i} (userid integer, movieid integer, rating float)"
-        for i in range(numberofpartitions)
-    ])
-    cur.execute(create_tables_sql)
-    
-    # Xóa dữ liệu cũ trong các phân vùng nếu có
-    cur.execute('; '.join([f"TRUNCATE TABLE range_part{i}" for i in range(numberofpartitions)]))
+    cur = _cursor(con)
     
-    # Phân chia dữ liệu vào các phân vùng dựa trên khoảng rating
-    for i in range(numberofpartitions):
-        minRange = i * delta          # Giá trị rating tối thiểu của phân vùng
-        maxRange = minRange + delta   # Giá trị rating tối đa của phân vùng
+    with _transaction(con, cur, 'hashpartition'):
+        if backend == 'native':
+            parent = f"{ratingstablename}_hash"
+            with _phase('hashpartition', 'fill', cur, table=parent) as metrics:
+                _drop_replaced_partitions(cur, HASH_TABLE_PREFIX, numberofpartitions)
+                cur.execute('; '.join([f"DROP TABLE IF EXISTS {HASH_TABLE_PREFIX}{i}"
+                                       for i in range(numberofpartitions)]))
+                cur.execute(f"DROP TABLE IF EXISTS {parent}")
+                cur.execute(f"CREATE TABLE {parent} (LIKE {ratingstablename}) "
+                            f"PARTITION BY LIST (({_hash_expression(key, numberofpartitions)}))")
+                for i in range(numberofpartitions):
+                    cur.execute(f"CREATE TABLE {HASH_TABLE_PREFIX}{i} PARTITION OF {parent} FOR VALUES IN ({i})")
+                cur.execute(f"CREATE TABLE {parent}_default PARTITION OF {parent} DEFAULT")  # Khóa NULL
+                cur.execute(f"INSERT INTO {parent} SELECT userid, movieid, rating FROM {ratingstablename}")
+                metrics['rows'] = cur.rowcount
+        else:
+            parent = None
+            # Tạo (hoặc làm rỗng) các bảng hash_part0, hash_part1, ... rồi phân phối trong một lần quét
+            with _phase('hashpartition', 'create', cur):
+                _create_partitions(cur, ratingstablename, HASH_TABLE_PREFIX, numberofpartitions)
+            with _phase('hashpartition', 'fill', cur, table=f"{ratingstablename}_hash_router") as metrics:
+                router = _attach_hash_router(cur, ratingstablename, numberofpartitions, key)
+                cur.execute(f"INSERT INTO {router} SELECT userid, movieid, rating FROM {ratingstablename}")
+                metrics['rows'] = cur.rowcount
+                _detach_range_router(cur, router, numberofpartitions, HASH_TABLE_PREFIX)
         
-        if i == 0:  # Phân vùng đầu tiên bao gồm cả rating = 0
-            cur.execute("""
-                INSERT INTO range_part{}
-                SELECT userid, movieid, rating 
-                FROM {}
-                WHERE rating >= {} AND rating <= {}
-            """.format(i, ratingstablename, minRange, maxRange))
-        else:  # Các phân vùng khác không bao gồm giá trị biên trái để tránh trùng lặp
-            cur.execute("""
-                INSERT INTO range_part{}
-                SELECT userid, movieid, rating 
-                FROM {}
-                WHERE rating > {} AND rating <= {}
-            """.format(i, ratingstablename, minRange, maxRange))
-    
+        # Ghi lại số phân vùng và khóa để hashinsert/hashquery định tuyến nhất quán
+        with _phase('hashpartition', 'metadata', cur):
+            _save_partition_metadata(cur, HASH_TABLE_PREFIX, 'hash', numberofpartitions,
+                                     backend=backend, parenttable=parent, partitionkey=key)
     cur.close()
-    con.commit()  # Xác nhận tất cả các thay đổi
 
-def roundrobinpartition(ratingstablename, numberofpartitions, openconnection):
+
+def _hash_expression(key, numberofpartitions):
+    """Biểu thức SQL tính phân vùng hash của cột key, luôn không âm giống phép % của Python"""
+    return f"(({key} % {numberofpartitions}) + {numberofpartitions}) % {numberofpartitions}"
+
+
+def _attach_hash_router(cur, ratingstablename, numberofpartitions, key):
     """
-    Hàm tạo phân vùng theo phương pháp round robin
-    Round Robin Partitioning: Phân chia dữ liệu tuần tự vào các phân vùng theo thứ tự
-    Dòng 1 -> phân vùng 0, dòng 2 -> phân vùng 1, ..., dòng n -> phân vùng (n % numberofpartitions)
+    Gắn tạm các bảng hash_partK vào một bảng cha PARTITION BY LIST theo biểu thức hash,
+    tương tự _attach_range_router (cũng phải được gọi trong một giao dịch, xem _transaction)
     Args:
-        ratingstablename: Tên bảng chính chứa dữ liệu
-        numberofpartitions: Số phân vùng cần tạo
-        openconnection: Kết nối database
+        cur: Database cursor
+        ratingstablename: Tên bảng chính (dùng để đặt tên bảng định tuyến)
+        numberofpartitions: Số phân vùng
+        key: Cột khóa phân vùng
+    Returns:
+        Tên bảng định tuyến
     """
-    con = openconnection
-    cur = con.cursor()
-    
-    # Tạo tất cả các bảng phân vùng round robin cùng lúc
-    # Mỗi bảng có tên rrobin_part0, rrobin_part1, rrobin_part2, ...
-    create_tables_sql = '; '.join([
-        f"CREATE TABLE IF NOT EXISTS rrobin_part{i} (userid integer, movieid integer, rating float)"
-        for i in range(numberofpartitions)
-    ])
-    cur.execute(create_tables_sql)
-    
-    # Xóa dữ liệu cũ trong các phân vùng nếu có
-    cur.execute('; '.join([f"TRUNCATE TABLE rrobin_part{i}" for i in range(numberofpartitions)]))
-    
-    # Phân chia dữ liệu vào các phân vùng theo thuật toán round robin
+    router = f"{ratingstablename}_hash_router"
+    cur.execute(f"CREATE TABLE {router} (LIKE {ratingstablename}) "
+                f"PARTITION BY LIST (({_hash_expression(key, numberofpartitions)}))")
     for i in range(numberofpartitions):
-        cur.execute("""
-            INSERT INTO rrobin_part{}
-            SELECT userid, movieid, rating
-            FROM (
-                SELECT *, ROW_NUMBER() OVER () - 1 as row_num
-                FROM {}
-            ) numbered_rows
-            WHERE row_num % {} = {}
-        """.format(i, ratingstablename, numberofpartitions, i))
-        # ROW_NUMBER() đánh số thứ tự các dòng bắt đầu từ 1
-        # Trừ 1 để có số thứ tự bắt đầu từ 0
-        # Sử dụng modulo để phân chia: dòng có row_num % numberofpartitions = i sẽ vào phân vùng i
-    
-    cur.close()
-    con.commit()  # Xác nhận tất cả các thay đổi
+        cur.execute(f"ALTER TABLE {router} ATTACH PARTITION {HASH_TABLE_PREFIX}{i} FOR VALUES IN ({i})")
+    # Dòng có khóa NULL không thuộc phân vùng nào
+    cur.execute(f"CREATE TABLE {router}_default PARTITION OF {router} DEFAULT")
+    return router
 
-def roundrobininsert(ratingstablename, userid, itemid, rating, openconnection):
+
+def _hash_info(openconnection):
     """
-    Hàm chèn dữ liệu mới vào bảng chính và phân vùng round robin tương ứng
+    Lấy metadata của tập phân vùng hash
+    Returns:
+        Dict như _partition_info
+    Raises:
+        ValueError nếu chưa gọi hashpartition
+    """
+    info = _partition_info(HASH_TABLE_PREFIX, openconnection)
+    if info is None:
+        raise ValueError("no hash partitions, call hashpartition first")
+    return info
+
+
+def hashinsert(ratingstablename, userid, itemid, rating, openconnection):
+    """
+    Hàm chèn dữ liệu mới vào bảng chính và phân vùng hash tương ứng với khóa của dòng
     Args:
         ratingstablename: Tên bảng chính
         userid: ID người dùng
@@ -165,73 +2016,453 @@ def roundrobininsert(ratingstablename, userid, itemid, rating, openconnection):
         rating: Điểm đánh giá
         openconnection: Kết nối database
     """
+    _routed_insert(HASH_TABLE_PREFIX, openconnection, _hashinsert_rows, ratingstablename, [(userid, itemid, rating)],
+                   'hashinsert')
+
+
+def hashinsert_many(ratingstablename, rows, openconnection):
+    """
+    Chèn nhiều dòng vào bảng chính và các phân vùng hash tương ứng trong một giao dịch
+    Args:
+        ratingstablename: Tên bảng chính
+        rows: Iterable các bộ (userid, movieid, rating)
+        openconnection: Kết nối database
+    """
+    _routed_insert(HASH_TABLE_PREFIX, openconnection, _hashinsert_rows, ratingstablename, list(rows), 'hashinsert_many')
+
+
+def _hashinsert_rows(ratingstablename, rows, operation, openconnection):
+    """
+    Phần chung của hashinsert và hashinsert_many (xem _routed_insert)
+    Args:
+        ratingstablename: Tên bảng chính
+        rows: Danh sách các bộ (userid, movieid, rating)
+        operation: Tên hàm được gọi (cho số liệu đo)
+        openconnection: Kết nối database
+    """
+    if not rows:
+        return
     con = openconnection
-    cur = con.cursor()
+    cur = _cursor(con)
+    with _phase(operation, 'insert', cur, rows=len(rows)):
+        info = _hash_info(openconnection)
+        advance = _advance_roundrobin_sql(len(rows))  # Xem rangeinsert
+        if info['backend'] == 'native':
+            _native_insert(cur, ratingstablename, info['parenttable'], rows, advance)
+            cur.close()
+            con.commit()
+            return
+        
+        # Gom các dòng theo phân vùng đích (dòng có khóa NULL chỉ vào bảng chính)
+        column = HASH_KEYS.index(info['partitionkey'])
+        groups = {}
+        for row in rows:
+            if row[column] is not None:
+                groups.setdefault(row[column] % info['numberofpartitions'], []).append(row)
+        
+        cur.execute(b"BEGIN;\n" + _batch_insert_sql(cur, ratingstablename, HASH_TABLE_PREFIX, rows, groups) + b";\n"
+                    + advance + b"\nCOMMIT;")
+        cur.close()
+        con.commit()
+
+
+def hashquery(keyvalue, openconnection, itersize=QUERY_ITERSIZE):
+    """
+    Truy vấn tất cả các dòng có khóa phân vùng hash bằng keyvalue (vd: mọi đánh giá của một user),
+    chỉ quét đúng một phân vùng
+    Args:
+        keyvalue: Giá trị của cột khóa (userid hoặc movieid, theo hashpartition)
+        openconnection: Kết nối database
+        itersize: Số dòng mỗi lần lấy từ server
+    Returns:
+        Generator các bộ (userid, movieid, rating)
+    """
+    info = _hash_info(openconnection)
+    table = f"{HASH_TABLE_PREFIX}{keyvalue % info['numberofpartitions']}"
+    query = f"SELECT userid, movieid, rating FROM {table} WHERE {info['partitionkey']} = %(key)s"
+    return _stream(openconnection, query, {'key': keyvalue}, itersize)
+
+
+def repartition(ratingstablename, scheme, numberofpartitions, openconnection, boundaries='equal', histogram='stats'):
+    """
+    Đổi số phân vùng của tập phân vùng range hoặc hash (vd: 5 -> 8) mà không dựng lại từ bảng chính
+    Mỗi phân vùng cũ được quét một lần và chỉ các dòng có phân vùng đích thay đổi bị chuyển đi
+    (qua một bảng tạm); phân vùng mới được tạo, phân vùng thừa bị xóa. Việc chuyển dòng và metadata
+    nằm trong một giao dịch: các phiên đọc đồng thời vẫn thấy bố cục cũ đầy đủ cho tới khi commit,
+    không bao giờ thấy phân vùng rỗng hay đang chuyển dở
+    Args:
+        ratingstablename: Tên bảng chính
+        scheme: Phương pháp phân vùng ('range' hoặc 'hash')
+        numberofpartitions: Số phân vùng mới
+        openconnection: Kết nối database
+        boundaries, histogram: Cách chọn biên range mới, như rangepartition
+    """
+    if scheme not in ('range', 'hash'):
+        # Round robin: vị trí của dòng không được lưu và gần như mọi dòng đổi phân vùng,
+        # nên dùng roundrobinpartition để dựng lại
+        raise ValueError("scheme must be 'range' or 'hash', got {!r}".format(scheme))
+    prefix = RANGE_TABLE_PREFIX if scheme == 'range' else HASH_TABLE_PREFIX
+    con = openconnection
+    cur = _cursor(con)
     
-    try:
-        # Chèn dữ liệu vào bảng chính trước
-        cur.execute("""
-            INSERT INTO {} (userid, movieid, rating)
-            VALUES (%s, %s, %s)
-        """.format(ratingstablename), (userid, itemid, rating))
+    # Bố cục cũ và điều kiện (SQL, tham số) để một dòng thuộc từng phân vùng mới
+    if scheme == 'range':
+        oldlows, oldhighs = _current_range_bounds(openconnection)
+        oldcount = len(oldlows)
+        if oldcount == 0:
+            raise ValueError("no range partitions, call rangepartition first")
+        if boundaries == 'equidepth':
+            lows, highs = _equidepth_bounds(numberofpartitions, _rating_histogram(cur, ratingstablename, histogram))
+        else:
+            lows, highs = _range_bounds(numberofpartitions)
+        oldbounds = _native_range_bounds(oldlows, oldhighs)
+        bounds = _native_range_bounds(lows, highs)
+        targets = [("rating >= %s AND rating < %s", bound) for bound in bounds]
+        key = None
+    else:
+        info = _hash_info(openconnection)
+        oldcount, key = info['numberofpartitions'], info['partitionkey']
+        expression = _hash_expression(key, numberofpartitions).replace('%', '%%')  # Câu lệnh có tham số
+        targets = [(f"{expression} = %s", (k,)) for k in range(numberofpartitions)]
+    info = _partition_info(prefix, openconnection)
+    if info is not None and info['backend'] == 'native':
+        raise ValueError("repartition supports the table backend only, use {}partition".format(scheme))
+    
+    # Việc chuyển dòng và metadata trong một giao dịch (BEGIN tường minh nếu kết nối autocommit)
+    with _transaction(con, cur, 'repartition'):
+        # Bảng tạm chứa các dòng đang được chuyển, tự xóa khi giao dịch kết thúc
+        staging = f"{ratingstablename}_moving"
         
-        # Đếm tổng số dòng hiện tại trong bảng chính để xác định vị trí round robin
-        cur.execute("SELECT COUNT(*) FROM {}".format(ratingstablename))
-        total_rows = cur.fetchone()[0]
+        # Lấy ra khỏi mỗi phân vùng cũ các dòng không còn thuộc về nó
+        with _phase('repartition', 'extract', cur, table=staging) as metrics:
+            cur.execute(f"CREATE TEMPORARY TABLE {staging} (LIKE {ratingstablename}) ON COMMIT DROP")
+            metrics['rows'] = 0
+            for i in range(oldcount):
+                if i < numberofpartitions:
+                    if scheme == 'range' and bounds[i][0] <= oldbounds[i][0] and oldbounds[i][1] <= bounds[i][1]:
+                        continue  # Khoảng cũ nằm trong khoảng mới: không dòng nào phải chuyển
+                    if scheme == 'hash' and oldcount == numberofpartitions:
+                        continue
+                    condition, params = targets[i]
+                    where, params = f"WHERE NOT ({condition})", params
+                else:
+                    where, params = "", ()  # Phân vùng sẽ bị xóa: chuyển toàn bộ
+                cur.execute(f"""
+                    WITH moved AS (DELETE FROM {prefix}{i} {where} RETURNING userid, movieid, rating)
+                    INSERT INTO {staging} SELECT * FROM moved
+                """, params)
+                metrics['rows'] += cur.rowcount
         
-        # Tính chỉ số phân vùng dựa trên thuật toán round robin
-        numberofpartitions = count_partitions('rrobin_part', openconnection)
-        index = (total_rows - 1) % numberofpartitions  # Trừ 1 vì đã insert vào bảng chính
+        # Tạo các phân vùng mới
+        with _phase('repartition', 'create', cur):
+            for k in range(oldcount, numberofpartitions):
+                cur.execute(f"CREATE TABLE {prefix}{k} (LIKE {ratingstablename})")
         
-        # Chèn vào phân vùng round robin tương ứng
-        cur.execute("""
-            INSERT INTO rrobin_part{} (userid, movieid, rating)
-            VALUES (%s, %s, %s)
-        """.format(index), (userid, itemid, rating))
+        # Đưa các dòng đã lấy ra vào phân vùng đích
+        with _phase('repartition', 'fill', cur, table=staging) as metrics:
+            metrics['rows'] = 0
+            for k, (condition, params) in enumerate(targets):
+                cur.execute(f"INSERT INTO {prefix}{k} SELECT * FROM {staging} WHERE {condition}", params)
+                metrics['rows'] += cur.rowcount
+            
+            # Với range, rating rơi vào khe hở giữa các khoảng cũ chỉ có trong bảng chính: lấy bổ sung
+            # từ bảng chính các giá trị đó nếu chúng thuộc một phân vùng mới
+            if scheme == 'range':
+                for k, (lower, upper) in enumerate(bounds):
+                    for gaplower, gapupper in _range_gaps(oldbounds):
+                        lo, hi = max(lower, gaplower), min(upper, gapupper)
+                        if lo < hi:
+                            cur.execute(f"INSERT INTO {prefix}{k} SELECT userid, movieid, rating "
+                                        f"FROM {ratingstablename} WHERE rating >= %s AND rating < %s", (lo, hi))
+                            metrics['rows'] += cur.rowcount
         
-        con.commit()  # Xác nhận giao dịch thành công
-    except Exception as e:
-        con.rollback()  # Hoàn tác nếu có lỗi
-        raise e
-    finally:
-        cur.close()  # Đảm bảo đóng cursor trong mọi trường hợp
+        with _phase('repartition', 'metadata', cur):
+            if scheme == 'range':
+                _save_partition_metadata(cur, prefix, 'range', numberofpartitions, lows, highs)
+            else:
+                _save_partition_metadata(cur, prefix, 'hash', numberofpartitions, partitionkey=key)
+    
+    # Các phân vùng thừa (đã rỗng) được xóa trong một giao dịch riêng ngắn: phiên đọc còn dùng
+    # bố cục cũ trong lúc chờ vẫn thấy đủ dữ liệu, lệnh DROP chỉ chờ các phiên đang đọc bảng đó
+    if oldcount > numberofpartitions:
+        with _transaction(con, cur, 'repartition'), _phase('repartition', 'drop', cur):
+            cur.execute('; '.join(f"DROP TABLE IF EXISTS {prefix}{i}" for i in range(numberofpartitions, oldcount)))
+    cur.close()
 
-def rangeinsert(ratingstablename, userid, itemid, rating, openconnection):
+
+def _range_gaps(bounds):
     """
-    Hàm chèn dữ liệu mới vào bảng chính và phân vùng range tương ứng dựa trên giá trị rating
+    Các khoảng [lower, upper) không thuộc phân vùng range nào
     Args:
-        ratingstablename: Tên bảng chính
-        userid: ID người dùng  
-        itemid: ID phim (movie)
-        rating: Điểm đánh giá (dùng để xác định phân vùng)
+        bounds: Danh sách cặp (lower, upper) do _native_range_bounds trả về
+    Returns:
+        Danh sách cặp (lower, upper), kể cả hai khoảng vô hạn ở hai đầu
+    """
+    gaps = [(-math.inf, bounds[0][0])] if bounds else [(-math.inf, math.inf)]
+    for (_, upper), (lower, _) in zip(bounds, bounds[1:]):
+        if upper < lower:
+            gaps.append((upper, lower))
+    if bounds:
+        gaps.append((bounds[-1][1], math.inf))
+    return gaps
+
+
+def rangequery(ratingminvalue, ratingmaxvalue, openconnection, itersize=QUERY_ITERSIZE):
+    """
+    Truy vấn các dòng có ratingminvalue <= rating <= ratingmaxvalue từ các phân vùng range
+    Chỉ quét các bảng range_partK có khoảng giao với điều kiện (cùng biên với rangepartition/rangeinsert);
+    kết quả được đọc dần qua một cursor phía server nên không phải giữ toàn bộ trong bộ nhớ
+    Args:
+        ratingminvalue: Cận dưới của rating (bao gồm)
+        ratingmaxvalue: Cận trên của rating (bao gồm)
         openconnection: Kết nối database
+        itersize: Số dòng mỗi lần lấy từ server
+    Returns:
+        Generator các bộ (userid, movieid, rating)
     """
-    con = openconnection
-    cur = con.cursor()
+    tables = range_query_partitions(ratingminvalue, ratingmaxvalue, openconnection)
+    if not tables:
+        return iter(())
+    query = " UNION ALL ".join(
+        f"SELECT userid, movieid, rating FROM {table} WHERE rating >= %(lo)s AND rating <= %(hi)s"
+        for table in tables)
+    return _stream(openconnection, query, {'lo': ratingminvalue, 'hi': ratingmaxvalue}, itersize)
+
+
+def pointquery(ratingvalue, openconnection, itersize=QUERY_ITERSIZE):
+    """
+    Truy vấn các dòng có rating = ratingvalue, chỉ quét phân vùng range chứa giá trị đó
+    Args:
+        ratingvalue: Giá trị rating cần tìm
+        openconnection: Kết nối database
+        itersize: Số dòng mỗi lần lấy từ server
+    Returns:
+        Generator các bộ (userid, movieid, rating)
+    """
+    return rangequery(ratingvalue, ratingvalue, openconnection, itersize)
+
+
+def range_query_partitions(ratingminvalue, ratingmaxvalue, openconnection):
+    """
+    Liệt kê các bảng phân vùng range mà rangequery sẽ quét
+    Args:
+        ratingminvalue, ratingmaxvalue: Khoảng rating cần truy vấn (bao gồm hai đầu)
+        openconnection: Kết nối database
+    Returns:
+        Danh sách tên bảng phân vùng
+    """
+    lows, highs = _current_range_bounds(openconnection)
+    return [f"{RANGE_TABLE_PREFIX}{i}" for i in _range_overlaps(ratingminvalue, ratingmaxvalue, lows, highs)]
+
+
+def _current_range_bounds(openconnection):
+    """
+    Lấy biên của tập phân vùng range hiện tại từ metadata,
+    hoặc tính lại từ số phân vùng nếu phân vùng được tạo bởi phiên bản cũ
+    Args:
+        openconnection: Kết nối database
+    Returns:
+        Cặp (lows, highs); hai danh sách rỗng nếu chưa có phân vùng range nào
+    """
+    info = _partition_info(RANGE_TABLE_PREFIX, openconnection)
+    if info is not None:
+        return info['lowerbounds'], info['upperbounds']
+    numberofpartitions = count_partitions(RANGE_TABLE_PREFIX, openconnection)
+    if numberofpartitions == 0:
+        # Chưa gọi rangepartition: truy vấn không quét phân vùng range nào, lệnh chèn chỉ vào bảng chính
+        return [], []
+    return _range_bounds(numberofpartitions)
+
+
+def _range_overlaps(lo, hi, lows, highs):
+    """
+    Chỉ số các phân vùng range có thể chứa rating trong [lo, hi]
+    Điều kiện biên giống _range_index: phân vùng i chứa lows[i] < rating <= highs[i] (phân vùng 0 chứa cả lows[0])
+    Args:
+        lo, hi: Khoảng rating (bao gồm hai đầu)
+        lows, highs: Cận dưới và cận trên của từng phân vùng
+    Returns:
+        Danh sách chỉ số phân vùng
+    """
+    start = bisect_left(highs, lo)  # Phân vùng đầu tiên có cận trên >= lo
+    return [i for i in range(start, len(lows)) if hi > lows[i] or (i == 0 and hi >= lows[0])]
+
+
+def _stream(openconnection, query, params, itersize):
+    """
+    Thực thi truy vấn qua một cursor phía server (named cursor) và trả dần từng dòng
+    Với kết nối autocommit, cursor được khai báo WITH HOLD vì cursor thường chỉ sống trong một giao dịch
+    Args:
+        openconnection: Kết nối database
+        query: Câu truy vấn
+        params: Tham số của câu truy vấn
+        itersize: Số dòng mỗi lần lấy từ server
+    Returns:
+        Generator các dòng kết quả
+    """
+    cur = openconnection.cursor(name=f"query_{next(_cursor_ids)}", withhold=openconnection.autocommit)
+    cur.itersize = itersize
+    cur.execute(query, params)
     
-    # Tính toán phân vùng dựa trên giá trị rating
-    numberofpartitions = count_partitions('range_part', openconnection)
-    delta = 5.0 / numberofpartitions  # Khoảng cách giữa các phân vùng
-    index = int(rating / delta)       # Xác định chỉ số phân vùng
+    def rows():
+        try:
+            yield from cur
+        finally:
+            cur.close()  # Giải phóng cursor phía server kể cả khi người gọi dừng giữa chừng
+    return rows()
+
+
+def scatter(prefix, query, openconnection, params=None, workers=None):
+    """
+    Chạy cùng một truy vấn trên tất cả các phân vùng prefix0 ... prefix{N-1} cùng lúc
+    Mỗi phân vùng được truy vấn trên một kết nối riêng lấy từ pool dùng chung (getconnectionpool),
+    nên chỉ thấy dữ liệu đã commit; số truy vấn chạy đồng thời bị giới hạn bởi kích thước pool
+    Args:
+        prefix: Tiền tố tên bảng phân vùng (vd: 'rrobin_part')
+        query: Câu truy vấn, trong đó {table} được thay bằng tên bảng phân vùng
+        openconnection: Kết nối database (dùng để đọc metadata và thông tin kết nối)
+        params: Tham số của câu truy vấn
+        workers: Số luồng truy vấn (mặc định: số phân vùng, tối đa bằng kích thước pool)
+    Returns:
+        Danh sách kết quả fetchall của từng phân vùng, theo thứ tự phân vùng
+    """
+    info = _partition_info(prefix, openconnection)
+    if info is not None:
+        tables = info['tablenames']
+    else:
+        tables = [f"{prefix}{i}" for i in range(count_partitions(prefix, openconnection))]
+    if not tables:
+        return []
+    pool = getconnectionpool(**_connection_params(openconnection))
+    workers = min(workers or len(tables), len(tables), pool.maxconn)
     
-    # Xử lý trường hợp đặc biệt: nếu rating chia hết cho delta và không phải 0
-    # thì thuộc về phân vùng trước đó (để tránh vượt quá số phân vùng)
-    if rating % delta == 0 and index != 0:
-        index -= 1
+    def run(table):
+        with pool.connection() as con:
+            cur = con.cursor()
+            cur.execute(query.format(table=table), params)
+            rows = cur.fetchall()
+            cur.close()
+            return rows
     
-    # Chèn vào cả bảng chính và phân vùng trong một giao dịch
-    cur.execute("""
-        BEGIN;
-        INSERT INTO {} (userid, movieid, rating)
-        VALUES (%s, %s, %s);
-        INSERT INTO range_part{} (userid, movieid, rating)
-        VALUES (%s, %s, %s);
-        COMMIT;
-    """.format(ratingstablename, index), 
-    (userid, itemid, rating, userid, itemid, rating))
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        return list(executor.map(run, tables))
+
+
+# Cách tính kết quả riêng từng phân vùng và gộp lại cho mỗi hàm tổng hợp:
+# hàm -> (các biểu thức tính trên phân vùng, hàm gộp danh sách kết quả riêng thành kết quả cuối)
+_AGGREGATES = {
+    'count': (("COUNT({})",), lambda parts: sum(p[0] for p in parts)),
+    'sum': (("SUM({})",), lambda parts: _merge(sum, (p[0] for p in parts))),
+    'min': (("MIN({})",), lambda parts: _merge(min, (p[0] for p in parts))),
+    'max': (("MAX({})",), lambda parts: _merge(max, (p[0] for p in parts))),
+    'avg': (("SUM(({})::float8)", "COUNT({})"), lambda parts: _average(parts)),  # SUM(real) cộng dồn bằng real
+}
+
+
+def _merge(function, values):
+    """Gộp các kết quả riêng bằng function, bỏ qua NULL (None nếu mọi phân vùng đều NULL)"""
+    values = [value for value in values if value is not None]
+    return function(values) if values else None
+
+
+def _average(parts):
+    """Gộp các cặp (SUM, COUNT) riêng của từng phân vùng thành giá trị trung bình"""
+    count = sum(p[1] for p in parts)
+    return sum(p[0] for p in parts if p[0] is not None) / count if count else None
+
+
+def parallelaggregate(prefix, aggregates, openconnection, groupby=None, where=None, params=None, workers=None):
+    """
+    Tính các hàm tổng hợp COUNT/SUM/AVG/MIN/MAX trên toàn bộ tập phân vùng bằng scatter
+    Mỗi phân vùng trả về kết quả riêng (AVG được tách thành SUM và COUNT), sau đó được gộp lại
+    Args:
+        prefix: Tiền tố tên bảng phân vùng
+        aggregates: Danh sách cặp (hàm, cột), vd: [('count', '*'), ('avg', 'rating')]
+        openconnection: Kết nối database
+        groupby: Danh sách cột nhóm (vd: ['movieid']), hoặc None
+        where: Điều kiện lọc (vd: 'rating >= %s'), hoặc None
+        params: Tham số của điều kiện lọc
+        workers: Số luồng truy vấn (xem scatter)
+    Returns:
+        Không có groupby: bộ giá trị theo thứ tự aggregates
+        Có groupby: dict khóa nhóm -> bộ giá trị (khóa là giá trị cột nếu chỉ nhóm theo một cột, ngược lại là bộ)
+    """
+    columns = []  # Các biểu thức tính trên từng phân vùng
+    slices = []   # Vị trí các biểu thức của từng hàm tổng hợp trong columns
+    for function, column in aggregates:
+        if function.lower() not in _AGGREGATES:
+            raise ValueError("unsupported aggregate {!r}".format(function))
+        if column.strip() == '*' and function.lower() != 'count':
+            # SUM(*)/AVG(*)... không phải SQL hợp lệ: báo lỗi ngay thay vì lỗi trong luồng truy vấn phân vùng
+            raise ValueError("only count accepts '*', got ({!r}, {!r})".format(function, column))
+        expressions, _ = _AGGREGATES[function.lower()]
+        slices.append(slice(len(columns), len(columns) + len(expressions)))
+        columns.extend(expression.format(column) for expression in expressions)
+    groupby = list(groupby or [])
     
-    cur.close()
-    con.commit()  # Xác nhận giao dịch
+    query = "SELECT {} FROM {{table}}".format(', '.join(groupby + columns))
+    if where:
+        query += " WHERE " + where
+    if groupby:
+        query += " GROUP BY " + ', '.join(groupby)
+    
+    # Gom kết quả riêng của các phân vùng theo khóa nhóm
+    partials = {}
+    for rows in scatter(prefix, query, openconnection, params, workers):
+        for row in rows:
+            partials.setdefault(row[:len(groupby)], []).append(row[len(groupby):])
+    
+    def combine(parts):
+        return tuple(_AGGREGATES[function.lower()][1]([p[part] for p in parts])
+                     for (function, _), part in zip(aggregates, slices))
+    
+    if not groupby:
+        # Không nhóm: mỗi phân vùng trả về đúng một dòng (COUNT = 0, các hàm khác NULL nếu không có phân vùng)
+        return combine(partials.get((), []))
+    return {(key[0] if len(groupby) == 1 else key): combine(parts) for key, parts in partials.items()}
+
+
+def buildindexes(ratingstablename, openconnection, indexes=None, workers=None):
+    """
+    Tạo index trên bảng chính và các bảng phân vùng hiện có (range, round robin, hash), song song trên
+    nhiều kết nối của pool. Nên gọi sau khi đã tải và phân vùng xong: dựng index một lần trên dữ liệu
+    có sẵn nhanh hơn nhiều so với cập nhật index cho từng dòng trong lúc nạp
+    Các bảng phải đã được commit vì mỗi index được tạo trên một kết nối riêng
+    Args:
+        ratingstablename: Tên bảng chính
+        openconnection: Kết nối database (dùng để đọc metadata và thông tin kết nối)
+        indexes: Danh sách (tên, phương thức, danh sách cột) (mặc định: DEFAULT_INDEXES)
+        workers: Số index được tạo đồng thời (mặc định: kích thước pool)
+    Returns:
+        Danh sách (tên bảng, tên index, số giây) theo thứ tự tạo xong; số giây là None nếu index đã có sẵn
+    """
+    tables = [ratingstablename]
+    for prefix in (RANGE_TABLE_PREFIX, RROBIN_TABLE_PREFIX, HASH_TABLE_PREFIX):
+        info = _partition_info(prefix, openconnection)
+        if info is not None:
+            tables.extend(info['tablenames'])
+        else:  # Phân vùng được tạo bởi phiên bản cũ, chưa có metadata
+            tables.extend(f"{prefix}{i}" for i in range(count_partitions(prefix, openconnection)))
+    jobs = [(table, f"{table}_{name}_idx", method, columns)
+            for table in tables for name, method, columns in (indexes or DEFAULT_INDEXES)]
+    pool = getconnectionpool(**_connection_params(openconnection))
+    
+    def build(job):
+        table, index, method, columns = job
+        start = time.monotonic()
+        with pool.connection(autocommit=True) as con:
+            cur = con.cursor()
+            try:
+                cur.execute(f"CREATE INDEX {index} ON {table} USING {method} ({columns})")
+            except psycopg2.errors.DuplicateTable:
+                return table, index, None  # Index đã có từ lần trước, không tạo lại
+            finally:
+                cur.close()
+        return table, index, time.monotonic() - start
+    
+    with ThreadPoolExecutor(max_workers=min(workers or pool.maxconn, pool.maxconn, len(jobs))) as executor:
+        return list(executor.map(build, jobs))
+
 
 def create_db(dbname):
     """
@@ -243,35 +2474,37 @@ def create_db(dbname):
     Returns:
         None
     """
-    con = getopenconnection(dbname='postgres')  # Kết nối tới database mặc định
-    # Thiết lập chế độ autocommit để có thể thực thi câu lệnh CREATE DATABASE
-    con.set_isolation_level(psycopg2.extensions.ISOLATION_LEVEL_AUTOCOMMIT)
-    cur = con.cursor()
-    
-    # Kiểm tra xem database đã tồn tại chưa
-    cur.execute('SELECT COUNT(*) FROM pg_catalog.pg_database WHERE datname=%s', (dbname,))
-    count = cur.fetchone()[0]
-    
-    if count == 0:
-        # Tạo database mới nếu chưa tồn tại
-        cur.execute('CREATE DATABASE %s' % (dbname,))
-    else:
-        # Thông báo nếu database đã tồn tại
-        print('A database named {0} already exists'.format(dbname))
-    
-    cur.close()
-    con.close()
+    # Lấy kết nối tới database mặc định từ pool, bật autocommit để có thể thực thi CREATE DATABASE
+    with getconnectionpool(dbname='postgres').connection(autocommit=True) as con:
+        cur = con.cursor()
+        
+        # Kiểm tra xem database đã tồn tại chưa
+        cur.execute('SELECT COUNT(*) FROM pg_catalog.pg_database WHERE datname=%s', (dbname,))
+        count = cur.fetchone()[0]
+        
+        if count == 0:
+            # Tạo database mới nếu chưa tồn tại
+            cur.execute('CREATE DATABASE %s' % (dbname,))
+        else:
+            # Thông báo nếu database đã tồn tại
+            print('A database named {0} already exists'.format(dbname))
+        
+        cur.close()
 
 def count_partitions(prefix, openconnection):
     """
-    Hàm đếm số lượng bảng có tên chứa prefix nhất định
-    Sử dụng để đếm số phân vùng đã được tạo
+    Hàm đếm số phân vùng đã được tạo với tiền tố prefix
+    Đọc từ metadata (qua bộ nhớ đệm) nếu có, nếu không thì đếm các bảng có tên bắt đầu bằng prefix
     Args:
         prefix: Tiền tố của tên bảng (vd: 'range_part', 'rrobin_part')
         openconnection: Kết nối database
     Returns:
-        Số lượng bảng tìm được
+        Số lượng phân vùng
     """
+    info = _partition_info(prefix, openconnection)
+    if info is not None:
+        return info['numberofpartitions']
+    
     con = openconnection
     cur = con.cursor()
     
@@ -286,3 +2519,149 @@ def count_partitions(prefix, openconnection):
     count = cur.fetchone()[0]
     cur.close()
     return count
+
+
+def _save_partition_metadata(cur, prefix, scheme, numberofpartitions, lows=None, highs=None,
+                             backend='table', parenttable=None, partitionkey=None):
+    """
+    Ghi metadata của một tập phân vùng vào METADATA_TABLE (tạo bảng nếu chưa có)
+    và xóa bản ghi tương ứng trong bộ nhớ đệm
+    Args:
+        cur: Database cursor
+        prefix: Tiền tố tên bảng phân vùng
+        scheme: Phương pháp phân vùng ('range', 'roundrobin' hoặc 'hash')
+        numberofpartitions: Số phân vùng
+        lows, highs: Cận dưới và cận trên của từng phân vùng (chỉ với range)
+        backend: 'table' hoặc 'native'
+        parenttable: Tên bảng cha (chỉ với backend native)
+        partitionkey: Cột khóa phân vùng (chỉ với hash)
+    """
+    cur.execute(_METADATA_DDL)
+    cur.execute(f"""
+        INSERT INTO {METADATA_TABLE}
+            (prefix, scheme, numberofpartitions, lowerbounds, upperbounds, tablenames, backend, parenttable,
+             partitionkey)
+        VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s)
+        ON CONFLICT (prefix) DO UPDATE
+        SET scheme = EXCLUDED.scheme, numberofpartitions = EXCLUDED.numberofpartitions,
+            lowerbounds = EXCLUDED.lowerbounds, upperbounds = EXCLUDED.upperbounds,
+            tablenames = EXCLUDED.tablenames, backend = EXCLUDED.backend, parenttable = EXCLUDED.parenttable,
+            partitionkey = EXCLUDED.partitionkey
+    """, (prefix, scheme, numberofpartitions, lows, highs,
+          [f"{prefix}{i}" for i in range(numberofpartitions)], backend, parenttable, partitionkey))
+    _partitions_changed(cur.connection, (_database_key(cur.connection), prefix))  # Tập phân vùng đã thay đổi
+
+
+def _partition_info(prefix, openconnection):
+    """
+    Đọc metadata của tập phân vùng, ưu tiên bộ nhớ đệm trong tiến trình (theo database của kết nối)
+    Bản ghi bị xóa khi tiến trình này phân vùng lại, khi một lệnh chèn định tuyến theo nó gặp bảng
+    không tồn tại (xem _routed_insert), hoặc khi gọi invalidate_partition_cache
+    Args:
+        prefix: Tiền tố tên bảng phân vùng
+        openconnection: Kết nối database
+    Returns:
+        Dict gồm scheme, numberofpartitions, lowerbounds, upperbounds, tablenames, backend, parenttable,
+        partitionkey, hoặc None nếu chưa có metadata
+    """
+    key = (_database_key(openconnection), prefix)
+    if key in _partition_cache:
+        return _partition_cache[key]
+    
+    epoch = _partition_cache_epoch
+    cur = _cursor(openconnection)
+    with _phase('partition_info', 'catalog', cur, table=prefix):
+        cur.execute("SELECT to_regclass(%s) IS NOT NULL", (METADATA_TABLE,))
+        info = None
+        if cur.fetchone()[0]:
+            cur.execute(f"""
+                SELECT scheme, numberofpartitions, lowerbounds, upperbounds, tablenames, backend, parenttable,
+                       partitionkey
+                FROM {METADATA_TABLE} WHERE prefix = %s
+            """, (prefix,))
+            row = cur.fetchone()
+            if row is not None:
+                info = dict(zip(('scheme', 'numberofpartitions', 'lowerbounds', 'upperbounds', 'tablenames',
+                                 'backend', 'parenttable', 'partitionkey'), row))
+                _remember_partition_info(key, info, epoch)
+    cur.close()
+    return info
+
+
+def _database_key(con):
+    """
+    Khóa của database mà kết nối psycopg2 trỏ tới: (host, port, tên database)
+    """
+    return (con.info.host, con.info.port, con.info.dbname)
+
+
+def invalidate_partition_cache(openconnection=None, prefix=None):
+    """
+    Xóa metadata phân vùng trong bộ nhớ đệm của tiến trình để lần dùng sau đọc lại từ METADATA_TABLE
+    Cần gọi khi các bảng phân vùng hoặc metadata bị thay đổi ngoài các hàm của module
+    (vd: xóa bảng bằng tay, tiến trình khác phân vùng lại)
+    Args:
+        openconnection: Chỉ xóa các bản ghi của database của kết nối này (mặc định: mọi database)
+        prefix: Chỉ xóa bản ghi của tiền tố này (mặc định: mọi tiền tố)
+    """
+    _invalidate_partition_cache(None if openconnection is None else _database_key(openconnection), prefix)
+
+
+def _invalidate_partition_cache(database, prefix):
+    """
+    Phần chung của invalidate_partition_cache và AsyncInterface.invalidate_partition_cache
+    Args:
+        database: Khóa database (None: mọi database)
+        prefix: Tiền tố (None: mọi tiền tố)
+    """
+    _forget_partition_info([key for key in list(_partition_cache)
+                            if (database is None or key[0] == database) and (prefix is None or key[1] == prefix)])
+
+
+def _forget_partition_info(keys):
+    """
+    Xóa các bản ghi của bộ nhớ đệm; metadata đang được đọc từ trước đó sẽ không được ghi lại
+    Args:
+        keys: Các khóa (database, prefix)
+    """
+    global _partition_cache_epoch
+    with _partition_cache_lock:
+        _partition_cache_epoch += 1
+        for key in keys:
+            _partition_cache.pop(key, None)
+
+
+def _remember_partition_info(key, info, epoch):
+    """
+    Ghi metadata vừa đọc vào bộ nhớ đệm, trừ khi đã có bản ghi bị xóa từ lúc bắt đầu đọc (epoch):
+    khi đó metadata có thể được đọc trước khi một giao dịch thay đổi tập phân vùng commit
+    Args:
+        key: Khóa (database, prefix)
+        info: Metadata
+        epoch: Giá trị _partition_cache_epoch trước khi đọc
+    """
+    with _partition_cache_lock:
+        if epoch == _partition_cache_epoch:
+            _partition_cache[key] = info
+
+
+def _partitions_changed(con, key):
+    """
+    Ghi nhận giao dịch đang mở của con thay đổi tập phân vùng của khóa key: bản ghi bị xóa ngay
+    (để chính giao dịch đọc metadata mới) và xóa lại khi giao dịch kết thúc (_end_partition_changes),
+    vì trong lúc chờ commit các luồng khác vẫn có thể đọc và ghi lại metadata cũ
+    Args:
+        con: Kết nối đang mở giao dịch
+        key: Khóa (database, prefix)
+    """
+    _pending_invalidations.setdefault(con, set()).add(key)
+    _forget_partition_info([key])
+
+
+def _end_partition_changes(con):
+    """
+    Xóa khỏi bộ nhớ đệm các tập phân vùng mà giao dịch vừa kết thúc (commit hoặc rollback) của con đã thay đổi
+    Args:
+        con: Kết nối
+    """
+    _forget_partition_info(_pending_invalidations.pop(con, ()))
@@ -0,0 +1,150 @@
+#!/usr/bin/env python3
+"""
+File đo hiệu năng truy vấn trên các phân vùng
+0. Lược đồ: so sánh kích thước bảng chính và thời gian quét toàn bộ giữa lược đồ mặc định (rating float)
+   và lược đồ gọn (loadratings(..., compact=True), rating real)
+1. Range: với mỗi khoảng rating, so sánh quét toàn bộ bảng chính (cách người dùng đang truy vấn
+   trực tiếp bảng ratings) với rangequery (chỉ quét các bảng range_partK giao với khoảng cần tìm)
+2. Round robin: so sánh parallelaggregate chạy tuần tự (1 luồng) và song song (mỗi phân vùng một luồng)
+Chạy không cần tương tác: python benchmark.py [đường dẫn file dữ liệu] [số phân vùng]
+"""
+
+import sys           # Để đọc tham số dòng lệnh
+import time          # Để đo thời gian thực thi
+import testHelper    # Module chứa các hàm hỗ trợ test
+import Interface as MyAssignment  # Module chính chứa logic phân vùng
+
+# Các hằng số cấu hình
+DATABASE_NAME = 'dds_assgn1'              # Tên database sử dụng cho bài tập
+RATINGS_TABLE = 'ratings'                 # Tên bảng chính chứa dữ liệu rating
+INPUT_FILE_PATH = 'ratings.dat'           # Đường dẫn file dữ liệu đầu vào mặc định
+NUMBER_OF_PARTITIONS = 10                 # Số phân vùng range mặc định
+QUERY_RANGES = [(0.5, 0.5), (1, 2), (3.5, 4.5), (0, 5)]  # Các khoảng rating cần truy vấn
+SCAN_REPEATS = 3                          # Số lần quét toàn bộ bảng, lấy thời gian nhanh nhất
+
+
+def print_progress(message, indent=0):
+    """
+    In thông báo tiến trình với timestamp và thụt lề
+    Args:
+        message: Nội dung thông báo cần in
+        indent: Mức độ thụt lề (0 = không thụt, 1 = 2 spaces, 2 = 4 spaces...)
+    """
+    print(f"[{time.strftime('%H:%M:%S')}] {'  ' * indent}{message}")
+
+
+def measure_schema(conn, filepath, compact):
+    """
+    Tải file với lược đồ đã chọn rồi đo kích thước bảng chính và thời gian quét toàn bộ bảng
+    Args:
+        conn: Kết nối database
+        filepath: Đường dẫn file dữ liệu
+        compact: True để dùng lược đồ gọn (rating real)
+    Returns:
+        Bộ (kích thước heap, kích thước tổng kể cả TOAST/FSM/VM tính bằng byte, thời gian quét nhanh nhất)
+    """
+    MyAssignment.loadratings(RATINGS_TABLE, filepath, conn, compact=compact)
+    cur = conn.cursor()
+    cur.execute(f"VACUUM ANALYZE {RATINGS_TABLE}" if conn.autocommit else f"ANALYZE {RATINGS_TABLE}")
+    cur.execute("SELECT pg_relation_size(%s), pg_total_relation_size(%s)", (RATINGS_TABLE, RATINGS_TABLE))
+    heap_size, total_size = cur.fetchone()
+    
+    scan_time = None
+    for _ in range(SCAN_REPEATS):
+        start_time = time.time()
+        cur.execute(f"SELECT COUNT(*), SUM(rating) FROM {RATINGS_TABLE}")
+        cur.fetchone()
+        elapsed = time.time() - start_time
+        scan_time = elapsed if scan_time is None else min(scan_time, elapsed)
+    cur.close()
+    conn.commit()
+    return heap_size, total_size, scan_time
+
+
+def time_full_scan(conn, lo, hi):
+    """
+    Đo thời gian truy vấn khoảng rating trực tiếp trên bảng chính (quét toàn bộ bảng)
+    Args:
+        conn: Kết nối database
+        lo, hi: Khoảng rating (bao gồm hai đầu)
+    Returns:
+        Cặp (số dòng, thời gian tính bằng giây)
+    """
+    start_time = time.time()
+    cur = conn.cursor(name='full_scan')
+    cur.itersize = MyAssignment.QUERY_ITERSIZE
+    cur.execute(f"SELECT userid, movieid, rating FROM {RATINGS_TABLE} WHERE rating >= %s AND rating <= %s", (lo, hi))
+    rows = sum(1 for _ in cur)
+    cur.close()
+    conn.commit()
+    return rows, time.time() - start_time
+
+
+def time_range_query(conn, lo, hi):
+    """
+    Đo thời gian truy vấn khoảng rating bằng rangequery (chỉ quét các phân vùng liên quan)
+    Args:
+        conn: Kết nối database
+        lo, hi: Khoảng rating (bao gồm hai đầu)
+    Returns:
+        Cặp (số dòng, thời gian tính bằng giây)
+    """
+    start_time = time.time()
+    rows = sum(1 for _ in MyAssignment.rangequery(lo, hi, conn))
+    conn.commit()
+    return rows, time.time() - start_time
+
+
+def time_parallel_aggregate(conn, workers):
+    """
+    Đo thời gian tính điểm trung bình theo từng phim trên các phân vùng round robin
+    Args:
+        conn: Kết nối database
+        workers: Số luồng truy vấn
+    Returns:
+        Cặp (số nhóm, thời gian tính bằng giây)
+    """
+    start_time = time.time()
+    groups = MyAssignment.parallelaggregate(MyAssignment.RROBIN_TABLE_PREFIX, [('avg', 'rating')], conn,
+                                            groupby=['movieid'], workers=workers)
+    return len(groups), time.time() - start_time
+
+
+def main():
+    """
+    Hàm chính: so sánh hai lược đồ, tải dữ liệu, đo truy vấn trên phân vùng range rồi trên phân vùng round robin
+    """
+    filepath = sys.argv[1] if len(sys.argv) > 1 else INPUT_FILE_PATH
+    numberofpartitions = int(sys.argv[2]) if len(sys.argv) > 2 else NUMBER_OF_PARTITIONS
+
+    testHelper.createdb(DATABASE_NAME)
+    with testHelper.getopenconnection(dbname=DATABASE_NAME) as conn:
+        print_progress(f"Comparing schemas on {filepath}:")
+        for compact in (True, False):
+            heap_size, total_size, scan_time = measure_schema(conn, filepath, compact)
+            print_progress(f"{'compact (rating real)' if compact else 'default (rating float)'}: "
+                           f"heap {heap_size / 1048576:.1f} MB, total {total_size / 1048576:.1f} MB, "
+                           f"full scan {scan_time:.3f} seconds", indent=1)
+        
+        # Lần đo cuối đã tải lại bảng chính với lược đồ mặc định, dùng tiếp cho các phép đo phân vùng
+        print_progress(f"Creating {numberofpartitions} range partitions...")
+        MyAssignment.rangepartition(RATINGS_TABLE, numberofpartitions, conn)
+
+        for lo, hi in QUERY_RANGES:
+            partitions = MyAssignment.range_query_partitions(lo, hi, conn)
+            full_rows, full_time = time_full_scan(conn, lo, hi)
+            query_rows, query_time = time_range_query(conn, lo, hi)
+            print_progress(f"rating in [{lo}, {hi}]: {len(partitions)}/{numberofpartitions} partitions scanned")
+            print_progress(f"full scan: {full_rows:,} rows ({full_time:.3f} seconds)", indent=1)
+            print_progress(f"rangequery: {query_rows:,} rows ({query_time:.3f} seconds)", indent=1)
+
+        print_progress(f"Creating {numberofpartitions} roundrobin partitions...")
+        MyAssignment.roundrobinpartition(RATINGS_TABLE, numberofpartitions, conn)
+        print_progress("average rating per movieid:")
+        for workers in (1, numberofpartitions):
+            groups, elapsed = time_parallel_aggregate(conn, workers)
+            print_progress(f"{workers} worker(s): {groups:,} groups ({elapsed:.3f} seconds)", indent=1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,535 @@
+#!/usr/bin/env python3
+"""
+Bộ đo hiệu năng cho các thao tác của Interface trên dữ liệu tổng hợp
+1. Sinh file ratings (định dạng userid::movieid::rating::timestamp) với số dòng và phân bố tùy chọn
+2. Đo loadratings, rangepartition, roundrobinpartition với từng số phân vùng
+3. Đo độ trễ từng lệnh rangeinsert, roundrobininsert (phân vị p50/p90/p99)
+4. Ghi kết quả (số dòng/giây, phân vị độ trễ) ra file JSON để so sánh giữa các phiên bản,
+   với --phases thêm tổng thời gian/số lệnh của từng giai đoạn (Interface.MetricsRegistry)
+5. Với --async: so sánh thông lượng của API đồng bộ (Interface) và API asyncio (AsyncInterface, cần asyncpg)
+   trên cùng các thao tác; các lệnh insert bất đồng bộ chạy đồng thời với --concurrency kết nối
+6. Với --bulk: so sánh thời gian xây dựng (loadratings + rangepartition + roundrobinpartition) với thiết lập
+   mặc định và trong Interface.bulkload (bảng UNLOGGED giữ nguyên, hoặc SET LOGGED khi kết thúc)
+7. Với --copyformat: so sánh loadratings với COPY dạng text và binary (thời gian tải, thời gian mã hóa
+   phía client và số byte gửi đi) trên cả lược đồ mặc định và lược đồ gọn
+Chạy không cần tương tác, ví dụ:
+    python benchmarksuite.py --rows 1000000 --distribution zipf --partitions 1,5,10 --output bench.json
+"""
+
+import os            # Để xóa file dữ liệu tạm
+import sys           # Để lấy phiên bản Python
+import json          # Để ghi kết quả
+import time          # Để đo thời gian thực thi
+import random        # Để sinh dữ liệu tổng hợp
+import asyncio       # Để chạy phép so sánh với AsyncInterface
+import contextlib    # Để chỉ vào khối bulkload khi cần
+import argparse      # Để đọc tham số dòng lệnh
+import itertools     # Để tính trọng số tích lũy
+import statistics    # Để tính trung vị
+import tempfile      # Để tạo file dữ liệu tạm
+import testHelper    # Module chứa các hàm hỗ trợ test
+import Interface as MyAssignment  # Module chính chứa logic phân vùng
+
+# Các hằng số cấu hình
+DATABASE_NAME = 'dds_assgn1'              # Tên database sử dụng cho bài tập
+RATINGS_TABLE = 'ratings'                 # Tên bảng chính chứa dữ liệu rating
+RATING_VALUES = [0.5, 1, 1.5, 2, 2.5, 3, 3.5, 4, 4.5, 5]         # Các giá trị rating hợp lệ
+MOVIELENS_WEIGHTS = [1, 4, 1, 8, 4, 24, 9, 29, 8, 15]             # Tỉ lệ (%) từng rating trong MovieLens 10M
+DISTRIBUTIONS = ('uniform', 'movielens', 'zipf')                  # Các phân bố dữ liệu hỗ trợ
+NUMBER_OF_USERS = 70000                   # Số userid khác nhau
+NUMBER_OF_MOVIES = 65000                  # Số movieid khác nhau
+ZIPF_EXPONENT = 1.1                       # Số mũ Zipf cho userid/movieid (phân bố 'zipf')
+GENERATE_CHUNK_ROWS = 100000              # Số dòng sinh ra mỗi lần ghi file
+FIRST_TIMESTAMP = 838985046               # Timestamp của dòng đầu tiên
+PERCENTILES = (50, 90, 99)                # Các phân vị độ trễ được báo cáo
+COPY_BUFFER_SIZE = 8192                   # Kích thước mỗi lần đọc stream COPY (như psycopg2 copy_expert)
+
+
+def print_progress(message, indent=0):
+    """
+    In thông báo tiến trình với timestamp và thụt lề
+    Args:
+        message: Nội dung thông báo cần in
+        indent: Mức độ thụt lề (0 = không thụt, 1 = 2 spaces, 2 = 4 spaces...)
+    """
+    print(f"[{time.strftime('%H:%M:%S')}] {'  ' * indent}{message}")
+
+
+class RatingsGenerator:
+    """
+    Sinh các bộ (userid, movieid, rating) theo một phân bố cố định và seed cố định
+    - uniform: userid, movieid và rating phân bố đều
+    - movielens: rating theo tỉ lệ của MovieLens 10M, userid/movieid phân bố đều
+    - zipf: rating như movielens, userid/movieid theo Zipf (một số ít người dùng/phim chiếm phần lớn đánh giá)
+    """
+
+    def __init__(self, distribution, seed):
+        """
+        Args:
+            distribution: Tên phân bố (một trong DISTRIBUTIONS)
+            seed: Seed của bộ sinh số ngẫu nhiên
+        """
+        if distribution not in DISTRIBUTIONS:
+            raise ValueError("distribution must be one of {0}, got {1!r}".format(DISTRIBUTIONS, distribution))
+        self.random = random.Random(seed)
+        self.ratingweights = None if distribution == 'uniform' else list(itertools.accumulate(MOVIELENS_WEIGHTS))
+        if distribution == 'zipf':
+            # Trọng số tích lũy 1/k^s, dùng chung cho mọi lần sinh để random.choices chỉ cần tìm nhị phân
+            self.userweights = self._zipf_weights(NUMBER_OF_USERS)
+            self.movieweights = self._zipf_weights(NUMBER_OF_MOVIES)
+        else:
+            self.userweights = self.movieweights = None
+
+    @staticmethod
+    def _zipf_weights(n):
+        return list(itertools.accumulate(1.0 / k ** ZIPF_EXPONENT for k in range(1, n + 1)))
+
+    def _ids(self, n, k, weights):
+        if weights is None:
+            return [self.random.randint(1, n) for _ in range(k)]
+        # Hoán vị cố định để id phổ biến nhất không luôn là 1
+        return [(i * 7919) % n + 1 for i in self.random.choices(range(n), cum_weights=weights, k=k)]
+
+    def rows(self, k):
+        """
+        Sinh k bộ (userid, movieid, rating)
+        Args:
+            k: Số dòng cần sinh
+        Returns:
+            List các bộ (userid, movieid, rating)
+        """
+        users = self._ids(NUMBER_OF_USERS, k, self.userweights)
+        movies = self._ids(NUMBER_OF_MOVIES, k, self.movieweights)
+        ratings = self.random.choices(RATING_VALUES, cum_weights=self.ratingweights, k=k)
+        return list(zip(users, movies, ratings))
+
+
+def generate_ratings_file(filepath, rows, distribution, seed):
+    """
+    Ghi file ratings tổng hợp cùng định dạng với ratings.dat
+    Args:
+        filepath: Đường dẫn file cần ghi
+        rows: Số dòng
+        distribution: Tên phân bố (một trong DISTRIBUTIONS)
+        seed: Seed của bộ sinh số ngẫu nhiên
+    """
+    generator = RatingsGenerator(distribution, seed)
+    with open(filepath, 'w') as f:
+        written = 0
+        while written < rows:
+            chunk = generator.rows(min(GENERATE_CHUNK_ROWS, rows - written))
+            f.write(''.join(f"{userid}::{movieid}::{rating:g}::{FIRST_TIMESTAMP + written + i}\n"
+                            for i, (userid, movieid, rating) in enumerate(chunk)))
+            written += len(chunk)
+
+
+def percentile(values, p):
+    """
+    Phân vị p (0-100) theo phương pháp nearest-rank
+    Args:
+        values: List giá trị đã sắp xếp tăng dần
+        p: Phân vị cần tính
+    Returns:
+        Giá trị tại phân vị p
+    """
+    rank = max(1, -(-len(values) * p // 100))  # ceil(len * p / 100)
+    return values[int(rank) - 1]
+
+
+def summarize_bulk(operation, rows, timings, partitions=None):
+    """
+    Tổng hợp kết quả của một thao tác hàng loạt (tải, phân vùng) đã chạy nhiều lần
+    Args:
+        operation: Tên thao tác
+        rows: Số dòng được xử lý mỗi lần
+        timings: List thời gian của từng lần chạy (giây)
+        partitions: Số phân vùng (None với loadratings)
+    Returns:
+        Dict kết quả
+    """
+    median = statistics.median(timings)
+    return {
+        'operation': operation,
+        'partitions': partitions,
+        'rows': rows,
+        'seconds': timings,
+        'median_seconds': median,
+        'rows_per_sec': rows / median if median else None,
+    }
+
+
+def summarize_latencies(operation, latencies, partitions):
+    """
+    Tổng hợp độ trễ của một thao tác từng dòng (insert)
+    Args:
+        operation: Tên thao tác
+        latencies: List thời gian của từng lệnh (giây)
+        partitions: Số phân vùng
+    Returns:
+        Dict kết quả với các phân vị độ trễ tính bằng mili giây
+    """
+    ordered = sorted(latencies)
+    result = {
+        'operation': operation,
+        'partitions': partitions,
+        'rows': len(latencies),
+        'rows_per_sec': len(latencies) / sum(latencies) if sum(latencies) else None,
+        'mean_ms': statistics.mean(ordered) * 1000,
+        'max_ms': ordered[-1] * 1000,
+    }
+    for p in PERCENTILES:
+        result[f"p{p}_ms"] = percentile(ordered, p) * 1000
+    return result
+
+
+def count_rows(conn):
+    """
+    Đếm số dòng hiện có của bảng chính
+    Args:
+        conn: Kết nối database
+    Returns:
+        Số dòng
+    """
+    with conn.cursor() as cur:
+        cur.execute(f"SELECT COUNT(*) FROM {RATINGS_TABLE}")
+        count = cur.fetchone()[0]
+    conn.commit()
+    return count
+
+
+def time_call(function, *args, **kwargs):
+    """
+    Gọi hàm và đo thời gian thực thi
+    Returns:
+        Thời gian thực thi (giây)
+    """
+    start_time = time.perf_counter()
+    function(*args, **kwargs)
+    return time.perf_counter() - start_time
+
+
+def time_inserts(conn, insert, rows):
+    """
+    Chèn từng dòng bằng hàm insert và đo độ trễ của mỗi lệnh
+    Args:
+        conn: Kết nối database
+        insert: MyAssignment.rangeinsert hoặc MyAssignment.roundrobininsert
+        rows: List các bộ (userid, movieid, rating) cần chèn
+    Returns:
+        List độ trễ của từng lệnh (giây)
+    """
+    return [time_call(insert, RATINGS_TABLE, userid, movieid, rating, conn) for userid, movieid, rating in rows]
+
+
+def run_suite(conn, filepath, partitions, inserts, repeats, workers, seed):
+    """
+    Chạy toàn bộ các phép đo trên file dữ liệu đã có
+    Args:
+        conn: Kết nối database
+        filepath: Đường dẫn file dữ liệu
+        partitions: List số phân vùng cần đo
+        inserts: Số lệnh insert được đo cho mỗi hàm insert và mỗi số phân vùng
+        repeats: Số lần chạy mỗi thao tác hàng loạt
+        workers: Số tiến trình tải song song truyền cho loadratings
+        seed: Seed để sinh các dòng được insert
+    Returns:
+        List các dict kết quả
+    """
+    results = []
+
+    print_progress(f"loadratings ({repeats} run(s), {workers} worker(s))...")
+    timings = [time_call(MyAssignment.loadratings, RATINGS_TABLE, filepath, conn, workers=workers)
+               for _ in range(repeats)]
+    results.append(summarize_bulk('loadratings', count_rows(conn), timings))
+    print_progress(f"{results[-1]['rows_per_sec']:,.0f} rows/sec", indent=1)
+
+    # Các dòng insert được sinh theo phân bố đều, độc lập với file dữ liệu
+    generator = RatingsGenerator('uniform', seed)
+    for n in partitions:
+        for operation, partition, insert in (
+                ('rangepartition', MyAssignment.rangepartition, MyAssignment.rangeinsert),
+                ('roundrobinpartition', MyAssignment.roundrobinpartition, MyAssignment.roundrobininsert)):
+            print_progress(f"{operation} with {n} partitions...")
+            rows = count_rows(conn)
+            timings = [time_call(partition, RATINGS_TABLE, n, conn) for _ in range(repeats)]
+            results.append(summarize_bulk(operation, rows, timings, n))
+            print_progress(f"{results[-1]['rows_per_sec']:,.0f} rows/sec", indent=1)
+
+            insertname = insert.__name__
+            latencies = time_inserts(conn, insert, generator.rows(inserts))
+            results.append(summarize_latencies(insertname, latencies, n))
+            print_progress(f"{insertname}: p50 {results[-1]['p50_ms']:.2f} ms, p99 {results[-1]['p99_ms']:.2f} ms",
+                           indent=1)
+    return results
+
+
+async def run_async_comparison(conn, filepath, partitions, inserts, repeats, concurrency, seed):
+    """
+    So sánh thông lượng của API đồng bộ và API asyncio trên cùng dữ liệu
+    Mỗi thao tác được chạy lần lượt bằng Interface rồi bằng AsyncInterface; với insert, bản đồng bộ
+    chèn từng dòng nối tiếp trên conn, bản bất đồng bộ chèn tất cả các dòng đồng thời qua pool
+    Args:
+        conn: Kết nối database (API đồng bộ)
+        filepath: Đường dẫn file dữ liệu
+        partitions: List số phân vùng cần đo
+        inserts: Số dòng được chèn cho mỗi hàm insert và mỗi số phân vùng
+        repeats: Số lần chạy mỗi thao tác hàng loạt
+        concurrency: Số kết nối tối đa của pool asyncpg
+        seed: Seed để sinh các dòng được insert
+    Returns:
+        List các dict kết quả, mỗi dict có thêm khóa 'api' ('sync' hoặc 'async')
+    """
+    import AsyncInterface  # Chỉ cần (cùng asyncpg) khi chạy với --async
+
+    results = []
+
+    def record(api, result):
+        results.append(dict(result, api=api))
+        print_progress(f"{api}: {result['rows_per_sec']:,.0f} rows/sec", indent=1)
+
+    async def timed(coroutine):
+        start_time = time.perf_counter()
+        await coroutine
+        return time.perf_counter() - start_time
+
+    # Mở sẵn mọi kết nối để thời gian tạo kết nối không bị tính vào các phép đo
+    pool = await AsyncInterface.create_pool(dbname=DATABASE_NAME, minconn=concurrency, maxconn=concurrency)
+    try:
+        print_progress(f"loadratings, sync vs async ({repeats} run(s))...")
+        timings = [time_call(MyAssignment.loadratings, RATINGS_TABLE, filepath, conn) for _ in range(repeats)]
+        record('sync', summarize_bulk('loadratings', count_rows(conn), timings))
+        timings = [await timed(AsyncInterface.loadratings(RATINGS_TABLE, filepath, pool)) for _ in range(repeats)]
+        record('async', summarize_bulk('loadratings', count_rows(conn), timings))
+
+        generator = RatingsGenerator('uniform', seed)
+        for n in partitions:
+            for operation, insertname in (('rangepartition', 'rangeinsert'),
+                                          ('roundrobinpartition', 'roundrobininsert')):
+                print_progress(f"{operation} with {n} partitions, sync vs async...")
+                rows = count_rows(conn)
+                timings = [time_call(getattr(MyAssignment, operation), RATINGS_TABLE, n, conn)
+                           for _ in range(repeats)]
+                record('sync', summarize_bulk(operation, rows, timings, n))
+                timings = [await timed(getattr(AsyncInterface, operation)(RATINGS_TABLE, n, pool))
+                           for _ in range(repeats)]
+                record('async', summarize_bulk(operation, rows, timings, n))
+
+                print_progress(f"{insertname}: {inserts} rows, sync (serial) vs async ({concurrency} connections)...")
+                rows = generator.rows(inserts)
+                insert = getattr(MyAssignment, insertname)
+                elapsed = time_call(lambda: [insert(RATINGS_TABLE, *row, conn) for row in rows])
+                record('sync', summarize_bulk(insertname, inserts, [elapsed], n))
+                insert = getattr(AsyncInterface, insertname)
+                elapsed = await timed(asyncio.gather(*[insert(RATINGS_TABLE, *row, pool) for row in rows]))
+                record('async', summarize_bulk(insertname, inserts, [elapsed], n))
+    finally:
+        await pool.close()
+    return results
+
+
+BULK_MODES = ('default', 'bulk', 'bulk+setlogged')  # Các chế độ được so sánh với --bulk
+
+
+def run_bulk_comparison(conn, filepath, partitions, repeats):
+    """
+    Đo thời gian xây dựng bảng chính và hai tập phân vùng với thiết lập mặc định và trong bulkload
+    Args:
+        conn: Kết nối database
+        filepath: Đường dẫn file dữ liệu
+        partitions: List số phân vùng cần đo
+        repeats: Số lần chạy mỗi chế độ
+    Returns:
+        List các dict kết quả (trung vị thời gian của từng bước, giây)
+    """
+    results = []
+    steps = ('loadratings', 'rangepartition', 'roundrobinpartition', 'setlogged', 'restore')
+    for n in partitions:
+        for mode in BULK_MODES:
+            print_progress(f"build with {n} partitions, {mode} ({repeats} run(s))...")
+            runs = []
+            for _ in range(repeats):
+                timings = {}
+                with contextlib.ExitStack() as stack:
+                    session = None
+                    if mode != 'default':
+                        session = stack.enter_context(MyAssignment.bulkload(conn, setlogged=(mode == 'bulk+setlogged')))
+                    timings['loadratings'] = time_call(MyAssignment.loadratings, RATINGS_TABLE, filepath, conn)
+                    timings['rangepartition'] = time_call(MyAssignment.rangepartition, RATINGS_TABLE, n, conn)
+                    timings['roundrobinpartition'] = time_call(MyAssignment.roundrobinpartition, RATINGS_TABLE, n,
+                                                               conn)
+                # Các bước kết thúc bulkload chỉ có thời gian sau khi ra khỏi khối with
+                timings['setlogged'] = session.timings['setlogged'] if session else 0.0
+                timings['restore'] = session.timings['restore'] if session else 0.0
+                runs.append(timings)
+            result = {'operation': 'build', 'mode': mode, 'partitions': n}
+            for step in steps:
+                result[f"{step}_seconds"] = statistics.median(run[step] for run in runs)
+            result['total_seconds'] = statistics.median(sum(run.values()) for run in runs)
+            results.append(result)
+            print_progress(f"total {result['total_seconds']:.3f} seconds (" +
+                           ', '.join(f"{step} {result[step + '_seconds']:.3f}" for step in steps) + ")", indent=1)
+    return results
+
+
+def measure_copy_stream(filepath, copyformat, compact):
+    """
+    Đọc hết dữ liệu COPY mà loadratings gửi đi (không cần database) để đo phần chi phí phía client
+    Args:
+        filepath: Đường dẫn file dữ liệu
+        copyformat: 'text' hoặc 'binary'
+        compact: Lược đồ gọn (rating real)
+    Returns:
+        Cặp (số byte gửi đi, thời gian đọc và mã hóa, giây)
+    """
+    with open(filepath, 'rb') as f:
+        if copyformat == 'binary':
+            stream = MyAssignment.RatingsBinaryCopyStream(f, compact=compact)
+        else:
+            stream = MyAssignment.RatingsCopyStream(f)
+        nbytes = 0
+        start = time.perf_counter()
+        while True:
+            data = stream.read(COPY_BUFFER_SIZE)
+            if not data:
+                break
+            nbytes += len(data)
+        return nbytes, time.perf_counter() - start
+
+
+def run_copyformat_comparison(conn, filepath, repeats, workers):
+    """
+    So sánh loadratings với COPY dạng text và binary
+    Args:
+        conn: Kết nối database
+        filepath: Đường dẫn file dữ liệu
+        repeats: Số lần chạy mỗi cấu hình
+        workers: Số tiến trình tải của loadratings
+    Returns:
+        List các dict kết quả (trung vị thời gian, giây)
+    """
+    results = []
+    for compact in (False, True):
+        schema = 'compact' if compact else 'default'
+        for copyformat in MyAssignment.COPY_FORMATS:
+            print_progress(f"loadratings, {copyformat} COPY, {schema} schema ({repeats} run(s))...")
+            timings = [time_call(MyAssignment.loadratings, RATINGS_TABLE, filepath, conn, workers=workers,
+                                 compact=compact, copyformat=copyformat) for _ in range(repeats)]
+            encodings = [measure_copy_stream(filepath, copyformat, compact) for _ in range(repeats)]
+            rows = count_rows(conn)
+            result = summarize_bulk('loadratings', rows, timings)
+            result.update(copyformat=copyformat, schema=schema, bytes_sent=encodings[0][0],
+                          encode_seconds=statistics.median(seconds for _, seconds in encodings))
+            # Phần còn lại của thời gian tải chủ yếu là server phân tích và ghi dữ liệu
+            result['server_seconds'] = result['median_seconds'] - result['encode_seconds']
+            results.append(result)
+            print_progress(f"{result['rows_per_sec']:,.0f} rows/sec, encode {result['encode_seconds']:.3f} s, "
+                           f"server {result['server_seconds']:.3f} s, {result['bytes_sent']:,} bytes", indent=1)
+    return results
+
+
+def server_version(conn):
+    """
+    Lấy phiên bản PostgreSQL của server
+    """
+    with conn.cursor() as cur:
+        cur.execute("SHOW server_version")
+        version = cur.fetchone()[0]
+    conn.commit()
+    return version
+
+
+def parse_arguments(argv=None):
+    """
+    Đọc tham số dòng lệnh
+    Args:
+        argv: List tham số (mặc định: sys.argv[1:])
+    """
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--rows', type=int, default=1000000, help='số dòng của file tổng hợp')
+    parser.add_argument('--distribution', choices=DISTRIBUTIONS, default='movielens', help='phân bố dữ liệu')
+    parser.add_argument('--seed', type=int, default=42, help='seed của bộ sinh dữ liệu')
+    parser.add_argument('--file', help='dùng file dữ liệu có sẵn thay vì sinh file tổng hợp')
+    parser.add_argument('--partitions', default='1,5,10',
+                        help='các số phân vùng cần đo, phân tách bằng dấu phẩy')
+    parser.add_argument('--inserts', type=int, default=1000, help='số lệnh insert được đo mỗi lần')
+    parser.add_argument('--repeats', type=int, default=3, help='số lần chạy mỗi thao tác hàng loạt')
+    parser.add_argument('--workers', type=int, default=1, help='số tiến trình tải của loadratings')
+    parser.add_argument('--output', default='benchmark.json', help='file JSON kết quả')
+    parser.add_argument('--phases', action='store_true',
+                        help='ghi thêm số liệu của từng giai đoạn (làm chậm các thao tác một chút)')
+    parser.add_argument('--async', dest='compare_async', action='store_true',
+                        help='so sánh thông lượng API đồng bộ và AsyncInterface (cần asyncpg)')
+    parser.add_argument('--concurrency', type=int, default=16,
+                        help='số kết nối của pool asyncpg khi chạy với --async')
+    parser.add_argument('--bulk', action='store_true',
+                        help='so sánh thời gian xây dựng với thiết lập mặc định và trong Interface.bulkload')
+    parser.add_argument('--copyformat', action='store_true',
+                        help='so sánh loadratings với COPY dạng text và binary')
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    """
+    Hàm chính: sinh dữ liệu (nếu cần), chạy các phép đo và ghi kết quả JSON
+    """
+    args = parse_arguments(argv)
+    partitions = [int(n) for n in args.partitions.split(',')]
+
+    filepath = args.file
+    if filepath is None:
+        fd, filepath = tempfile.mkstemp(prefix='ratings_', suffix='.dat')
+        os.close(fd)
+        print_progress(f"Generating {args.rows:,} {args.distribution} rows into {filepath}...")
+        generate_ratings_file(filepath, args.rows, args.distribution, args.seed)
+
+    try:
+        testHelper.createdb(DATABASE_NAME)
+        with testHelper.getopenconnection(dbname=DATABASE_NAME) as conn:
+            testHelper.deleteAllPublicTables(conn)
+            report = {
+                'created': time.strftime('%Y-%m-%dT%H:%M:%S'),
+                'python': sys.version.split()[0],
+                'postgres': server_version(conn),
+                'parameters': {
+                    'file': args.file,
+                    'rows': None if args.file else args.rows,
+                    'distribution': None if args.file else args.distribution,
+                    'seed': args.seed,
+                    'partitions': partitions,
+                    'inserts': args.inserts,
+                    'repeats': args.repeats,
+                    'workers': args.workers,
+                    'concurrency': args.concurrency if args.compare_async else None,
+                },
+            }
+            registry = MyAssignment.MetricsRegistry()
+            if args.phases:
+                MyAssignment.add_instrumentation_hook(registry)
+            try:
+                report['results'] = run_suite(conn, filepath, partitions, args.inserts, args.repeats, args.workers,
+                                              args.seed)
+            finally:
+                if args.phases:
+                    MyAssignment.remove_instrumentation_hook(registry)
+            if args.compare_async:
+                report['async_comparison'] = asyncio.run(run_async_comparison(
+                    conn, filepath, partitions, args.inserts, args.repeats, args.concurrency, args.seed))
+            if args.bulk:
+                report['bulk_comparison'] = run_bulk_comparison(conn, filepath, partitions, args.repeats)
+            if args.copyformat:
+                report['copyformat_comparison'] = run_copyformat_comparison(conn, filepath, args.repeats,
+                                                                            args.workers)
+            if args.phases:
+                report['phases'] = [dict(values, operation=operation, phase=phase)
+                                    for (operation, phase), values in sorted(registry.totals().items())]
+    finally:
+        if args.file is None:
+            os.remove(filepath)  # Xóa file tổng hợp tạm
+
+    with open(args.output, 'w') as f:
+        json.dump(report, f, indent=2)
+    print_progress(f"Results written to {args.output}")
+
+
+if __name__ == '__main__':
+    main()
@@ -8,15 +8,26 @@ Chứa các hàm tiện ích để:
 4. Xác minh các tính chất: Completeness, Disjointness, Reconstruction
 """
 
+import os         # Để lấy kích thước file dữ liệu
+import time       # Để đo thời gian kiểm tra từng phân vùng
 import traceback  # Để in chi tiết lỗi
-import psycopg2   # Thư viện kết nối PostgreSQL
+import Interface  # Để lấy kết nối từ pool dùng chung (getopenconnection)
+from Interface import getconnectionpool  # Pool kết nối dùng chung cho các thao tác quản trị database
+from Interface import invalidate_partition_cache  # Để quên metadata phân vùng của các bảng đã xóa
+from concurrent.futures import ThreadPoolExecutor  # Để kiểm tra song song các phân vùng
 
 # Các hằng số định nghĩa tên bảng và cột
 RANGE_TABLE_PREFIX = 'range_part'     # Tiền tố cho bảng phân vùng range
 RROBIN_TABLE_PREFIX = 'rrobin_part'   # Tiền tố cho bảng phân vùng round robin
+HASH_TABLE_PREFIX = 'hash_part'       # Tiền tố cho bảng phân vùng hash
 USER_ID_COLNAME = 'userid'            # Tên cột user ID
 MOVIE_ID_COLNAME = 'movieid'          # Tên cột movie ID  
 RATING_COLNAME = 'rating'             # Tên cột rating
+MAX_OFFENDING_ROWS = 10               # Số dòng sai tối đa được báo cho mỗi phân vùng
+# Checksum 64 bit của nội dung một dòng; tổng các checksum không phụ thuộc thứ tự dòng.
+# Băm từng cột nhanh hơn nhiều so với băm ROW(...)::text, dòng có cột NULL dùng hàm băm bản ghi
+ROW_CHECKSUM = ('COALESCE(hashint4extended(userid, hashint4extended(movieid, hashfloat8extended(rating, 0))), '
+                'hash_record_extended(ROW(userid, movieid, rating), 0))')
 
 # ===== PHẦN 1: CÁC HÀM THIẾT LẬP VÀ QUẢN LÝ DATABASE =====
 
@@ -29,26 +40,24 @@ def createdb(dbname):
     Returns:
         None
     """
-    # Kết nối đến database mặc định 'postgres'
-    con = getopenconnection()
-    # Thiết lập chế độ autocommit để có thể thực thi CREATE DATABASE
-    con.set_isolation_level(psycopg2.extensions.ISOLATION_LEVEL_AUTOCOMMIT)
-    cur = con.cursor()
+    # Lấy kết nối đến database mặc định 'postgres' từ pool dùng chung,
+    # bật chế độ autocommit để có thể thực thi CREATE DATABASE
+    with getconnectionpool(dbname='postgres').connection(autocommit=True) as con:
+        cur = con.cursor()
 
-    # Kiểm tra xem database đã tồn tại chưa trong catalog của PostgreSQL
-    cur.execute('SELECT COUNT(*) FROM pg_catalog.pg_database WHERE datname=\'%s\'' % (dbname,))
-    count = cur.fetchone()[0]
-    
-    if count == 0:
-        # Database chưa tồn tại -> tạo mới
-        cur.execute('CREATE DATABASE %s' % (dbname,))
-    else:
-        # Database đã tồn tại -> thông báo
-        print('A database named "{0}" already exists'.format(dbname))
+        # Kiểm tra xem database đã tồn tại chưa trong catalog của PostgreSQL
+        cur.execute('SELECT COUNT(*) FROM pg_catalog.pg_database WHERE datname=\'%s\'' % (dbname,))
+        count = cur.fetchone()[0]
+        
+        if count == 0:
+            # Database chưa tồn tại -> tạo mới
+            cur.execute('CREATE DATABASE %s' % (dbname,))
+        else:
+            # Database đã tồn tại -> thông báo
+            print('A database named "{0}" already exists'.format(dbname))
 
-    # Dọn dẹp tài nguyên
-    cur.close()
-    con.close()
+        # Dọn dẹp tài nguyên (kết nối được trả về pool)
+        cur.close()
 
 def delete_db(dbname):
     """
@@ -56,12 +65,11 @@ def delete_db(dbname):
     Args:
         dbname: Tên database cần xóa
     """
-    con = getopenconnection(dbname = 'postgres')  # Kết nối đến database mặc định
-    con.set_isolation_level(psycopg2.extensions.ISOLATION_LEVEL_AUTOCOMMIT)
-    cur = con.cursor()
-    cur.execute('drop database ' + dbname)  # Thực thi lệnh xóa database
-    cur.close()
-    con.close()
+    # Kết nối đến database mặc định (lấy từ pool)
+    with getconnectionpool(dbname='postgres').connection(autocommit=True) as con:
+        cur = con.cursor()
+        cur.execute('drop database ' + dbname)  # Thực thi lệnh xóa database
+        cur.close()
 
 
 def deleteAllPublicTables(openconnection):
@@ -83,10 +91,13 @@ def deleteAllPublicTables(openconnection):
         cur.execute("drop table if exists {0} CASCADE".format(tablename))
 
     cur.close()
+    # Metadata phân vùng trong bộ nhớ đệm của Interface không còn đúng với database này
+    invalidate_partition_cache(openconnection)
 
 def getopenconnection(user='postgres', password='1234', dbname='postgres'):
     """
-    Tạo kết nối đến PostgreSQL database
+    Lấy kết nối đến PostgreSQL database từ pool dùng chung (xem Interface.getopenconnection),
+    close() trả kết nối về pool
     Args:
         user: Tên người dùng (mặc định: 'postgres')
         password: Mật khẩu (mặc định: '1234')
@@ -94,7 +105,7 @@ def getopenconnection(user='postgres', password='1234', dbname='postgres'):
     Returns:
         Đối tượng kết nối psycopg2
     """
-    return psycopg2.connect("dbname='" + dbname + "' user='" + user + "' host='localhost' password='" + password + "'")
+    return Interface.getopenconnection(user, password, dbname)
 
 
 # ===== PHẦN 2: CÁC HÀM HỖ TRỢ KIỂM THỬ PHÂN VÙNG =====
@@ -134,7 +145,8 @@ def getCountrangepartition(ratingstablename, numberofpartitions, openconnection)
 def getCountroundrobinpartition(ratingstablename, numberofpartitions, openconnection):
     """
     Tính số dòng dự kiến trong mỗi phân vùng round robin dựa trên bảng gốc
-    Sử dụng ROW_NUMBER() để mô phỏng thuật toán round robin
+    Dòng thứ k (đếm từ 0) thuộc phân vùng k % numberofpartitions nên chỉ cần đếm bảng gốc một lần:
+    mỗi phân vùng có total // n dòng, total % n phân vùng đầu tiên có thêm một dòng
     Args:
         ratingstablename: Tên bảng ratings gốc
         numberofpartitions: Số lượng phân vùng
@@ -143,16 +155,31 @@ def getCountroundrobinpartition(ratingstablename, numberofpartitions, openconnec
         List chứa số dòng dự kiến cho từng phân vùng
     """
     cur = openconnection.cursor()
-    countList = []  # Danh sách lưu số dòng của từng phân vùng
-      # Với mỗi phân vùng i, đếm các dòng có (row_number-1) % numberofpartitions = i
-    for i in range(0, numberofpartitions):
-        cur.execute(
-            "select count(*) from (select *, row_number() over () from {0}) as temp where (row_number-1)%{1}= {2}".format(
-                ratingstablename, numberofpartitions, i))
-        countList.append(int(cur.fetchone()[0]))
+    cur.execute("select count(*) from {0}".format(ratingstablename))
+    total = int(cur.fetchone()[0])
+    cur.close()
     
+    base, extra = divmod(total, numberofpartitions)
+    return [base + (1 if i < extra else 0) for i in range(numberofpartitions)]
+
+def getCounthashpartition(ratingstablename, numberofpartitions, key, openconnection):
+    """
+    Tính số dòng dự kiến trong mỗi phân vùng hash dựa trên bảng gốc
+    Dòng có khóa k thuộc phân vùng k mod numberofpartitions (dòng có khóa NULL không thuộc phân vùng nào)
+    Args:
+        ratingstablename: Tên bảng ratings gốc
+        numberofpartitions: Số lượng phân vùng
+        key: Cột khóa phân vùng (userid hoặc movieid)
+        openconnection: Kết nối database
+    Returns:
+        List chứa số dòng dự kiến cho từng phân vùng
+    """
+    cur = openconnection.cursor()
+    cur.execute("select (({1} % {2}) + {2}) % {2}, count(*) from {0} where {1} is not null group by 1".format(
+        ratingstablename, key, numberofpartitions))
+    counts = dict(cur.fetchall())
     cur.close()
-    return countList
+    return [int(counts.get(i, 0)) for i in range(numberofpartitions)]
 
 # ===== PHẦN 3: CÁC HÀM KIỂM TRA TÍNH CHẤT CỦA PHÂN VÙNG =====
 
@@ -198,50 +225,180 @@ def totalrowsinallpartitions(cur, n, rangepartitiontableprefix, partitionstartin
     return count
 
 
-def testrangeandrobinpartitioning(n, openconnection, rangepartitiontableprefix, partitionstartindex, ACTUAL_ROWS_IN_INPUT_FILE):
+def getrangebucket(lows, highs):
     """
-    Kiểm tra các tính chất quan trọng của phân vùng:
+    Tạo biểu thức SQL trả về chỉ số phân vùng range của một dòng theo biên cho trước
+    Phân vùng 0 gồm cả cận dưới, các phân vùng khác: lowerbound < rating <= upperbound,
+    dòng không thuộc phân vùng nào nhận NULL
+    Args:
+        lows, highs: List cận dưới và cận trên của từng phân vùng
+    Returns:
+        Biểu thức SQL dạng CASE
+    """
+    conditions = ["WHEN rating >= {0} AND rating <= {1} THEN 0".format(lows[0], highs[0])]
+    for i in range(1, len(lows)):
+        conditions.append("WHEN rating > {0} AND rating <= {1} THEN {2}".format(lows[i], highs[i], i))
+    return "CASE {0} END".format(' '.join(conditions))
+
+
+def getequalrangebounds(numberofpartitions):
+    """
+    Tính biên của các phân vùng range đều nhau, cùng cách tính với getCountrangepartition
+    Args:
+        numberofpartitions: Số lượng phân vùng
+    Returns:
+        Cặp (lows, highs)
+    """
+    interval = 5.0 / numberofpartitions  # Khoảng cách giữa các phân vùng (rating từ 0-5)
+    lows, highs = [0], [interval]
+    lowerbound = interval
+    for i in range(1, numberofpartitions):
+        lows.append(lowerbound)
+        highs.append(lowerbound + interval)
+        lowerbound += interval
+    return lows, highs
+
+
+def gethashbucket(key, numberofpartitions):
+    """
+    Tạo biểu thức SQL trả về chỉ số phân vùng hash của một dòng (NULL nếu khóa NULL)
+    Args:
+        key: Cột khóa phân vùng
+        numberofpartitions: Số lượng phân vùng
+    """
+    return "(({0} % {1}) + {1}) % {1}".format(key, numberofpartitions)
+
+
+def getPartitionChecksums(cur, ratingstablename, n, partitiontableprefix, partitionstartindex, bucket=None):
+    """
+    Đọc tất cả các phân vùng và bảng gốc trong một câu lệnh duy nhất, tính số dòng và tổng checksum
+    (ROW_CHECKSUM) của từng phân vùng và của từng nhóm dòng của bảng gốc theo phân vùng dự kiến
+    Args:
+        cur: Database cursor
+        ratingstablename: Tên bảng gốc (None: chỉ đọc các phân vùng)
+        n: Số lượng phân vùng
+        partitiontableprefix: Tiền tố tên bảng phân vùng
+        partitionstartindex: Chỉ số bắt đầu của phân vùng (0 hoặc 1)
+        bucket: Biểu thức SQL trả về phân vùng dự kiến của một dòng bảng gốc (None: không chia nhóm)
+    Returns:
+        Cặp (partitions, master): partitions là list (số dòng, checksum) của từng phân vùng,
+        master là dict phân vùng dự kiến -> (số dòng, checksum), khóa None gồm các dòng không có phân vùng
+    """
+    # Mỗi bảng được tổng hợp riêng trong cùng một câu lệnh
+    selects = []
+    for i in range(n):
+        selects.append('SELECT {0} AS part, NULL::integer AS bucket, COUNT(*), COALESCE(SUM({1}), 0) FROM {2}{3}'.format(
+            i, ROW_CHECKSUM, partitiontableprefix, i + partitionstartindex))
+    if ratingstablename is not None:
+        selects.append('SELECT NULL, {0}, COUNT(*), COALESCE(SUM({1}), 0) FROM {2} GROUP BY 2'.format(
+            bucket or 'NULL::integer', ROW_CHECKSUM, ratingstablename))
+    cur.execute(' UNION ALL '.join(selects))
+    
+    partitions = [(0, 0)] * n
+    master = {}
+    for part, partbucket, count, checksum in cur.fetchall():
+        if part is not None:
+            partitions[part] = (int(count), int(checksum))
+        else:
+            master[partbucket] = (int(count), int(checksum))
+    return partitions, master
+
+
+def verifypartitions(ratingstablename, n, openconnection, partitiontableprefix, partitionstartindex,
+                     ACTUAL_ROWS_IN_INPUT_FILE, bucket=None, roundrobin=False):
+    """
+    Kiểm tra phân vùng chỉ với một lần đọc các phân vùng và bảng gốc (xem getPartitionChecksums):
     1. Completeness: Không mất dữ liệu (tổng số dòng >= dữ liệu gốc)
-    2. Disjointness: Không trùng lặp dữ liệu (tổng số dòng <= dữ liệu gốc)  
-    3. Reconstruction: Có thể tái tạo hoàn toàn (tổng số dòng = dữ liệu gốc)
+    2. Disjointness: Không trùng lặp dữ liệu (tổng số dòng <= dữ liệu gốc)
+    3. Reconstruction: Hợp các phân vùng có đúng nội dung của bảng gốc (cùng số dòng và cùng tổng checksum)
+    4. Nếu có bucket: mỗi phân vùng chứa đúng các dòng của bảng gốc thuộc về nó (số dòng và checksum)
+    5. Nếu roundrobin: mỗi phân vùng có total // n dòng, total % n phân vùng đầu tiên có thêm một dòng
     Args:
+        ratingstablename: Tên bảng gốc (None: chỉ kiểm tra số dòng)
         n: Số lượng phân vùng
         openconnection: Kết nối database
-        rangepartitiontableprefix: Tiền tố tên bảng
-        partitionstartindex: Chỉ số bắt đầu
+        partitiontableprefix: Tiền tố tên bảng phân vùng
+        partitionstartindex: Chỉ số bắt đầu của phân vùng (0 hoặc 1)
         ACTUAL_ROWS_IN_INPUT_FILE: Số dòng thực tế trong file gốc
+        bucket: Biểu thức SQL trả về phân vùng dự kiến của một dòng (getrangebucket, gethashbucket)
+        roundrobin: True để kiểm tra số dòng của từng phân vùng theo round robin
+    Returns:
+        List số dòng của từng phân vùng
     """
     with openconnection.cursor() as cur:
         if not isinstance(n, int) or n < 0:
             # Test 1: Nếu n không hợp lệ, không nên tạo bảng nào
-            checkpartitioncount(cur, 0, rangepartitiontableprefix)
+            checkpartitioncount(cur, 0, partitiontableprefix)
+            return []
+        
+        # Test 2: Kiểm tra số lượng bảng được tạo đúng như yêu cầu
+        checkpartitioncount(cur, n, partitiontableprefix)
+        
+        partitions, master = getPartitionChecksums(cur, ratingstablename, n, partitiontableprefix,
+                                                   partitionstartindex, bucket)
+    count = sum(c for c, _ in partitions)
+    checksum = sum(h for _, h in partitions)
+    
+    # Test 3: Kiểm tra tính Completeness (đầy đủ)
+    if count < ACTUAL_ROWS_IN_INPUT_FILE:
+        raise Exception(
+            "Completeness property of Partitioning failed. Excpected {0} rows after merging all tables, but found {1} rows".format(
+                ACTUAL_ROWS_IN_INPUT_FILE, count))
+    
+    # Test 4: Kiểm tra tính Disjointness (không trùng lặp)
+    if count > ACTUAL_ROWS_IN_INPUT_FILE:
+        raise Exception(
+            "Dijointness property of Partitioning failed. Excpected {0} rows after merging all tables, but found {1} rows".format(
+                ACTUAL_ROWS_IN_INPUT_FILE, count))
+    
+    if ratingstablename is None:
+        return [c for c, _ in partitions]
+    
+    # Test 5: Kiểm tra tính Reconstruction (tái tạo hoàn toàn): cùng số dòng và cùng nội dung với bảng gốc
+    mastercount = sum(c for c, _ in master.values())
+    masterchecksum = sum(h for _, h in master.values())
+    if count != mastercount or checksum != masterchecksum:
+        raise Exception(
+            "Rescontruction property of Partitioning failed. Merging all tables gives {0} rows with checksum {1}, "
+            "but '{2}' has {3} rows with checksum {4}".format(count, checksum, ratingstablename, mastercount,
+                                                              masterchecksum))
+    
+    # Test 6: Kiểm tra từng phân vùng: đúng các dòng thuộc về nó (bucket) hoặc đúng số dòng (round robin)
+    base, extra = divmod(mastercount, n) if n else (0, 0)
+    for i, (partcount, partchecksum) in enumerate(partitions):
+        if bucket is not None:
+            expectedcount, expectedchecksum = master.get(i, (0, 0))
+        elif roundrobin:
+            expectedcount, expectedchecksum = base + (1 if i < extra else 0), None
         else:
-            # Test 2: Kiểm tra số lượng bảng được tạo đúng như yêu cầu
-            checkpartitioncount(cur, n, rangepartitiontableprefix)
-
-            # Test 3: Kiểm tra tính Completeness (đầy đủ)
-            # Tổng số dòng sau phân vùng phải >= số dòng gốc
-            count = totalrowsinallpartitions(cur, n, rangepartitiontableprefix, partitionstartindex)
-            if count < ACTUAL_ROWS_IN_INPUT_FILE: 
-                raise Exception(
-                    "Completeness property of Partitioning failed. Excpected {0} rows after merging all tables, but found {1} rows".format(
-                        ACTUAL_ROWS_IN_INPUT_FILE, count))
+            break
+        if partcount != expectedcount:
+            raise Exception("{0}{1} has {2} of rows while the correct number should be {3}".format(
+                partitiontableprefix, i + partitionstartindex, partcount, expectedcount))
+        if expectedchecksum is not None and partchecksum != expectedchecksum:
+            raise Exception("{0}{1} has {2} rows whose content does not match the rows of '{3}' that belong to it".format(
+                partitiontableprefix, i + partitionstartindex, partcount, ratingstablename))
+    return [c for c, _ in partitions]
 
-            # Test 4: Kiểm tra tính Disjointness (không trùng lặp)
-            # Tổng số dòng sau phân vùng phải <= số dòng gốc
-            count = totalrowsinallpartitions(cur, n, rangepartitiontableprefix, partitionstartindex)
-            if count > ACTUAL_ROWS_IN_INPUT_FILE: 
-                raise Exception(
-                    "Dijointness property of Partitioning failed. Excpected {0} rows after merging all tables, but found {1} rows".format(
-                        ACTUAL_ROWS_IN_INPUT_FILE, count))
 
-            # Test 5: Kiểm tra tính Reconstruction (tái tạo hoàn toàn)
-            # Tổng số dòng sau phân vùng phải = số dòng gốc chính xác
-            count = totalrowsinallpartitions(cur, n, rangepartitiontableprefix, partitionstartindex)
-            if count != ACTUAL_ROWS_IN_INPUT_FILE: 
-                raise Exception(
-                    "Rescontruction property of Partitioning failed. Excpected {0} rows after merging all tables, but found {1} rows".format(
-                        ACTUAL_ROWS_IN_INPUT_FILE, count))
+def testrangeandrobinpartitioning(n, openconnection, rangepartitiontableprefix, partitionstartindex, ACTUAL_ROWS_IN_INPUT_FILE,
+                                  ratingstablename=None):
+    """
+    Kiểm tra các tính chất quan trọng của phân vùng:
+    1. Completeness: Không mất dữ liệu (tổng số dòng >= dữ liệu gốc)
+    2. Disjointness: Không trùng lặp dữ liệu (tổng số dòng <= dữ liệu gốc)  
+    3. Reconstruction: Có thể tái tạo hoàn toàn (tổng số dòng = dữ liệu gốc, cùng nội dung nếu có ratingstablename)
+    Các phân vùng chỉ được đọc một lần (xem verifypartitions)
+    Args:
+        n: Số lượng phân vùng
+        openconnection: Kết nối database
+        rangepartitiontableprefix: Tiền tố tên bảng
+        partitionstartindex: Chỉ số bắt đầu
+        ACTUAL_ROWS_IN_INPUT_FILE: Số dòng thực tế trong file gốc
+        ratingstablename: Tên bảng gốc để so sánh nội dung (mặc định: chỉ so sánh số dòng)
+    """
+    verifypartitions(ratingstablename, n, openconnection, rangepartitiontableprefix, partitionstartindex,
+                     ACTUAL_ROWS_IN_INPUT_FILE)
 
 
 def testrangerobininsert(expectedtablename, itemid, openconnection, rating, userid):
@@ -315,9 +472,216 @@ def testEachRoundrobinPartition(ratingstablename, n, openconnection, roundrobinp
                 roundrobinpartitiontableprefix, i, count, countList[i]
             ))
 
+def testEachHashPartition(ratingstablename, n, key, openconnection, hashpartitiontableprefix):
+    """
+    Kiểm tra từng phân vùng hash chỉ chứa các dòng có khóa thuộc về nó và có đúng số dòng như tính toán
+    Args:
+        ratingstablename: Tên bảng gốc
+        n: Số lượng phân vùng
+        key: Cột khóa phân vùng
+        openconnection: Kết nối database
+        hashpartitiontableprefix: Tiền tố tên bảng phân vùng
+    """
+    # Tính số dòng dự kiến cho từng phân vùng
+    countList = getCounthashpartition(ratingstablename, n, key, openconnection)
+    cur = openconnection.cursor()
+    
+    # Kiểm tra từng phân vùng
+    for i in range(0, n):
+        cur.execute("select count(*), count(*) filter (where {0} is null or (({0} % {1}) + {1}) % {1} <> {2}) "
+                    "from {3}{2}".format(key, n, i, hashpartitiontableprefix))
+        count, misplaced = cur.fetchone()  # Số dòng thực tế và số dòng sai phân vùng
+        if misplaced:
+            raise Exception("{0}{1} has {2} rows whose {3} belongs to another partition".format(
+                hashpartitiontableprefix, i, misplaced, key))
+        if count != countList[i]:       # So sánh với số dòng dự kiến
+            raise Exception("{0}{1} has {2} of rows while the correct number should be {3}".format(
+                hashpartitiontableprefix, i, count, countList[i]
+            ))
+
+def testEachRangePartitionBounds(n, openconnection, rangepartitiontableprefix):
+    """
+    Kiểm tra từng phân vùng range chỉ chứa các rating nằm trong biên đã lưu trong partition_metadata
+    (dùng cho các biên không đều như equi-depth, khi getCountrangepartition không áp dụng được)
+    Args:
+        n: Số lượng phân vùng
+        openconnection: Kết nối database
+        rangepartitiontableprefix: Tiền tố tên bảng phân vùng
+    Returns:
+        List số dòng của từng phân vùng
+    """
+    cur = openconnection.cursor()
+    cur.execute("select lowerbounds, upperbounds from partition_metadata where prefix = %s", (rangepartitiontableprefix,))
+    lows, highs = cur.fetchone()
+    
+    sizes = []
+    for i in range(0, n):
+        # Phân vùng 0 gồm cả cận dưới, các phân vùng khác: lowerbound < rating <= upperbound
+        lowercondition = "rating >= %s" if i == 0 else "rating > %s"
+        cur.execute("select count(*), count(*) filter (where not ({0} and rating <= %s)) from {1}{2}".format(
+            lowercondition, rangepartitiontableprefix, i), (lows[i], highs[i]))
+        count, outside = cur.fetchone()
+        if outside:
+            raise Exception("{0}{1} has {2} rows outside ({3}, {4}]".format(
+                rangepartitiontableprefix, i, outside, lows[i], highs[i]))
+        sizes.append(count)
+    cur.close()
+    return sizes
+
+def testEachPartitionColumnTypes(ratingstablename, n, openconnection, partitiontableprefix):
+    """
+    Kiểm tra từng phân vùng có cùng kiểu cột với bảng gốc (vd: rating real khi dùng lược đồ gọn)
+    Args:
+        ratingstablename: Tên bảng gốc
+        n: Số lượng phân vùng
+        openconnection: Kết nối database
+        partitiontableprefix: Tiền tố tên bảng phân vùng
+    """
+    cur = openconnection.cursor()
+    for i in range(0, n):
+        # Các cột (tên, kiểu) có ở một bảng mà không có ở bảng kia
+        cur.execute("""
+            (select attname, format_type(atttypid, atttypmod) from pg_attribute
+             where attrelid = %s::regclass and attnum > 0 and not attisdropped
+             except
+             select attname, format_type(atttypid, atttypmod) from pg_attribute
+             where attrelid = %s::regclass and attnum > 0 and not attisdropped)
+        """, (ratingstablename, "{0}{1}".format(partitiontableprefix, i)))
+        mismatched = cur.fetchall()
+        if mismatched:
+            raise Exception("{0}{1} does not match the column types of {2}: {3}".format(
+                partitiontableprefix, i, ratingstablename, mismatched))
+    cur.close()
+
+def getpartitioncontentquery(ratingstablename, n, i, partitiontableprefix, scheme, bounds=None, key=None):
+    """
+    Tạo câu truy vấn trả về các dòng sai của phân vùng thứ i, mỗi dòng gồm
+    (lý do, userid, movieid, rating, tổng số dòng sai của phân vùng), tối đa MAX_OFFENDING_ROWS dòng
+    - range: dòng không thỏa biên của phân vùng
+    - hash: dòng có khóa thuộc phân vùng khác
+    - roundrobin: so sánh với các dòng của bảng gốc có số thứ tự (theo thứ tự quét bảng) % n = i:
+      'missing' là dòng của bảng gốc không có trong phân vùng, 'unexpected' là dòng thừa trong phân vùng
+    Args:
+        ratingstablename: Tên bảng gốc
+        n: Số lượng phân vùng
+        i: Chỉ số phân vùng
+        partitiontableprefix: Tiền tố tên bảng phân vùng
+        scheme: 'range', 'hash' hoặc 'roundrobin'
+        bounds: Cặp (lows, highs) với range
+        key: Cột khóa với hash
+    """
+    table = "{0}{1}".format(partitiontableprefix, i)
+    if scheme == 'roundrobin':
+        return """
+            WITH expected AS (
+                SELECT userid, movieid, rating
+                FROM (SELECT userid, movieid, rating, row_number() OVER () - 1 AS ordinal FROM {0}) AS m
+                WHERE ordinal % {1} = {2}
+            ), actual AS (
+                SELECT userid, movieid, rating FROM {3}
+            )
+            SELECT kind, userid, movieid, rating, COUNT(*) OVER () FROM (
+                SELECT 'missing' AS kind, * FROM (SELECT * FROM expected EXCEPT ALL SELECT * FROM actual) AS a
+                UNION ALL
+                SELECT 'unexpected', * FROM (SELECT * FROM actual EXCEPT ALL SELECT * FROM expected) AS b
+            ) AS d LIMIT {4}
+        """.format(ratingstablename, n, i, table, MAX_OFFENDING_ROWS)
+    if scheme == 'range':
+        lows, highs = bounds
+        lowercondition = "rating >= {0}" if i == 0 else "rating > {0}"
+        condition = (lowercondition + " AND rating <= {1}").format(lows[i], highs[i])
+        reason = "outside bounds"
+    else:
+        condition = "{0} = {1}".format(gethashbucket(key, n), i)
+        reason = "{0} of another partition".format(key)
+    return """
+        SELECT '{0}', userid, movieid, rating, COUNT(*) OVER () FROM {1}
+        WHERE NOT COALESCE({2}, false) LIMIT {3}
+    """.format(reason, table, condition, MAX_OFFENDING_ROWS)
+
+
+def checkpartitioncontent(ratingstablename, n, openconnection, partitiontableprefix, scheme, key=None, workers=None):
+    """
+    Kiểm tra nội dung của tất cả các phân vùng song song, mỗi phân vùng trên một kết nối riêng của pool
+    (xem getpartitioncontentquery). Biên range được lấy từ partition_metadata nếu có
+    Args:
+        ratingstablename: Tên bảng gốc
+        n: Số lượng phân vùng
+        openconnection: Kết nối database (dùng để lấy thông tin kết nối và biên phân vùng)
+        partitiontableprefix: Tiền tố tên bảng phân vùng
+        scheme: 'range', 'hash' hoặc 'roundrobin'
+        key: Cột khóa với hash
+        workers: Số luồng kiểm tra (mặc định: số phân vùng, tối đa bằng kích thước pool)
+    Returns:
+        List dict của từng phân vùng gồm table, rows (số dòng), offending (số dòng sai),
+        samples (tối đa MAX_OFFENDING_ROWS dòng sai) và seconds
+    """
+    bounds = None
+    if scheme == 'range':
+        with openconnection.cursor() as cur:
+            cur.execute("select to_regclass('partition_metadata') is not null")
+            if cur.fetchone()[0]:
+                cur.execute("select lowerbounds, upperbounds from partition_metadata where prefix = %s",
+                            (partitiontableprefix,))
+                bounds = cur.fetchone()
+        if bounds is None:
+            bounds = getequalrangebounds(n)
+    info = openconnection.info
+    pool = getconnectionpool(user=info.user, password=info.password, dbname=info.dbname)
+    
+    def check(i):
+        start_time = time.time()
+        with pool.connection() as con:
+            cur = con.cursor()
+            # Số thứ tự round robin dựa trên thứ tự quét bảng gốc: tắt quét đồng bộ (synchronize_seqscans)
+            # để các kết nối chạy song song đều quét bảng gốc từ block đầu tiên
+            cur.execute("SET LOCAL synchronize_seqscans = off; SET LOCAL max_parallel_workers_per_gather = 0")
+            cur.execute("select count(*) from {0}{1}".format(partitiontableprefix, i))
+            rows = int(cur.fetchone()[0])
+            cur.execute(getpartitioncontentquery(ratingstablename, n, i, partitiontableprefix, scheme, bounds, key))
+            samples = cur.fetchall()
+            cur.close()
+            con.rollback()
+        return {
+            'table': "{0}{1}".format(partitiontableprefix, i),
+            'rows': rows,
+            'offending': int(samples[0][-1]) if samples else 0,
+            'samples': [tuple(row[:-1]) for row in samples],
+            'seconds': time.time() - start_time,
+        }
+    
+    with ThreadPoolExecutor(max_workers=min(workers or n, n, pool.maxconn) or 1) as executor:
+        return list(executor.map(check, range(n)))
+
+
+def testEachPartitionContent(ratingstablename, n, openconnection, partitiontableprefix, scheme, key=None, workers=None):
+    """
+    Kiểm tra nội dung của từng phân vùng song song (checkpartitioncontent), in thời gian kiểm tra
+    từng phân vùng và báo lỗi kèm các dòng sai nếu có
+    Args:
+        ratingstablename: Tên bảng gốc
+        n: Số lượng phân vùng
+        openconnection: Kết nối database
+        partitiontableprefix: Tiền tố tên bảng phân vùng
+        scheme: 'range', 'hash' hoặc 'roundrobin'
+        key: Cột khóa với hash
+        workers: Số luồng kiểm tra
+    Returns:
+        Kết quả của checkpartitioncontent
+    """
+    results = checkpartitioncontent(ratingstablename, n, openconnection, partitiontableprefix, scheme, key, workers)
+    for result in results:
+        print('{0}: {1} rows checked, {2} offending ({3:.3f} seconds)'.format(
+            result['table'], result['rows'], result['offending'], result['seconds']))
+    offending = [result for result in results if result['offending']]
+    if offending:
+        raise Exception('; '.join('{0} has {1} offending rows, e.g. {2}'.format(
+            result['table'], result['offending'], result['samples']) for result in offending))
+    return results
+
 # ===== PHẦN 4: CÁC HÀM TEST CHÍNH CHO TỪNG CHỨC NĂNG =====
 
-def testloadratings(MyAssignment, ratingstablename, filepath, openconnection, rowsininpfile):
+def testloadratings(MyAssignment, ratingstablename, filepath, openconnection, rowsininpfile, workers=1, compact=False):
     """
     Kiểm thử hàm load dữ liệu từ file vào database
     Xác minh xem số lượng dòng được load có đúng như mong đợi không
@@ -327,12 +691,14 @@ def testloadratings(MyAssignment, ratingstablename, filepath, openconnection, ro
         filepath: Đường dẫn file dữ liệu
         openconnection: Kết nối database
         rowsininpfile: Số dòng dự kiến trong file để kiểm tra
+        workers: Số tiến trình tải song song truyền cho loadratings (mặc định: 1)
+        compact: True để tải với lược đồ gọn (rating real)
     Returns:
         [True, None] nếu thành công, [False, Exception] nếu thất bại
     """
     try:
         # Gọi hàm loadratings từ module cần test
-        MyAssignment.loadratings(ratingstablename,filepath,openconnection)
+        MyAssignment.loadratings(ratingstablename, filepath, openconnection, workers=workers, compact=compact)
         
         # Test 1: Đếm số dòng được chèn vào database
         with openconnection.cursor() as cur:
@@ -341,13 +707,129 @@ def testloadratings(MyAssignment, ratingstablename, filepath, openconnection, ro
             if count != rowsininpfile:
                 raise Exception(
                     'Expected {0} rows, but {1} rows in \'{2}\' table'.format(rowsininpfile, count, ratingstablename))
+            
+            # Test 2: Kiểu cột rating đúng với lược đồ đã chọn
+            cur.execute("SELECT format_type(atttypid, atttypmod) FROM pg_attribute "
+                        "WHERE attrelid = %s::regclass AND attname = 'rating'", (ratingstablename,))
+            ratingtype = cur.fetchone()[0]
+            expectedtype = 'real' if compact else 'double precision'
+            if ratingtype != expectedtype:
+                raise Exception('Expected rating of type {0}, but got {1}'.format(expectedtype, ratingtype))
     except Exception as e:
         traceback.print_exc()  # In chi tiết lỗi để debug
         return [False, e]
     return [True, None]
 
 
-def testrangepartition(MyAssignment, ratingstablename, n, openconnection, partitionstartindex, ACTUAL_ROWS_IN_INPUT_FILE):
+def testresumableloadratings(MyAssignment, ratingstablename, filepath, openconnection, rowsininpfile,
+                             chunkrows=10000, interruptafter=2):
+    """
+    Kiểm thử tải có checkpoint (loadratings(..., resume=True))
+    Lần tải đầu bị ngắt sau interruptafter lần commit (hàm đo ném lỗi ngay sau commit), lần gọi lại
+    phải chỉ đọc phần còn lại của file và cho cùng nội dung với một lần tải thường
+    Args:
+        MyAssignment: Module chứa hàm loadratings cần test
+        ratingstablename: Tên bảng để load dữ liệu
+        filepath: Đường dẫn file dữ liệu (nên có nhiều hơn chunkrows * interruptafter dòng)
+        openconnection: Kết nối database
+        rowsininpfile: Số dòng dự kiến trong file
+        chunkrows: Số dòng giữa hai checkpoint
+        interruptafter: Số lần commit trước khi ngắt lần tải đầu
+    Returns:
+        [True, None] nếu thành công, [False, Exception] nếu thất bại
+    """
+    try:
+        commits = []
+        
+        def interrupt(event):
+            if event['operation'] == 'loadratings' and event['phase'] == 'commit':
+                commits.append(event)
+                if len(commits) == interruptafter:
+                    raise RuntimeError('simulated interruption')
+        
+        # Lần tải đầu (bắt đầu từ bảng trống, không dùng checkpoint cũ): bị ngắt sau interruptafter checkpoint
+        with openconnection.cursor() as cur:
+            cur.execute('DROP TABLE IF EXISTS {0}'.format(ratingstablename))
+        openconnection.commit()
+        try:
+            with MyAssignment.instrumented(interrupt):
+                MyAssignment.loadratings(ratingstablename, filepath, openconnection, commit_every=chunkrows, resume=True)
+            raise Exception('loadratings was not interrupted, file has too few rows')
+        except RuntimeError:
+            openconnection.rollback()
+        
+        with openconnection.cursor() as cur:
+            cur.execute('SELECT COUNT(*) FROM {0}'.format(ratingstablename))
+            loaded = cur.fetchone()[0]
+        if loaded != chunkrows * interruptafter:
+            raise Exception('Expected {0} rows after the interruption, but found {1}'.format(
+                chunkrows * interruptafter, loaded))
+        
+        # Lần gọi lại: chỉ các dòng chưa được commit được COPY
+        registry = MyAssignment.MetricsRegistry()
+        with MyAssignment.instrumented(registry):
+            MyAssignment.loadratings(ratingstablename, filepath, openconnection, commit_every=chunkrows, resume=True)
+        copied = registry.totals()[('loadratings', 'copy')]['rows']
+        if copied != rowsininpfile - loaded:
+            raise Exception('Resumed load copied {0} rows, expected {1}'.format(copied, rowsininpfile - loaded))
+        
+        # Nội dung giống một lần tải thường: không thiếu, không trùng dòng
+        reference = ratingstablename + '_reference'
+        MyAssignment.loadratings(reference, filepath, openconnection)
+        with openconnection.cursor() as cur:
+            query = 'SELECT COUNT(*), SUM(({0})::numeric) FROM {1}'
+            cur.execute(query.format(ROW_CHECKSUM, ratingstablename))
+            actual = cur.fetchone()
+            cur.execute(query.format(ROW_CHECKSUM, reference))
+            expected = cur.fetchone()
+            cur.execute('DROP TABLE {0}'.format(reference))
+        openconnection.commit()
+        if actual != expected or actual[0] != rowsininpfile:
+            raise Exception('Resumed load has {0} rows with checksum {1}, expected {2} rows with checksum {3}'.format(
+                actual[0], actual[1], expected[0], expected[1]))
+    except Exception as e:
+        traceback.print_exc()  # In chi tiết lỗi để debug
+        return [False, e]
+    return [True, None]
+
+
+def testbinaryloadratings(MyAssignment, ratingstablename, filepath, openconnection, rowsininpfile, compact=False):
+    """
+    Kiểm thử tải với COPY dạng binary (loadratings(..., copyformat='binary'))
+    Bảng tải được phải có cùng nội dung với một lần tải dạng text của cùng file
+    Args:
+        MyAssignment: Module chứa hàm loadratings cần test
+        ratingstablename: Tên bảng để load dữ liệu
+        filepath: Đường dẫn file dữ liệu
+        openconnection: Kết nối database
+        rowsininpfile: Số dòng dự kiến trong file
+        compact: True để tải với lược đồ gọn (rating real, gửi dạng float4)
+    Returns:
+        [True, None] nếu thành công, [False, Exception] nếu thất bại
+    """
+    try:
+        MyAssignment.loadratings(ratingstablename, filepath, openconnection, compact=compact, copyformat='binary')
+        reference = ratingstablename + '_reference'
+        MyAssignment.loadratings(reference, filepath, openconnection, compact=compact)
+        with openconnection.cursor() as cur:
+            query = 'SELECT COUNT(*), SUM(({0})::numeric) FROM {1}'
+            cur.execute(query.format(ROW_CHECKSUM, ratingstablename))
+            actual = cur.fetchone()
+            cur.execute(query.format(ROW_CHECKSUM, reference))
+            expected = cur.fetchone()
+            cur.execute('DROP TABLE {0}'.format(reference))
+        openconnection.commit()
+        if actual != expected or actual[0] != rowsininpfile:
+            raise Exception('Binary load has {0} rows with checksum {1}, expected {2} rows with checksum {3}'.format(
+                actual[0], actual[1], expected[0], expected[1]))
+    except Exception as e:
+        traceback.print_exc()  # In chi tiết lỗi để debug
+        return [False, e]
+    return [True, None]
+
+
+def testrangepartition(MyAssignment, ratingstablename, n, openconnection, partitionstartindex, ACTUAL_ROWS_IN_INPUT_FILE,
+                       contentcheck=False):
     """
     Kiểm thử hàm phân vùng theo range (dựa trên phạm vi rating)
     Kiểm tra các tính chất: Completeness, Disjointness, Reconstruction
@@ -359,6 +841,7 @@ def testrangepartition(MyAssignment, ratingstablename, n, openconnection, partit
         openconnection: Kết nối database
         partitionstartindex: Chỉ số bắt đầu của phân vùng (0 hoặc 1)
         ACTUAL_ROWS_IN_INPUT_FILE: Số dòng thực tế trong dữ liệu gốc
+        contentcheck: True để kiểm tra thêm từng dòng của mọi phân vùng song song (testEachPartitionContent)
     Returns:
         [True, None] nếu thành công, [False, Exception] nếu thất bại
     """
@@ -366,11 +849,47 @@ def testrangepartition(MyAssignment, ratingstablename, n, openconnection, partit
         # Gọi hàm rangepartition từ module cần test
         MyAssignment.rangepartition(ratingstablename, n, openconnection)
         
-        # Kiểm tra các tính chất cơ bản của phân vùng
-        testrangeandrobinpartitioning(n, openconnection, RANGE_TABLE_PREFIX, partitionstartindex, ACTUAL_ROWS_IN_INPUT_FILE)
+        # Kiểm tra các tính chất cơ bản của phân vùng và nội dung từng phân vùng trong một lần đọc
+        verifypartitions(ratingstablename, n, openconnection, RANGE_TABLE_PREFIX, partitionstartindex,
+                         ACTUAL_ROWS_IN_INPUT_FILE, bucket=getrangebucket(*getequalrangebounds(n)))
+        testEachPartitionColumnTypes(ratingstablename, n, openconnection, RANGE_TABLE_PREFIX)
+        if contentcheck:
+            testEachPartitionContent(ratingstablename, n, openconnection, RANGE_TABLE_PREFIX, 'range')
+        
+        return [True, None]
+    except Exception as e:
+        traceback.print_exc()  # In chi tiết lỗi để debug
+        return [False, e]
+
+
+def testequidepthrangepartition(MyAssignment, ratingstablename, n, openconnection, partitionstartindex, ACTUAL_ROWS_IN_INPUT_FILE,
+                                histogram='stats'):
+    """
+    Kiểm thử hàm phân vùng range với biên equi-depth (rangepartition(..., boundaries='equidepth'))
+    Kiểm tra các tính chất: Completeness, Disjointness, Reconstruction và biên của từng phân vùng,
+    đồng thời in số dòng của từng phân vùng để so sánh độ cân bằng
+    Args:
+        MyAssignment: Module chứa hàm rangepartition cần test
+        ratingstablename: Tên bảng gốc
+        n: Số lượng phân vùng cần tạo
+        openconnection: Kết nối database
+        partitionstartindex: Chỉ số bắt đầu của phân vùng (0 hoặc 1)
+        ACTUAL_ROWS_IN_INPUT_FILE: Số dòng thực tế trong dữ liệu gốc
+        histogram: Nguồn phân bố rating ('stats' hoặc 'sample')
+    Returns:
+        [True, None] nếu thành công, [False, Exception] nếu thất bại
+    """
+    try:
+        # Gọi hàm rangepartition từ module cần test
+        MyAssignment.rangepartition(ratingstablename, n, openconnection, boundaries='equidepth', histogram=histogram)
         
-        # Kiểm tra chi tiết từng phân vùng có đúng số dòng không
-        testEachRangePartition(ratingstablename, n, openconnection, RANGE_TABLE_PREFIX)
+        # Kiểm tra các tính chất cơ bản của phân vùng và nội dung từng phân vùng theo biên đã lưu
+        with openconnection.cursor() as cur:
+            cur.execute("select lowerbounds, upperbounds from partition_metadata where prefix = %s", (RANGE_TABLE_PREFIX,))
+            lows, highs = cur.fetchone()
+        sizes = verifypartitions(ratingstablename, n, openconnection, RANGE_TABLE_PREFIX, partitionstartindex,
+                                 ACTUAL_ROWS_IN_INPUT_FILE, bucket=getrangebucket(lows, highs))
+        print('Equi-depth partition sizes: {0}'.format(sizes))
         
         return [True, None]
     except Exception as e:
@@ -379,7 +898,7 @@ def testrangepartition(MyAssignment, ratingstablename, n, openconnection, partit
 
 
 def testroundrobinpartition(MyAssignment, ratingstablename, numberofpartitions, openconnection,
-                            partitionstartindex, ACTUAL_ROWS_IN_INPUT_FILE):
+                            partitionstartindex, ACTUAL_ROWS_IN_INPUT_FILE, contentcheck=False):
     """
     Kiểm thử hàm phân vùng theo round robin (phân chia tuần tự)
     Kiểm tra các tính chất: Completeness, Disjointness, Reconstruction
@@ -391,6 +910,8 @@ def testroundrobinpartition(MyAssignment, ratingstablename, numberofpartitions,
         openconnection: Kết nối database
         partitionstartindex: Chỉ số bắt đầu của phân vùng
         ACTUAL_ROWS_IN_INPUT_FILE: Số dòng thực tế trong dữ liệu gốc
+        contentcheck: True để kiểm tra thêm số thứ tự của từng dòng trong mọi phân vùng song song
+                      (testEachPartitionContent)
     Returns:
         [True, None] nếu thành công, [False, Exception] nếu thất bại
     """
@@ -398,17 +919,171 @@ def testroundrobinpartition(MyAssignment, ratingstablename, numberofpartitions,
         # Gọi hàm roundrobinpartition từ module cần test
         MyAssignment.roundrobinpartition(ratingstablename, numberofpartitions, openconnection)
         
-        # Kiểm tra các tính chất cơ bản của phân vùng
-        testrangeandrobinpartitioning(numberofpartitions, openconnection, RROBIN_TABLE_PREFIX, partitionstartindex, ACTUAL_ROWS_IN_INPUT_FILE)
+        # Kiểm tra các tính chất cơ bản của phân vùng và số dòng từng phân vùng trong một lần đọc
+        verifypartitions(ratingstablename, numberofpartitions, openconnection, RROBIN_TABLE_PREFIX, partitionstartindex,
+                         ACTUAL_ROWS_IN_INPUT_FILE, roundrobin=True)
+        testEachPartitionColumnTypes(ratingstablename, numberofpartitions, openconnection, RROBIN_TABLE_PREFIX)
+        if contentcheck:
+            testEachPartitionContent(ratingstablename, numberofpartitions, openconnection, RROBIN_TABLE_PREFIX, 'roundrobin')
+        
+    except Exception as e:
+        traceback.print_exc()  # In chi tiết lỗi để debug
+        return [False, e]
+    return [True, None]
+
+def testhashpartition(MyAssignment, ratingstablename, n, key, openconnection, partitionstartindex, ACTUAL_ROWS_IN_INPUT_FILE):
+    """
+    Kiểm thử hàm phân vùng theo hash (trên userid hoặc movieid)
+    Kiểm tra các tính chất: Completeness, Disjointness, Reconstruction
+    Và xác minh mỗi phân vùng chỉ chứa các khóa thuộc về nó
+    Args:
+        MyAssignment: Module chứa hàm hashpartition cần test
+        ratingstablename: Tên bảng gốc
+        n: Số lượng phân vùng cần tạo
+        key: Cột khóa phân vùng
+        openconnection: Kết nối database
+        partitionstartindex: Chỉ số bắt đầu của phân vùng (0 hoặc 1)
+        ACTUAL_ROWS_IN_INPUT_FILE: Số dòng thực tế trong dữ liệu gốc
+    Returns:
+        [True, None] nếu thành công, [False, Exception] nếu thất bại
+    """
+    try:
+        # Gọi hàm hashpartition từ module cần test
+        MyAssignment.hashpartition(ratingstablename, n, key, openconnection)
+        
+        # Kiểm tra các tính chất cơ bản của phân vùng và nội dung từng phân vùng trong một lần đọc
+        verifypartitions(ratingstablename, n, openconnection, HASH_TABLE_PREFIX, partitionstartindex,
+                         ACTUAL_ROWS_IN_INPUT_FILE, bucket=gethashbucket(key, n))
+        testEachPartitionColumnTypes(ratingstablename, n, openconnection, HASH_TABLE_PREFIX)
+        
+        return [True, None]
+    except Exception as e:
+        traceback.print_exc()  # In chi tiết lỗi để debug
+        return [False, e]
+
+
+def testrepartition(MyAssignment, ratingstablename, scheme, n, openconnection, partitionstartindex, ACTUAL_ROWS_IN_INPUT_FILE):
+    """
+    Kiểm thử hàm đổi số phân vùng (repartition) của tập phân vùng range hoặc hash đã có
+    Kết quả phải thỏa các kiểm tra giống như khi phân vùng lại từ đầu với n phân vùng
+    Args:
+        MyAssignment: Module chứa hàm repartition cần test
+        ratingstablename: Tên bảng gốc
+        scheme: Phương pháp phân vùng ('range' hoặc 'hash')
+        n: Số lượng phân vùng mới
+        openconnection: Kết nối database
+        partitionstartindex: Chỉ số bắt đầu của phân vùng (0 hoặc 1)
+        ACTUAL_ROWS_IN_INPUT_FILE: Số dòng thực tế trong dữ liệu gốc
+    Returns:
+        [True, None] nếu thành công, [False, Exception] nếu thất bại
+    """
+    try:
+        # Gọi hàm repartition từ module cần test
+        MyAssignment.repartition(ratingstablename, scheme, n, openconnection)
+        
+        # Kiểm tra các tính chất của phân vùng và nội dung từng phân vùng
+        if scheme == 'range':
+            verifypartitions(ratingstablename, n, openconnection, RANGE_TABLE_PREFIX, partitionstartindex,
+                             ACTUAL_ROWS_IN_INPUT_FILE, bucket=getrangebucket(*getequalrangebounds(n)))
+        else:
+            key = MyAssignment._hash_info(openconnection)['partitionkey']
+            verifypartitions(ratingstablename, n, openconnection, HASH_TABLE_PREFIX, partitionstartindex,
+                             ACTUAL_ROWS_IN_INPUT_FILE, bucket=gethashbucket(key, n))
+        testEachPartitionColumnTypes(ratingstablename, n, openconnection,
+                                     RANGE_TABLE_PREFIX if scheme == 'range' else HASH_TABLE_PREFIX)
+    except Exception as e:
+        traceback.print_exc()  # In chi tiết lỗi để debug
+        return [False, e]
+    return [True, None]
+
+def testloadandpartition(MyAssignment, ratingstablename, filepath, scheme, n, openconnection, partitionstartindex, ACTUAL_ROWS_IN_INPUT_FILE,
+                         compact=False):
+    """
+    Kiểm thử hàm tải dữ liệu và phân vùng trong một lần đọc file (loadandpartition)
+    Kết quả phải thỏa các kiểm tra giống testloadratings và testrangepartition/testroundrobinpartition
+    Args:
+        MyAssignment: Module chứa hàm loadandpartition cần test
+        ratingstablename: Tên bảng chính
+        filepath: Đường dẫn file dữ liệu
+        scheme: Phương pháp phân vùng ('range' hoặc 'roundrobin')
+        n: Số lượng phân vùng cần tạo
+        openconnection: Kết nối database
+        partitionstartindex: Chỉ số bắt đầu của phân vùng
+        ACTUAL_ROWS_IN_INPUT_FILE: Số dòng thực tế trong file dữ liệu
+        compact: True để tải với lược đồ gọn (rating real)
+    Returns:
+        [True, None] nếu thành công, [False, Exception] nếu thất bại
+    """
+    try:
+        # Gọi hàm loadandpartition từ module cần test
+        MyAssignment.loadandpartition(ratingstablename, filepath, scheme, n, openconnection, compact=compact)
         
-        # Kiểm tra chi tiết từng phân vùng có đúng số dòng không
-        testEachRoundrobinPartition(ratingstablename, numberofpartitions, openconnection, RROBIN_TABLE_PREFIX)
+        # Bảng chính phải có đủ số dòng của file
+        with openconnection.cursor() as cur:
+            cur.execute('SELECT COUNT(*) from {0}'.format(ratingstablename))
+            count = int(cur.fetchone()[0])
+            if count != ACTUAL_ROWS_IN_INPUT_FILE:
+                raise Exception(
+                    'Expected {0} rows, but {1} rows in \'{2}\' table'.format(ACTUAL_ROWS_IN_INPUT_FILE, count, ratingstablename))
         
+        # Kiểm tra các tính chất của phân vùng và số dòng của từng phân vùng
+        if scheme == 'range':
+            verifypartitions(ratingstablename, n, openconnection, RANGE_TABLE_PREFIX, partitionstartindex,
+                             ACTUAL_ROWS_IN_INPUT_FILE, bucket=getrangebucket(*getequalrangebounds(n)))
+        else:
+            verifypartitions(ratingstablename, n, openconnection, RROBIN_TABLE_PREFIX, partitionstartindex,
+                             ACTUAL_ROWS_IN_INPUT_FILE, roundrobin=True)
+        testEachPartitionColumnTypes(ratingstablename, n, openconnection,
+                                     RANGE_TABLE_PREFIX if scheme == 'range' else RROBIN_TABLE_PREFIX)
+    except Exception as e:
+        traceback.print_exc()  # In chi tiết lỗi để debug
+        return [False, e]
+    return [True, None]
+
+def testparallelaggregate(MyAssignment, ratingstablename, prefix, openconnection):
+    """
+    Kiểm thử hàm tổng hợp song song trên các phân vùng (parallelaggregate)
+    Kết quả gộp từ các phân vùng phải bằng kết quả của cùng truy vấn trên bảng chính
+    Args:
+        MyAssignment: Module chứa hàm parallelaggregate cần test
+        ratingstablename: Tên bảng chính
+        prefix: Tiền tố tên bảng phân vùng (range_part hoặc rrobin_part)
+        openconnection: Kết nối database
+    Returns:
+        [True, None] nếu thành công, [False, Exception] nếu thất bại
+    """
+    try:
+        aggregates = [('count', '*'), ('sum', 'rating'), ('avg', 'rating'), ('min', 'rating'), ('max', 'rating')]
+        with openconnection.cursor() as cur:
+            # Tổng hợp trên toàn bộ dữ liệu
+            result = MyAssignment.parallelaggregate(prefix, aggregates, openconnection)
+            cur.execute('SELECT COUNT(*), SUM(rating), AVG(rating), MIN(rating), MAX(rating) FROM {0}'.format(ratingstablename))
+            expected = cur.fetchone()
+            if not _sameaggregates(result, expected):
+                raise Exception('Expected {0}, but parallelaggregate returned {1}'.format(expected, result))
+            
+            # Tổng hợp theo nhóm: điểm trung bình và số đánh giá của từng phim
+            result = MyAssignment.parallelaggregate(prefix, [('avg', 'rating'), ('count', '*')], openconnection,
+                                                    groupby=['movieid'])
+            cur.execute('SELECT movieid, AVG(rating), COUNT(*) FROM {0} GROUP BY movieid'.format(ratingstablename))
+            expected = {row[0]: row[1:] for row in cur.fetchall()}
+            if result.keys() != expected.keys():
+                raise Exception('parallelaggregate returned {0} groups, expected {1}'.format(len(result), len(expected)))
+            for movieid, values in expected.items():
+                if not _sameaggregates(result[movieid], values):
+                    raise Exception('Expected {0} for movieid {1}, but parallelaggregate returned {2}'.format(
+                        values, movieid, result[movieid]))
     except Exception as e:
         traceback.print_exc()  # In chi tiết lỗi để debug
         return [False, e]
     return [True, None]
 
+def _sameaggregates(result, expected):
+    """So sánh hai bộ kết quả tổng hợp, cho phép sai số làm tròn của SUM/AVG trên số thực"""
+    return len(result) == len(expected) and all(
+        a == b or (a is not None and b is not None and abs(float(a) - float(b)) <= 1e-9 * max(1.0, abs(float(b))))
+        for a, b in zip(result, expected))
+
 def testroundrobininsert(MyAssignment, ratingstablename, userid, itemid, rating, openconnection, expectedtableindex):
     """
     Kiểm thử hàm chèn dữ liệu vào phân vùng round robin
@@ -442,6 +1117,38 @@ def testroundrobininsert(MyAssignment, ratingstablename, userid, itemid, rating,
     return [True, None]
 
 
+def testhashinsert(MyAssignment, ratingstablename, userid, itemid, rating, openconnection, expectedtableindex):
+    """
+    Kiểm thử hàm chèn dữ liệu vào phân vùng hash
+    Args:
+        MyAssignment: Module chứa hàm hashinsert cần test
+        ratingstablename: Tên bảng chính
+        userid: User ID của record cần chèn
+        itemid: Movie ID của record cần chèn
+        rating: Rating của record cần chèn
+        openconnection: Kết nối database
+        expectedtableindex: Chỉ số phân vùng mong đợi dựa trên khóa phân vùng
+    Returns:
+        [True, None] nếu thành công, [False, Exception] nếu thất bại
+    """
+    try:
+        # Tạo tên bảng phân vùng mong đợi
+        expectedtablename = HASH_TABLE_PREFIX + expectedtableindex
+        
+        # Gọi hàm hashinsert từ module cần test
+        MyAssignment.hashinsert(ratingstablename, userid, itemid, rating, openconnection)
+        
+        # Kiểm tra xem record có được chèn vào đúng phân vùng không
+        if not testrangerobininsert(expectedtablename, itemid, openconnection, rating, userid):
+            raise Exception(
+                'Hash insert failed! Couldnt find ({0}, {1}, {2}) tuple in {3} table'.format(userid, itemid, rating,
+                                                                                             expectedtablename))
+    except Exception as e:
+        traceback.print_exc()  # In chi tiết lỗi để debug
+        return [False, e]
+    return [True, None]
+
+
 def testrangeinsert(MyAssignment, ratingstablename, userid, itemid, rating, openconnection, expectedtableindex):
     """
     Kiểm thử hàm chèn dữ liệu vào phân vùng range
@@ -472,4 +1179,119 @@ def testrangeinsert(MyAssignment, ratingstablename, userid, itemid, rating, open
     except Exception as e:
         traceback.print_exc()  # In chi tiết lỗi để debug
         return [False, e]
-    return [True, None]
\ No newline at end of file
+    return [True, None]
+
+def testinstrumentation(MyAssignment, ratingstablename, filepath, n, openconnection, rowsininpfile):
+    """
+    Kiểm thử số liệu đo của các thao tác (add_instrumentation_hook / MetricsRegistry)
+    Tải dữ liệu, tạo phân vùng round robin và chèn một dòng trong khi đo, rồi đối chiếu các bộ đếm
+    Args:
+        MyAssignment: Module chứa các hàm cần test
+        ratingstablename: Tên bảng chính
+        filepath: Đường dẫn file dữ liệu
+        n: Số lượng phân vùng round robin cần tạo
+        openconnection: Kết nối database
+        rowsininpfile: Số dòng dự kiến trong file
+    Returns:
+        [True, None] nếu thành công, [False, Exception] nếu thất bại
+    """
+    try:
+        registry = MyAssignment.MetricsRegistry()
+        with MyAssignment.instrumented(registry):
+            MyAssignment.loadratings(ratingstablename, filepath, openconnection)
+            MyAssignment.roundrobinpartition(ratingstablename, n, openconnection)
+            MyAssignment.roundrobininsert(ratingstablename, 100, 1, 3, openconnection)
+        totals = registry.totals()
+        
+        # Mỗi dòng của file được COPY đúng một lần
+        copy = totals[('loadratings', 'copy')]
+        if copy['rows'] != rowsininpfile or copy['bytes'] != os.path.getsize(filepath):
+            raise Exception('loadratings copied {0} rows and {1} bytes, expected {2} rows and {3} bytes'.format(
+                copy['rows'], copy['bytes'], rowsininpfile, os.path.getsize(filepath)))
+        
+        # Mỗi phân vùng có đúng một event fill, tổng số dòng bằng số dòng của bảng chính
+        fill = totals[('roundrobinpartition', 'fill')]
+        if fill['calls'] != n or fill['rows'] != rowsininpfile:
+            raise Exception('roundrobinpartition reported {0} fills of {1} rows, expected {2} fills of {3} rows'.format(
+                fill['calls'], fill['rows'], n, rowsininpfile))
+        
+        # Một lần chèn gồm ít nhất một lệnh gửi tới server
+        insert = totals[('roundrobininsert', 'insert')]
+        if insert['calls'] != 1 or insert['statements'] < 1:
+            raise Exception('roundrobininsert reported {0} calls and {1} statements'.format(
+                insert['calls'], insert['statements']))
+        
+        # Sau khối with không còn hàm đo nào được gọi
+        MyAssignment.roundrobininsert(ratingstablename, 100, 1, 3, openconnection)
+        if registry.totals()[('roundrobininsert', 'insert')]['calls'] != 1:
+            raise Exception('instrumentation hook was not removed')
+    except Exception as e:
+        traceback.print_exc()  # In chi tiết lỗi để debug
+        return [False, e]
+    return [True, None]
+
+
+def testbulkload(MyAssignment, ratingstablename, filepath, n, openconnection, rowsininpfile):
+    """
+    Kiểm thử chế độ tải hàng loạt (bulkload): trong khối with các bảng được xây dựng là UNLOGGED
+    và tạm dừng autovacuum, sau khối with mọi bảng và thiết lập phiên trở về như cũ
+    Args:
+        MyAssignment: Module chứa các hàm cần test
+        ratingstablename: Tên bảng chính
+        filepath: Đường dẫn file dữ liệu
+        n: Số lượng phân vùng range và round robin cần tạo
+        openconnection: Kết nối database
+        rowsininpfile: Số dòng dự kiến trong file
+    Returns:
+        [True, None] nếu thành công, [False, Exception] nếu thất bại
+    """
+    tables = [ratingstablename] + ['{0}{1}'.format(prefix, i) for prefix in (RANGE_TABLE_PREFIX, RROBIN_TABLE_PREFIX)
+                                   for i in range(n)]
+    query = ("SELECT relname, relpersistence, COALESCE(array_to_string(reloptions, ','), '') FROM pg_class "
+             "WHERE relname = ANY(%s) AND pg_table_is_visible(oid)")
+    settings = ('synchronous_commit', 'maintenance_work_mem', 'work_mem')
+    try:
+        with openconnection.cursor() as cur:
+            # Xây dựng từ lược đồ trống để mọi bảng đều được tạo mới (LOGGED) trong khối with
+            cur.execute('DROP TABLE IF EXISTS {0}'.format(', '.join(tables)))
+            cur.execute('SELECT {0}'.format(', '.join("current_setting('{0}')".format(name) for name in settings)))
+            before = cur.fetchone()
+        openconnection.commit()
+        
+        with MyAssignment.bulkload(openconnection) as session:
+            MyAssignment.loadratings(ratingstablename, filepath, openconnection)
+            MyAssignment.rangepartition(ratingstablename, n, openconnection)
+            MyAssignment.roundrobinpartition(ratingstablename, n, openconnection)
+            with openconnection.cursor() as cur:
+                cur.execute(query, (tables,))
+                building = cur.fetchall()
+                cur.execute("SELECT current_setting('synchronous_commit')")
+                synchronous_commit = cur.fetchone()[0]
+            openconnection.commit()
+        
+        if len(building) != len(tables) or any(row[1:] != ('u', 'autovacuum_enabled=false') for row in building):
+            raise Exception('Expected unlogged tables without autovacuum inside bulkload, got {0}'.format(building))
+        if synchronous_commit != 'off':
+            raise Exception('Expected synchronous_commit off inside bulkload, got {0}'.format(synchronous_commit))
+        
+        with openconnection.cursor() as cur:
+            cur.execute(query, (tables,))
+            after = cur.fetchall()
+            cur.execute('SELECT {0}'.format(', '.join("current_setting('{0}')".format(name) for name in settings)))
+            restored = cur.fetchone()
+        openconnection.commit()
+        if any(row[1:] != ('p', '') for row in after):
+            raise Exception('Expected logged tables with default options after bulkload, got {0}'.format(after))
+        if restored != before:
+            raise Exception('Session settings {0} were not restored to {1}'.format(restored, before))
+        if set(session.timings) != {'build', 'setlogged', 'restore'}:
+            raise Exception('Unexpected bulkload timings {0}'.format(session.timings))
+        
+        # Dữ liệu không thay đổi khi chuyển về LOGGED
+        verifypartitions(ratingstablename, n, openconnection, RANGE_TABLE_PREFIX, 0, rowsininpfile,
+                         bucket=getrangebucket(*getequalrangebounds(n)))
+        verifypartitions(ratingstablename, n, openconnection, RROBIN_TABLE_PREFIX, 0, rowsininpfile, roundrobin=True)
+    except Exception as e:
+        traceback.print_exc()  # In chi tiết lỗi để debug
+        return [False, e]
+    return [True, None]